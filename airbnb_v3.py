@@ -1,161 +1,88 @@
-import pandas as pd
 import streamlit as st
-import locale
-import altair as alt
-import pydeck as pdk
 
-# Formato de moeda em Real Brasileiro
-locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+import interface
+from nucleo import analise, instrumentacao, paineis
 
-# Função para formatar os valores como moeda em Real
-def formatar_moeda(valor):
-    return locale.currency(valor, grouping=True)
+# Medição de tempo e caches deste rerun (só com ?debug=1 ou AIRBNB_DEBUG); o painel de
+# desempenho aparece na barra lateral no fim do bloco
+with interface.medicao_rerun():
+    # Listings já tipados (baixados uma vez e reaproveitados do cache local nos reruns). Na primeira
+    # carga os painéis mostram uma prévia com as primeiras linhas enquanto o arquivo inteiro baixa
+    snapshot, completo = analise.carregar_progressivo()
 
-# CSV
-url = 'https://data.insideairbnb.com/brazil/rj/rio-de-janeiro/2024-06-27/visualisations/listings.csv'
-df = pd.read_csv(url)
+    # Filtros da barra lateral; mudanças seguidas (slider arrastado) são calculadas uma vez só
+    filtros, agrupar_mapa = interface.barra_lateral(snapshot)
+    janela = interface.janela_tendencia()
+    interface.aguardar_filtros(filtros, agrupar_mapa)
 
-# Limpeza e conversão da coluna 'price'
-df['price'] = df['price'].replace('[\$,]', '', regex=True).astype(float)
+    # Grafo dos painéis: cada painel só é recalculado quando o que ele usa mudou. As tabelas e
+    # gráficos são lidos do disco quando a combinação foi renderizada com
+    # `python -m nucleo.relatorio render`, senão somados a partir do cubo do snapshot
+    grafo = paineis.avaliar(interface.memoria_grafo(), snapshot, filtros, agrupar_mapa, janela_tendencia=janela)
 
-# Conversão da coluna 'last_review' para o tipo datetime
-df['last_review'] = pd.to_datetime(df['last_review'], errors='coerce')
+    # Big Numbers no topo da página
+    st.title('Análises Airbnb - Rio de Janeiro')
+    interface.aviso_previa(snapshot, completo)
+    interface.big_numbers(grafo['metricas'])
+    instrumentacao.marco('primeira_pintura')
 
-# Logo na barra lateral
-logo_url = "https://logodownload.org/wp-content/uploads/2016/10/airbnb-logo-0.png"
-st.sidebar.image(logo_url, use_column_width=True)
 
-st.sidebar.subheader('Filtros:')
-data_min = df['last_review'].min()
-data_max = df['last_review'].max()
+    # Análise 1: Top 10 Bairros mais caros
 
-# Seleção do intervalo de datas no menu lateral
-data_inicio, data_fim = st.sidebar.date_input(
-    "Selecione o intervalo de datas",
-    [data_min, data_max],
-    min_value=data_min,
-    max_value=data_max
-)
+    st.subheader('Top 10 Bairros Mais Caros no Rio de Janeiro')
 
-# Filtro de bairros
-bairros_disponiveis = ['Todos'] + sorted(df['neighbourhood'].unique())
-bairro_selecionado = st.sidebar.selectbox("Selecione o Bairro", bairros_disponiveis)
+    interface.grafico(grafo['grafico.bairros_mais_caros'])
 
-# Filtro de tipo de quarto
-tipos_quarto_disponiveis = sorted(df['room_type'].unique())
-tipo_quarto_selecionado = st.sidebar.selectbox("Selecione o Tipo de Quarto", ['Todos'] + tipos_quarto_disponiveis)
+    # Análise 2: Quantidade de avaliações por bairro
+    st.subheader('Quantidade de Avaliações por Bairro')
 
-# Filtro de preço
-preco_min, preco_max = st.sidebar.slider(
-    "Selecione o Intervalo de Preços (R$)",
-    float(df['price'].min()), float(df['price'].max()), (float(df['price'].min()), float(df['price'].max()))
-)
+    interface.grafico(grafo['grafico.avaliacoes_por_bairro'])
 
-# DataFrame com base nos filtros selecionados
-df_filtrado = df[
-    (df['neighbourhood'].apply(lambda x: x == bairro_selecionado or bairro_selecionado == 'Todos')) &
-    (df['room_type'].apply(lambda x: x == tipo_quarto_selecionado or tipo_quarto_selecionado == 'Todos')) &
-    (df['price'] >= preco_min) &
-    (df['price'] <= preco_max)
-]
+    # Análise 3: Quantidade de avaliações por tipo de quarto
+    st.subheader('Quantidade de Avaliações por Tipo de Quarto')
 
-# Big Numbers no topo da página
-total_reviews_filtrado = df_filtrado['number_of_reviews'].sum()
-media_preco_filtrado = df_filtrado['price'].mean()
-media_minimum_nights = df_filtrado['minimum_nights'].mean()
+    interface.grafico(grafo['grafico.avaliacoes_por_tipo'])
 
-st.title('Análises Airbnb - Rio de Janeiro')
-col1, col2, col3 = st.columns(3)
-col1.metric(label="Total de Avaliações", value=total_reviews_filtrado)
-col2.metric(label="Média de Preço (R$)", value=formatar_moeda(media_preco_filtrado))
-col3.metric(label="Média Minima de Noites", value=int(round(media_minimum_nights)))
+    # Análise 4: Top 10 Anfitriões pela quantidade de avaliações
+    st.subheader('Top 10 Anfitriões com Mais Avaliações')
 
+    interface.grafico(grafo['grafico.top_anfitrioes'])
 
-# Análise 1: Top 10 Bairros mais caros
+    # Totais e anúncios de um anfitrião do ranking (dimensão de anfitriões do snapshot)
+    interface.painel_anfitriao(snapshot, grafo['tabela.top_anfitrioes'], grafo['mascara'])
 
-st.subheader('Top 10 Bairros Mais Caros no Rio de Janeiro')
+    # Análise 5: Mapa de locais com avaliações
 
-media_preco_bairro = df_filtrado.groupby('neighbourhood')['price'].mean().sort_values(ascending=False).head(10).reset_index()
+    st.subheader('Mapa de Locais com Avaliações')
 
-# Gráfico cruzado com barra e linha
-bar_chart = alt.Chart(media_preco_bairro).mark_bar(color='pink').encode(
-    x=alt.X('neighbourhood', sort='-y', title='Bairro'),
-    y=alt.Y('price', title='Preço Médio (R$)')
-).properties(width=600)
+    # O mapa é o painel mais pesado: o espaço fica reservado e ele é desenhado depois dos gráficos
+    espaco_mapa = interface.espaco_reservado('Carregando mapa...')
 
-line_chart = alt.Chart(media_preco_bairro).mark_line(color='red').encode(
-    x=alt.X('neighbourhood', sort='-y'),
-    y='price'
-)
+    # Análise 5b: Vizinhança do ponto clicado no mapa (índice espacial do snapshot)
+    espaco_vizinhanca = st.container()
 
+    # Análise 6: Avaliações por mês (pelo mês da última avaliação)
+    st.subheader('Avaliações por Mês')
 
-st.altair_chart(bar_chart + line_chart)
+    interface.grafico(grafo['grafico.avaliacoes_por_mes'])
 
-# Análise 2: Quantidade de avaliações por bairro
-st.subheader('Quantidade de Avaliações por Bairro')
+    # Análise 7: Tendência de anúncios ativos e ocupação estimada (série mensal do snapshot)
+    st.subheader('Anúncios Ativos e Ocupação Estimada')
 
-avaliacoes_por_bairro = df_filtrado.groupby('neighbourhood')['number_of_reviews'].sum().sort_values(ascending=False).reset_index()
+    interface.grafico(grafo['grafico.tendencia'])
+    st.caption('Atividade estimada entre a primeira e a última avaliação de cada anúncio; '
+               'ocupação pelo modelo do Inside Airbnb. Filtros de preço não se aplicam.')
 
-bar_chart_avaliacoes_bairro = alt.Chart(avaliacoes_por_bairro).mark_bar(color='pink').encode(
-    x=alt.X('neighbourhood', sort='-y', title='Bairro'),
-    y=alt.Y('number_of_reviews', title='Número de Avaliações')
-).properties(width=600)
+    # Análise 8: Há quanto tempo os anúncios não recebem avaliação
+    st.subheader('Tempo Desde a Última Avaliação')
 
-st.altair_chart(bar_chart_avaliacoes_bairro)
+    interface.grafico(grafo['grafico.decaimento'])
+    instrumentacao.marco('graficos')
 
-# Análise 3: Quantidade de avaliações por tipo de quarto
-st.subheader('Quantidade de Avaliações por Tipo de Quarto')
+    ponto = interface.mapa(grafo['grafico.mapa'], espaco_mapa)
+    instrumentacao.marco('mapa')
+    with espaco_vizinhanca:
+        interface.painel_vizinhanca(snapshot, grafo['mascara'], ponto)
 
-avaliacoes_por_tipo = df_filtrado.groupby('room_type')['number_of_reviews'].sum().sort_values(ascending=False).reset_index()
-
-# Gráfico de pizza usando Altair
-pie_chart = alt.Chart(avaliacoes_por_tipo).mark_arc().encode(
-    theta=alt.Theta(field='number_of_reviews', type='quantitative', title='Número de Avaliações'),
-    color=alt.Color(field='room_type', type='nominal', title='Tipo de Quarto'),
-    tooltip=['room_type', 'number_of_reviews']
-).properties(width=600, height=400)
-
-st.altair_chart(pie_chart)
-
-# Análise 4: Top 10 Anfitriões pela quantidade de avaliações
-st.subheader('Top 10 Anfitriões com Mais Avaliações')
-
-top_anfitrioes = df_filtrado.groupby('host_name')['number_of_reviews'].sum().sort_values(ascending=False).head(10).reset_index()
-
-bar_chart_anfitrioes = alt.Chart(top_anfitrioes).mark_bar(color='pink').encode(
-    x=alt.X('host_name', sort='-y', title='Anfitrião'),
-    y=alt.Y('number_of_reviews', title='Número de Avaliações')
-).properties(width=600)
-
-st.altair_chart(bar_chart_anfitrioes)
-
-# Análise 5: Mapa de locais com avaliações
-
-st.subheader('Mapa de Locais com Avaliações')
-
-df_com_avaliacoes = df_filtrado[df_filtrado['number_of_reviews'] > 0]
-
-# Gráfico de mapa
-view_state = pdk.ViewState(
-    latitude=-22.9068,
-    longitude=-43.1729,
-    zoom=10,
-    pitch=50,
-)
-
-layer = pdk.Layer(
-    'ScatterplotLayer',
-    data=df_com_avaliacoes,
-    get_position='[longitude, latitude]',
-    get_radius=200,
-    get_color=[255, 0, 0],
-    pickable=True
-)
-
-r = pdk.Deck(
-    layers=[layer],
-    initial_view_state=view_state,
-    tooltip={"text": "{name}\nNúmero de Avaliações: {number_of_reviews}"}
-)
-
-st.pydeck_chart(r)
+# Se a página mostrou a prévia, espera o snapshot completo e desenha tudo de novo com ele
+interface.aguardar_snapshot(snapshot, completo)
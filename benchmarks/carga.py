@@ -0,0 +1,194 @@
+"""Teste de carga do modo de serviço: muitas sessões sobre um snapshot compartilhado.
+
+Cada sessão é uma thread (como no Streamlit, onde cada rerun roda numa thread
+do servidor) que faz ``--reruns`` reruns do fluxo do ``airbnb_v3.py`` com
+filtros sorteados e guarda, como o ``session_state``, só os filtros e as
+tabelas pequenas do último rerun. Para cada quantidade de sessões o resultado
+traz latência p50/p95/p99 por rerun e a memória do processo (RSS e PSS).
+
+    python -m benchmarks.carga --sessoes 1 10 50 100 200 --modo mmap
+    python -m benchmarks.carga --modo mmap --processos 4 --saida carga.json
+
+Com ``--processos`` as sessões são divididas entre processos, como vários
+workers atrás de um balanceador; a PSS somada mostra quanto do snapshot
+mapeado (``--modo mmap``) é compartilhado entre eles.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from nucleo import analise
+from nucleo.compacto import abrir_arrow, compactar, gravar_arrow
+from nucleo.esquema import memoria
+from nucleo.relatorio import montar
+from nucleo.sintetico import gerar_listings
+from nucleo.snapshot import Snapshot
+
+SESSOES_PADRAO = [1, 10, 50, 100, 200]
+MODOS = ['tipado', 'compacto', 'mmap']
+
+
+def memoria_processo(pid='self'):
+    """``{'rss': bytes, 'pss': bytes}`` do processo, lidos de ``/proc`` (Linux)."""
+    resultado = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as arquivo:
+            for linha in arquivo:
+                campo, _, valor = linha.partition(':')
+                if campo in ('Rss', 'Pss'):
+                    resultado[campo.lower()] = int(valor.split()[0]) * 1024
+    except OSError:
+        import resource
+
+        resultado['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return resultado
+
+
+def preparar(linhas, modo, diretorio):
+    """Grava o snapshot sintético no formato do ``modo``; retorna o caminho a abrir."""
+    df = analise.limpar(gerar_listings(linhas))
+    if modo == 'mmap':
+        caminho = Path(diretorio) / 'listings.arrow'
+        gravar_arrow(compactar(df), caminho)
+    else:
+        caminho = Path(diretorio) / 'listings.parquet'
+        df.to_parquet(caminho, index=False)
+    return str(caminho)
+
+
+def abrir(caminho, modo):
+    if modo == 'mmap':
+        df = abrir_arrow(caminho)
+    else:
+        df = pd.read_parquet(caminho)
+        if modo == 'compacto':
+            df = compactar(df)
+    return Snapshot(df, caminho, modo)
+
+
+def _sortear_filtros(snapshot, rng):
+    # Metade dos acessos é a visão padrão; o resto muda um ou dois controles
+    filtros = {'preco': analise.limites_preco(snapshot, aproximado=False)}
+    if rng.random() < 0.5:
+        return filtros
+    if rng.random() < 0.7:
+        filtros['bairro'] = rng.choice(snapshot.bairros)
+    if rng.random() < 0.3:
+        filtros['tipo_quarto'] = rng.choice(snapshot.tipos_quarto)
+    if rng.random() < 0.3:
+        filtros['preco'] = tuple(sorted(float(v) for v in rng.choice([50, 100, 200, 400, 800, 1600], 2, replace=False)))
+    return filtros
+
+
+def _sessao(snapshot, reruns, semente, latencias, erros, estados, barreira):
+    rng = np.random.default_rng(semente)
+    barreira.wait()
+    for _ in range(reruns):
+        filtros = _sortear_filtros(snapshot, rng)
+        inicio = time.perf_counter()
+        try:
+            relatorio = montar(snapshot, filtros)
+        except Exception as erro:
+            erros.append(f'{filtros}: {erro!r}')
+            continue
+        latencias.append(time.perf_counter() - inicio)
+        # O que o session_state guardaria: filtros e resultados pequenos, nunca o DataFrame
+        estados[semente] = {'filtros': filtros, 'metricas': relatorio.metricas, 'tabelas': relatorio.tabelas}
+
+
+def simular(snapshot, sessoes, reruns, semente=0):
+    """Roda ``sessoes`` threads ao mesmo tempo; retorna latências, erros e memória."""
+    latencias, erros, estados = [], [], {}
+    barreira = threading.Barrier(sessoes)
+    threads = [
+        threading.Thread(target=_sessao, args=(snapshot, reruns, semente + i, latencias, erros, estados, barreira))
+        for i in range(sessoes)
+    ]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    return {'latencias': latencias, 'erros': erros, 'duracao': duracao, 'memoria': memoria_processo()}
+
+
+def _worker(caminho, modo, sessoes, reruns, semente):
+    snapshot = abrir(caminho, modo)
+    # Aquece as estruturas compartilhadas antes de medir, como um servidor já no ar
+    montar(snapshot, {'preco': analise.limites_preco(snapshot, aproximado=False)})
+    return simular(snapshot, sessoes, reruns, semente)
+
+
+def _percentis(latencias):
+    valores = np.asarray(latencias) * 1000
+    return {
+        'reruns': len(valores),
+        'p50_ms': float(np.percentile(valores, 50)),
+        'p95_ms': float(np.percentile(valores, 95)),
+        'p99_ms': float(np.percentile(valores, 99)),
+        'media_ms': float(statistics.fmean(valores)),
+    }
+
+
+def executar(linhas, modo, lista_sessoes, reruns, processos=1):
+    with tempfile.TemporaryDirectory(prefix='carga-airbnb-') as diretorio:
+        caminho = preparar(linhas, modo, diretorio)
+        snapshot = abrir(caminho, modo)
+        base = {'linhas': linhas, 'modo': modo, 'processos': processos, 'memoria_df': memoria(snapshot.df)}
+        del snapshot
+
+        resultados = []
+        for sessoes in lista_sessoes:
+            por_processo = [sessoes // processos + (i < sessoes % processos) for i in range(processos)]
+            por_processo = [n for n in por_processo if n]
+            # Processos novos a cada rodada, para a memória medida ser só a daquela quantidade de sessões
+            with ProcessPoolExecutor(max_workers=len(por_processo)) as pool:
+                futuros = [pool.submit(_worker, caminho, modo, n, reruns, 1000 * i) for i, n in enumerate(por_processo)]
+                parciais = [f.result() for f in futuros]
+            latencias = [v for p in parciais for v in p['latencias']]
+            resultado = {
+                'sessoes': sessoes,
+                **_percentis(latencias),
+                'erros': [e for p in parciais for e in p['erros']],
+                'vazao_reruns_s': len(latencias) / max(p['duracao'] for p in parciais),
+                'rss_total': sum(p['memoria'].get('rss', 0) for p in parciais),
+                'pss_total': sum(p['memoria'].get('pss', 0) for p in parciais),
+            }
+            resultados.append(resultado)
+            print(f"{sessoes:>5} sessões  p95 {resultado['p95_ms']:8.1f} ms  "
+                  f"PSS {resultado['pss_total'] / 2 ** 20:8.1f} MB", file=sys.stderr)
+    return {**base, 'resultados': resultados}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do modo de serviço com snapshot compartilhado.')
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--modo', choices=MODOS, default='mmap')
+    parser.add_argument('--sessoes', type=int, nargs='+', default=SESSOES_PADRAO)
+    parser.add_argument('--reruns', type=int, default=5, help='reruns por sessão')
+    parser.add_argument('--processos', type=int, default=1)
+    parser.add_argument('--saida', type=Path, help='arquivo JSON de saída (padrão: stdout)')
+    args = parser.parse_args(argv)
+
+    resultado = executar(args.linhas, args.modo, args.sessoes, args.reruns, args.processos)
+    resultado['pid'] = os.getpid()
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        args.saida.write_text(texto + '\n')
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
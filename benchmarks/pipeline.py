@@ -0,0 +1,219 @@
+"""Benchmark das etapas do fluxo do ``airbnb_v3.py`` com listings sintéticos.
+
+Roda offline, em vários tamanhos, e grava o resultado em JSON para comparar
+commits::
+
+    python -m benchmarks.pipeline --linhas 10000 100000 1000000 --saida bench.json
+    python -m benchmarks.pipeline --comparar antes.json depois.json
+
+Cada etapa é repetida ``--repeticoes`` vezes; o JSON guarda o mínimo e a
+mediana em segundos. Etapas que dependem de Altair ou pydeck são puladas
+quando o pacote não está instalado.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from nucleo import analise
+from nucleo.carregamento import LINHAS_AMOSTRA
+from nucleo.cubo import Cubo
+from nucleo.filtros import MotorFiltros
+from nucleo.limpeza import converter_numero
+from nucleo.mapa import IndiceEspacial
+from nucleo.robusto import EstatisticasRobustas
+from nucleo.series import SerieTemporal, rollup_listings
+from nucleo.sintetico import gravar_csv
+from nucleo.snapshot import Snapshot
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+
+
+def cronometrar(funcao, repeticoes):
+    """Executa ``funcao`` ``repeticoes`` vezes; devolve (estatísticas, último resultado)."""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {'min': min(tempos), 'mediana': statistics.median(tempos), 'repeticoes': repeticoes}, resultado
+
+
+def _filtros(snapshot):
+    # Uma seleção típica da barra lateral: bairro, faixa de preço e período
+    bairro = snapshot.df['neighbourhood'].value_counts().index[0]
+    return {
+        'bairro': bairro,
+        'preco': (100.0, 800.0),
+        'datas': (pd.Timestamp('2023-01-01'), pd.Timestamp('2024-06-30')),
+    }
+
+
+def _graficos(paineis, mensal):
+    from nucleo import graficos
+
+    return [
+        graficos.bairros_mais_caros(paineis.media_preco_bairro).to_dict(),
+        graficos.avaliacoes_por_bairro(paineis.avaliacoes_por_bairro).to_dict(),
+        graficos.avaliacoes_por_tipo(paineis.avaliacoes_por_tipo).to_dict(),
+        graficos.top_anfitrioes(paineis.top_anfitrioes).to_dict(),
+        graficos.avaliacoes_por_mes(mensal).to_dict(),
+    ]
+
+
+def _modulo_disponivel(nome):
+    try:
+        __import__(nome)
+    except ImportError:
+        return False
+    return True
+
+
+def medir(linhas, repeticoes, diretorio):
+    """Tempos de cada etapa do pipeline para ``linhas`` listings sintéticos."""
+    etapas = {}
+    csv = Path(diretorio) / f'listings-{linhas}.csv'
+    inicio = time.perf_counter()
+    gravar_csv(linhas, csv)
+    geracao = time.perf_counter() - inicio
+
+    etapas['leitura_csv'], cru = cronometrar(lambda: pd.read_csv(csv), repeticoes)
+    # Prévia da primeira carga: o que separa o início da sessão da primeira pintura útil
+    etapas['leitura_amostra'], _ = cronometrar(
+        lambda: analise.limpar(pd.read_csv(csv, nrows=LINHAS_AMOSTRA)), repeticoes)
+    etapas['limpeza_preco'], _ = cronometrar(lambda: converter_numero(cru['price']), repeticoes)
+    etapas['tipagem'], df = cronometrar(lambda: analise.limpar(cru), repeticoes)
+    del cru
+
+    parquet = Path(diretorio) / f'listings-{linhas}.parquet'
+    etapas['escrita_parquet'], _ = cronometrar(lambda: df.to_parquet(parquet, index=False), repeticoes)
+    etapas['leitura_parquet'], _ = cronometrar(lambda: pd.read_parquet(parquet), repeticoes)
+
+    # Estruturas derivadas montadas do zero (sem o memo por snapshot)
+    etapas['motor_filtros'], _ = cronometrar(lambda: MotorFiltros(df), repeticoes)
+    etapas['cubo'], _ = cronometrar(lambda: Cubo(df), repeticoes)
+    etapas['indice_espacial'], _ = cronometrar(lambda: IndiceEspacial(df), repeticoes)
+    etapas['estatisticas_robustas'], _ = cronometrar(lambda: EstatisticasRobustas(df), repeticoes)
+    etapas['series_mensais'], _ = cronometrar(lambda: SerieTemporal(rollup_listings(df)), repeticoes)
+
+    # As etapas seguintes medem o rerun da página, com as estruturas do snapshot já prontas
+    snapshot = Snapshot(df, str(csv), 'bench')
+    snapshot.cubo, snapshot.indice_espacial
+    filtros = _filtros(snapshot)
+    # Sem cache de máscaras, toda chamada recalcula a partir dos índices
+    sem_cache = MotorFiltros(df, max_mascaras=0)
+    etapas['mascara_fria'], _ = cronometrar(lambda: sem_cache.mascara(**filtros), repeticoes)
+    snapshot.motor.mascara(**filtros)
+    etapas['mascara_cache'], _ = cronometrar(lambda: snapshot.motor.mascara(**filtros), repeticoes)
+    etapas['agregacao'], paineis = cronometrar(lambda: analise.agregar(snapshot, **filtros), repeticoes)
+    etapas['avaliacoes_por_mes'], mensal = cronometrar(
+        lambda: analise.avaliacoes_por_mes(snapshot, paineis.mascara, filtros['datas']), repeticoes)
+
+    # Referência: as mesmas tabelas com group-by do pandas sobre a seleção filtrada
+    def groupby_pandas():
+        selecao = df[paineis.mascara]
+        return (
+            selecao.groupby('neighbourhood', observed=True)['price'].mean(),
+            selecao.groupby('neighbourhood', observed=True)['number_of_reviews'].sum(),
+            selecao.groupby('room_type', observed=True)['number_of_reviews'].sum(),
+            selecao.groupby('host_name', observed=True)['number_of_reviews'].sum().nlargest(10),
+        )
+    etapas['groupby_pandas'], _ = cronometrar(groupby_pandas, repeticoes)
+
+    if _modulo_disponivel('altair'):
+        etapas['graficos'], _ = cronometrar(lambda: _graficos(paineis, mensal), repeticoes)
+
+    etapas['dados_mapa'], (tipo, dados) = cronometrar(
+        lambda: analise.dados_do_mapa(snapshot, paineis.mascara), repeticoes)
+    if _modulo_disponivel('pydeck'):
+        from nucleo import graficos
+
+        etapas['serializacao_mapa'], payload = cronometrar(
+            lambda: graficos.mapa(tipo, dados).to_json(), repeticoes)
+    else:
+        etapas['serializacao_mapa'], payload = cronometrar(
+            lambda: dados.to_json(orient='records'), repeticoes)
+
+    return {
+        'linhas': linhas,
+        'geracao_csv': geracao,
+        'bytes_csv': csv.stat().st_size,
+        'bytes_parquet': parquet.stat().st_size,
+        'memoria_df': int(df.memory_usage(deep=True).sum()),
+        'linhas_selecionadas': int(np.count_nonzero(paineis.mascara)),
+        'mapa': {'tipo': tipo, 'linhas': len(dados), 'bytes': len(payload)},
+        'etapas': etapas,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(tamanhos, repeticoes=3):
+    with tempfile.TemporaryDirectory(prefix='bench-airbnb-') as diretorio:
+        resultados = []
+        for linhas in tamanhos:
+            resultados.append(medir(linhas, repeticoes, diretorio))
+            print(f'{linhas:>10} linhas ok', file=sys.stderr)
+    return {
+        'commit': _commit(),
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'maquina': platform.platform(),
+        'resultados': resultados,
+    }
+
+
+def comparar(antes, depois):
+    """Linhas ``(linhas, etapa, antes, depois, razão)`` com a mediana de cada etapa."""
+    por_tamanho = {r['linhas']: r['etapas'] for r in antes['resultados']}
+    for resultado in depois['resultados']:
+        anteriores = por_tamanho.get(resultado['linhas'], {})
+        for etapa, tempos in resultado['etapas'].items():
+            if etapa in anteriores:
+                a, d = anteriores[etapa]['mediana'], tempos['mediana']
+                yield resultado['linhas'], etapa, a, d, d / a if a else float('inf')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=TAMANHOS_PADRAO,
+                        help='tamanhos a medir (até 10.000.000)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', type=Path, help='arquivo JSON de saída (padrão: stdout)')
+    parser.add_argument('--comparar', type=Path, nargs=2, metavar=('ANTES', 'DEPOIS'),
+                        help='compara dois JSON gerados por este script')
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        antes, depois = (json.loads(p.read_text()) for p in args.comparar)
+        for linhas, etapa, a, d, razao in comparar(antes, depois):
+            print(f'{linhas:>10} {etapa:<20} {a * 1000:10.2f} ms {d * 1000:10.2f} ms  x{razao:.2f}')
+        return
+
+    texto = json.dumps(executar(args.linhas, args.repeticoes), indent=2, ensure_ascii=False)
+    if args.saida:
+        args.saida.write_text(texto + '\n')
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
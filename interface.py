@@ -0,0 +1,242 @@
+"""Componentes Streamlit compartilhados pelos dashboards."""
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from nucleo import instrumentacao
+from nucleo.analise import limites_preco, metricas, vizinhanca
+from nucleo.carregamento import carregar_em_segundo_plano
+from nucleo.filtros import TODOS
+from nucleo.graficos import LATITUDE_RJ, LONGITUDE_RJ
+from nucleo.limpeza import formatar_moeda, formatar_moeda_coluna
+from nucleo.mapa import ID_CAMADA
+
+LOGO_URL = "https://logodownload.org/wp-content/uploads/2016/10/airbnb-logo-0.png"
+
+# Exibição do mapa: a automática agrega os pontos em células quando passam de 20 mil
+AGRUPAMENTO_MAPA = {'Automática': None, 'Pontos': False, 'Agrupada': True}
+
+# Janelas da média móvel das séries mensais (meses)
+JANELAS_TENDENCIA = [1, 3, 6, 12]
+
+# Espera (s) depois de uma mudança de filtro antes de calcular, para juntar mudanças seguidas
+DEBOUNCE = float(os.environ.get('AIRBNB_DEBOUNCE', '0.3'))
+
+
+def barra_lateral(snapshot):
+    """Desenha os filtros da barra lateral e retorna ``(filtros, agrupar_mapa)``."""
+    df = snapshot.df
+
+    # Logo na barra lateral
+    st.sidebar.image(LOGO_URL, use_container_width=True)
+
+    st.sidebar.subheader('Filtros:')
+    data_min = df['last_review'].min()
+    data_max = df['last_review'].max()
+
+    # Seleção do intervalo de datas no menu lateral
+    intervalo_datas = st.sidebar.date_input(
+        "Selecione o intervalo de datas",
+        [data_min, data_max],
+        min_value=data_min,
+        max_value=data_max
+    )
+
+    # Enquanto só a data inicial foi escolhida, o intervalo vai até a última avaliação
+    if len(intervalo_datas) == 2:
+        data_inicio, data_fim = intervalo_datas
+    else:
+        data_inicio, data_fim = intervalo_datas[0], data_max
+
+    # Anúncios que nunca foram avaliados não têm data de última avaliação
+    incluir_sem_avaliacao = st.sidebar.checkbox("Incluir anúncios sem avaliação", value=True)
+
+    # Filtro de bairros
+    bairro_selecionado = st.sidebar.selectbox("Selecione o Bairro", [TODOS] + snapshot.bairros)
+
+    # Filtro de tipo de quarto
+    tipo_quarto_selecionado = st.sidebar.selectbox("Selecione o Tipo de Quarto", [TODOS] + snapshot.tipos_quarto)
+
+    # Preços atípicos (fora das cercas de Tukey do bairro e tipo de quarto) fora dos agregados e do slider
+    robusto = st.sidebar.toggle(
+        "Desconsiderar preços atípicos",
+        help=f"{snapshot.robusto.n_atipicos} anúncios com preço fora de Q1 - 1,5·IQR e Q3 + 1,5·IQR "
+             "do seu bairro e tipo de quarto"
+    )
+
+    # Filtro de preço (no modo aproximado ou robusto, sem os extremos absurdos)
+    limite_min, limite_max = limites_preco(snapshot, robusto=robusto)
+    preco_min, preco_max = st.sidebar.slider(
+        "Selecione o Intervalo de Preços (R$)",
+        limite_min, limite_max, (limite_min, limite_max)
+    )
+
+    exibicao_mapa = st.sidebar.radio("Exibição do mapa", list(AGRUPAMENTO_MAPA))
+
+    filtros = dict(
+        bairro=bairro_selecionado,
+        tipo_quarto=tipo_quarto_selecionado,
+        preco=(preco_min, preco_max),
+        datas=(data_inicio, data_fim),
+        incluir_sem_data=incluir_sem_avaliacao,
+        robusto=robusto,
+    )
+    return filtros, AGRUPAMENTO_MAPA[exibicao_mapa]
+
+
+def janela_tendencia():
+    """Janela (meses) da média móvel dos painéis de tendência, escolhida na barra lateral."""
+    return st.sidebar.select_slider("Média móvel das tendências (meses)", JANELAS_TENDENCIA, value=3)
+
+
+def aguardar_filtros(filtros, agrupar_mapa=None, janela=DEBOUNCE):
+    """Debounce: quando os controles acabaram de mudar, espera ``janela`` segundos antes de calcular.
+
+    Se outro controle mudar durante a espera, o Streamlit interrompe este rerun
+    no próximo comando ``st.*`` e começa o novo: os estados intermediários de
+    um slider arrastado não chegam a ser calculados.
+    """
+    atual = (filtros, agrupar_mapa)
+    anterior = st.session_state.get('_controles')
+    st.session_state['_controles'] = atual
+    if janela and anterior is not None and anterior != atual:
+        time.sleep(janela)
+        st.empty()  # ponto de verificação: aqui o rerun para se já houver outro pedido
+
+
+def memoria_grafo():
+    """Memória do grafo de painéis desta sessão (valores e impressões entre reruns)."""
+    return st.session_state.setdefault('_grafo_paineis', {})
+
+
+def aviso_previa(snapshot, completo):
+    """Avisa que os painéis mostram uma prévia enquanto o snapshot completo carrega."""
+    if not completo:
+        st.info(f'Prévia com os primeiros {len(snapshot)} anúncios: os painéis serão atualizados '
+                'quando o snapshot completo terminar de carregar.')
+
+
+def aguardar_snapshot(snapshot, completo):
+    """Com a prévia já na tela, espera a carga completa e refaz o rerun com o snapshot inteiro."""
+    if completo:
+        return
+    with st.spinner('Carregando o snapshot completo...'):
+        carregar_em_segundo_plano(snapshot.fonte).result()
+    st.rerun()
+
+
+def espaco_reservado(mensagem):
+    """Espaço de um painel que é desenhado depois dos demais, com ``mensagem`` até lá."""
+    espaco = st.empty()
+    espaco.caption(mensagem)
+    return espaco
+
+
+def mapa(deck, espaco=None):
+    """Desenha o mapa com seleção por clique; retorna ``(latitude, longitude)`` do ponto clicado ou ``None``."""
+    estado = (espaco or st).pydeck_chart(deck, on_select='rerun', selection_mode='single-object', key='mapa')
+    objetos = (estado.selection.get('objects') or {}).get(ID_CAMADA) if estado else None
+    if not objetos:
+        return None
+    return float(objetos[0]['latitude']), float(objetos[0]['longitude'])
+
+
+def painel_vizinhanca(snapshot, mascara, ponto=None):
+    """Listings no raio e mais próximos do ponto clicado no mapa (ou informado na barra lateral)."""
+    with st.sidebar.expander('Vizinhança de um ponto', expanded=ponto is not None):
+        st.caption('Clique num ponto do mapa ou informe as coordenadas.')
+        latitude, longitude = ponto or (LATITUDE_RJ, LONGITUDE_RJ)
+        latitude = st.number_input('Latitude', -90.0, 90.0, latitude, format='%.5f')
+        longitude = st.number_input('Longitude', -180.0, 180.0, longitude, format='%.5f')
+        raio = st.slider('Raio (km)', 0.1, 10.0, 1.0, 0.1)
+        k = st.slider('Anúncios mais próximos', 1, 50, 10)
+
+    vizinhos = vizinhanca(snapshot, latitude, longitude, raio_km=raio, k=k, mascara=mascara)
+    st.subheader('Vizinhança do Ponto')
+    st.caption(f'{latitude:.5f}, {longitude:.5f} · raio de {raio:.1f} km, com os filtros da barra lateral')
+    col1, col2, col3 = st.columns(3)
+    col1.metric(label="Anúncios no Raio", value=vizinhos.resumo['listings'])
+    col2.metric(label="Preço Médio no Raio (R$)", value=formatar_moeda(vizinhos.resumo['preco_medio']))
+    col3.metric(label="Preço Mediano no Raio (R$)", value=formatar_moeda(vizinhos.resumo['preco_mediano']))
+    tabela = vizinhos.listings.assign(price=formatar_moeda_coluna(vizinhos.listings['price']))
+    st.dataframe(tabela[['name', 'neighbourhood', 'room_type', 'price', 'number_of_reviews', 'distancia_km']], hide_index=True)
+
+
+def painel_anfitriao(snapshot, top, mascara):
+    """Totais e listings de um anfitrião do ranking, escolhido numa caixa de seleção."""
+    if top.empty:
+        return
+    rotulo = st.selectbox('Detalhe do anfitrião', top['anfitriao'])
+    host_id = int(top.loc[top['anfitriao'] == rotulo, 'host_id'].iloc[0])
+    totais = snapshot.anfitrioes.totais.loc[host_id]
+    st.caption(f"{totais['host_name']} (id {host_id}): {totais['listings']} anúncios e "
+               f"{totais['number_of_reviews']} avaliações no snapshot, preço médio de "
+               f"{formatar_moeda(totais['price'])}. Abaixo, os anúncios dentro dos filtros da barra lateral.")
+    listings = snapshot.anfitrioes.detalhe(snapshot.df, host_id, mascara)
+    tabela = listings.assign(price=formatar_moeda_coluna(listings['price']))
+    st.dataframe(tabela[['name', 'neighbourhood', 'room_type', 'price', 'number_of_reviews', 'last_review']], hide_index=True)
+
+
+def big_numbers(resumo):
+    """Big Numbers no topo da página, a partir do ``Resumo`` do cubo ou do dict de ``metricas``."""
+    valores = resumo if isinstance(resumo, dict) else metricas(resumo)
+    col1, col2, col3 = st.columns(3)
+    col1.metric(label="Total de Avaliações", value=valores['total_avaliacoes'])
+    col2.metric(label="Média de Preço (R$)", value=formatar_moeda(valores['preco_medio']))
+    col3.metric(label="Média Minima de Noites", value=int(round(valores['media_noites_minimas'])))
+
+
+def grafico(spec):
+    """Desenha um gráfico Altair ou uma spec Vega-Lite já pronta (relatório pré-calculado)."""
+    if isinstance(spec, dict):
+        st.vega_lite_chart(spec)
+    else:
+        st.altair_chart(spec)
+
+
+@contextmanager
+def medicao_rerun():
+    """Mede o bloco ``with`` (o rerun) com ``AIRBNB_DEBUG``/``AIRBNB_METRICAS`` ou ``?debug=1``.
+
+    A medição é finalizada mesmo quando o rerun é interrompido (novo rerun
+    pedido no debounce, ``st.stop``); o painel de desempenho só é desenhado
+    quando o bloco termina. O pico de memória só é medido com
+    ``AIRBNB_DEBUG=memoria``: o ``tracemalloc`` vale para o processo inteiro e
+    não é ligado por sessão.
+    """
+    if not st.query_params.get('debug') and not instrumentacao.habilitada():
+        yield None
+        return
+    with instrumentacao.medir('rerun') as medicao:
+        yield medicao
+    painel_debug(medicao.como_dict())
+
+
+def painel_debug(dados):
+    """Mostra etapas, caches e payloads de uma medição finalizada numa seção da barra lateral."""
+    with st.sidebar.expander(f"Desempenho do rerun: {dados['segundos'] * 1000:.0f} ms"):
+        etapas = pd.DataFrame(dados['etapas'])
+        etapas['etapa'] = ['· ' * nivel + nome for nivel, nome in zip(etapas['nivel'], etapas['nome'])]
+        etapas['ms'] = (etapas['segundos'] * 1000).round(1)
+        colunas = ['etapa', 'ms']
+        if 'pico_memoria' in etapas:
+            etapas['pico (MB)'] = (etapas['pico_memoria'] / 2 ** 20).round(1)
+            colunas.append('pico (MB)')
+        st.dataframe(etapas[colunas], hide_index=True)
+
+        if dados['marcos']:
+            st.caption('Marcos (ms desde o início do rerun)')
+            marcos = pd.Series(dados['marcos'], name='ms').mul(1000).round(1)
+            st.dataframe(marcos.rename_axis('marco').reset_index(), hide_index=True)
+
+        if dados['contadores']:
+            st.caption('Caches')
+            st.dataframe(pd.Series(dados['contadores'], name='vezes').rename_axis('contador').reset_index(), hide_index=True)
+        if dados['payloads']:
+            st.caption('Payloads')
+            payloads = pd.Series(dados['payloads'], name='bytes').rename_axis('payload').reset_index()
+            payloads['KB'] = (payloads.pop('bytes') / 1024).round(1)
+            st.dataframe(payloads, hide_index=True)
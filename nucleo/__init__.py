@@ -0,0 +1,45 @@
+"""Núcleo de análise dos listings do Airbnb, independente do Streamlit.
+
+Os submódulos são importados sob demanda: ``import nucleo`` não carrega pandas,
+Streamlit, pydeck nem o cliente do Gemini. As funções principais ficam
+disponíveis direto no pacote::
+
+    import nucleo
+
+    snapshot = nucleo.carregar()
+    paineis = nucleo.agregar(snapshot, bairro='Copacabana')
+"""
+import importlib
+
+# Nome exportado -> submódulo que o define
+_EXPORTS = {
+    'Snapshot': 'nucleo.snapshot',
+    'carregar': 'nucleo.analise',
+    'limpar': 'nucleo.analise',
+    'filtrar': 'nucleo.analise',
+    'agregar': 'nucleo.analise',
+    'resumir': 'nucleo.analise',
+    'avaliacoes_por_mes': 'nucleo.analise',
+    'dados_do_mapa': 'nucleo.analise',
+    'tendencia': 'nucleo.analise',
+    'decaimento': 'nucleo.analise',
+    'vizinhanca': 'nucleo.analise',
+    'metricas': 'nucleo.analise',
+    'limites_preco': 'nucleo.analise',
+    'Paineis': 'nucleo.analise',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(nome):
+    modulo = _EXPORTS.get(nome)
+    if modulo is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {nome!r}')
+    valor = getattr(importlib.import_module(modulo), nome)
+    globals()[nome] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,191 @@
+"""Funções puras de carga, limpeza, filtro e agregação usadas pelos dashboards.
+
+Nada aqui depende do Streamlit: as mesmas funções servem para jobs em lote,
+APIs e benchmarks.
+"""
+import os
+from concurrent.futures import TimeoutError as TempoEsgotado
+from typing import NamedTuple
+
+import pandas as pd
+
+from nucleo.carregamento import (FONTE_PADRAO, amostra_listings, carregar_em_segundo_plano, carregar_listings,
+                                  tipar_listings, versao_fonte)
+from nucleo.cubo import Resumo
+from nucleo.instrumentacao import cronometrado, payload
+from nucleo.mapa import dados_mapa
+from nucleo.snapshot import Snapshot
+
+# Modo aproximado: limites do slider de preço pelos quantis do esboço KLL
+APROXIMADO = bool(os.environ.get('AIRBNB_APROXIMADO'))
+CAUDA_PRECO = 0.005
+
+COLUNAS_VIZINHANCA = ['id', 'name', 'neighbourhood', 'room_type', 'price', 'number_of_reviews', 'latitude', 'longitude']
+
+# Tempo (s) esperando a carga completa antes de mostrar a prévia por amostra
+ESPERA_PREVIA = float(os.environ.get('AIRBNB_ESPERA_PREVIA', '0.5'))
+
+
+class Vizinhanca(NamedTuple):
+    """Listings perto de um ponto e as estatísticas deles."""
+    listings: pd.DataFrame
+    resumo: dict
+
+
+class Paineis(NamedTuple):
+    """Tudo que os painéis precisam para uma seleção de filtros."""
+    mascara: object
+    resumo: Resumo
+    media_preco_bairro: pd.DataFrame
+    avaliacoes_por_bairro: pd.DataFrame
+    avaliacoes_por_tipo: pd.DataFrame
+    top_anfitrioes: pd.DataFrame
+
+
+@cronometrado('carga')
+def carregar(fonte=None):
+    """Snapshot da ``fonte`` (URL ou arquivo local), pelo cache de ``carregar_listings``."""
+    fonte = str(fonte or FONTE_PADRAO)
+    snapshot = Snapshot(carregar_listings(fonte), fonte, versao_fonte(fonte))
+    payload('snapshot', lambda: snapshot.memoria)
+    return snapshot
+
+
+@cronometrado('carga')
+def carregar_progressivo(fonte=None, espera=ESPERA_PREVIA):
+    """``(snapshot, completo)``: o snapshot completo ou, se ele não carregar em ``espera``
+    segundos, uma prévia com as primeiras linhas da fonte enquanto a carga segue numa thread.
+
+    A prévia tem versão própria (``<versao>-amostra``), então nada calculado
+    sobre ela é confundido com o snapshot completo.
+    """
+    fonte = str(fonte or FONTE_PADRAO)
+    futuro = carregar_em_segundo_plano(fonte)
+    try:
+        snapshot, completo = Snapshot(futuro.result(timeout=espera), fonte, versao_fonte(fonte)), True
+    except TempoEsgotado:
+        snapshot, completo = Snapshot(amostra_listings(fonte), fonte, f'{versao_fonte(fonte)}-amostra'), False
+    # Memória do DataFrame do snapshot no painel de desempenho
+    payload('snapshot', lambda: snapshot.memoria)
+    return snapshot, completo
+
+
+def limpar(df):
+    """Converte um DataFrame cru do CSV para os tipos usados nas análises (sem alterar ``df``)."""
+    return tipar_listings(df)
+
+
+def limites_preco(snapshot, aproximado=None, cauda=CAUDA_PRECO, robusto=False):
+    """Extremos do slider de preço.
+
+    Mínimo e máximo exatos ou, no modo aproximado, os quantis ``cauda`` e
+    ``1 - cauda`` do esboço KLL, que deixam de fora os preços absurdos. Com
+    ``robusto``, o menor e o maior preço típico (``nucleo.robusto``).
+    """
+    if aproximado is None:
+        aproximado = APROXIMADO
+    if robusto:
+        inicio, fim = snapshot.robusto.limites
+    elif aproximado:
+        inicio, fim = snapshot.esbocos['precos'].quantil([cauda, 1 - cauda])
+    else:
+        inicio, fim = snapshot.df['price'].min(), snapshot.df['price'].max()
+    return float(inicio), float(fim)
+
+
+@cronometrado('mascara')
+def filtrar(snapshot, robusto=False, **filtros):
+    """Máscara booleana (somente leitura) das linhas selecionadas; ver ``MotorFiltros.mascara``.
+
+    Com ``robusto``, sem as linhas de preço atípico.
+    """
+    mascara = snapshot.motor.mascara(**filtros)
+    if robusto:
+        mascara = mascara & snapshot.robusto.tipicos
+        mascara.flags.writeable = False
+    return mascara
+
+
+def resumir(snapshot, robusto=False, **filtros):
+    """``Resumo`` do cubo para a seleção (do cubo só com preços típicos, com ``robusto``)."""
+    cubo = snapshot.cubo_robusto if robusto else snapshot.cubo
+    return cubo.resumo(**filtros)
+
+
+@cronometrado('agregacao')
+def agregar(snapshot, top=10, robusto=False, **filtros):
+    """Tabelas dos painéis para a seleção, a partir do cubo do snapshot."""
+    mascara = filtrar(snapshot, robusto, **filtros)
+    resumo = resumir(snapshot, robusto, **filtros)
+    por_bairro = resumo.por_bairro()
+    por_tipo_quarto = resumo.por_tipo_quarto()
+    return Paineis(
+        mascara=mascara,
+        resumo=resumo,
+        media_preco_bairro=por_bairro[['neighbourhood', 'price']].sort_values('price', ascending=False).head(top),
+        avaliacoes_por_bairro=por_bairro[['neighbourhood', 'number_of_reviews']].sort_values('number_of_reviews', ascending=False),
+        avaliacoes_por_tipo=por_tipo_quarto[['room_type', 'number_of_reviews']].sort_values('number_of_reviews', ascending=False),
+        top_anfitrioes=snapshot.anfitrioes.top(mascara, k=top),
+    )
+
+
+def metricas(resumo):
+    """Big numbers da seleção."""
+    return {
+        'listings': resumo.total_listings,
+        'total_avaliacoes': resumo.total_avaliacoes,
+        'preco_medio': resumo.preco_medio,
+        'media_noites_minimas': resumo.media_noites,
+    }
+
+
+@cronometrado('avaliacoes_por_mes')
+def avaliacoes_por_mes(snapshot, mascara, datas=None):
+    """Soma de ``reviews_per_month`` por mês da última avaliação."""
+    serie = snapshot.motor.serie_mensal(snapshot.df['reviews_per_month'].to_numpy(), mascara=mascara, datas=datas)
+    return serie.rename_axis('mes').reset_index(name='reviews_per_month')
+
+
+@cronometrado('tendencia')
+def tendencia(snapshot, bairro=None, tipo_quarto=None, datas=None, janela=1):
+    """Listings ativos, avaliações e ocupação estimada por mês (``nucleo.series``), em média móvel de ``janela`` meses.
+
+    A série é agregada por mês, bairro e tipo de quarto: filtros de preço não se aplicam.
+    """
+    inicio, fim = datas if datas is not None else (None, None)
+    return snapshot.series.mensal(bairro, tipo_quarto, inicio, fim, janela)
+
+
+@cronometrado('decaimento')
+def decaimento(snapshot, bairro=None, tipo_quarto=None, meses=36):
+    """Listings por meses desde a última avaliação, até ``meses`` meses."""
+    return snapshot.series.decaimento(bairro, tipo_quarto).head(meses + 1)
+
+
+@cronometrado('vizinhanca')
+def vizinhanca(snapshot, latitude, longitude, raio_km=None, k=None, mascara=None):
+    """Listings a até ``raio_km`` do ponto ou os ``k`` mais próximos dele.
+
+    ``resumo`` traz as estatísticas de preço e avaliações de todos os listings
+    do raio (ou dos ``k`` mais próximos, sem raio). ``listings`` traz as
+    colunas de identificação, preço, avaliações e a distância em km, do mais
+    perto ao mais longe; com raio e ``k``, só os ``k`` mais próximos do raio.
+    """
+    indice = snapshot.indice_espacial
+    if raio_km is not None:
+        posicoes, distancias = indice.no_raio(latitude, longitude, raio_km, mascara)
+    else:
+        posicoes, distancias = indice.mais_proximos(latitude, longitude, k or 10, mascara)
+    resumo = indice.resumir(posicoes, distancias)
+    if k is not None:
+        posicoes, distancias = posicoes[:k], distancias[:k]
+    colunas = [c for c in COLUNAS_VIZINHANCA if c in snapshot.df]
+    listings = snapshot.df.iloc[posicoes][colunas].reset_index(drop=True)
+    listings['distancia_km'] = distancias.round(3)
+    return Vizinhanca(listings, resumo)
+
+
+@cronometrado('dados_mapa')
+def dados_do_mapa(snapshot, mascara, zoom=10, janela=None, agrupar=None):
+    """Dados do mapa (``('pontos' | 'grade', DataFrame)``) para as linhas com avaliações."""
+    return dados_mapa(snapshot.df, mascara, zoom=zoom, janela=janela, agrupar=agrupar)
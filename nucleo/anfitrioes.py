@@ -0,0 +1,102 @@
+"""Dimensão de anfitriões do snapshot, indexada pelo ``host_id``.
+
+``host_name`` é texto livre: anfitriões diferentes com o mesmo primeiro nome
+se misturam num group-by por nome. Aqui cada anfitrião é um código inteiro
+(posição do ``host_id`` na lista ordenada de ids), com o nome guardado uma vez
+por anfitrião, e os totais por anfitrião são calculados uma única vez. Rankings
+da seleção são ``np.bincount`` sobre esses códigos e o detalhe de um anfitrião
+é uma fatia das linhas já ordenadas por código.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.cache import por_snapshot
+
+
+class DimensaoAnfitrioes:
+    """Códigos, nomes e totais por ``host_id``."""
+
+    def __init__(self, df):
+        host_id = df['host_id'].to_numpy()
+        validos = ~pd.isna(host_id)
+        self.ids, primeiras, codigos = np.unique(host_id[validos].astype(np.int64), return_index=True, return_inverse=True)
+        self.codigo = np.full(len(df), -1, dtype=np.int64)
+        self.codigo[validos] = codigos
+        self.n = len(self.ids)
+
+        # Nome de cada anfitrião (o da primeira linha dele), como categoria: cada texto é guardado uma vez
+        linhas_validas = np.flatnonzero(validos)
+        self.nomes = pd.Categorical(df['host_name'].to_numpy()[linhas_validas[primeiras]])
+
+        # Linhas agrupadas por anfitrião para o detalhe
+        self.ordem = linhas_validas[np.argsort(codigos, kind='stable')]
+        self.inicio = np.r_[0, np.cumsum(np.bincount(codigos, minlength=self.n))]
+
+        self.avaliacoes = df['number_of_reviews'].to_numpy(dtype=float)
+        precos = df['price'].to_numpy(dtype=float)
+        disponibilidade = df['availability_365'].to_numpy(dtype=float) if 'availability_365' in df else np.full(len(df), np.nan)
+        self.totais = pd.DataFrame({
+            'host_name': self.nomes,
+            'listings': np.bincount(codigos, minlength=self.n),
+            'number_of_reviews': self._somar(linhas_validas, self.avaliacoes).astype(np.int64),
+            'price': self._media(linhas_validas, precos),
+            'availability_365': self._media(linhas_validas, disponibilidade),
+        }, index=pd.Index(self.ids, name='host_id'))
+
+    def _somar(self, linhas, valores):
+        valores = np.nan_to_num(valores[linhas])
+        return np.bincount(self.codigo[linhas], weights=valores, minlength=self.n)
+
+    def _media(self, linhas, valores):
+        presentes = ~np.isnan(valores[linhas])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._somar(linhas, valores) / np.bincount(self.codigo[linhas], weights=presentes, minlength=self.n)
+
+    def codigos(self, host_ids):
+        """Códigos dos ``host_ids`` (-1 para ids que não estão no snapshot)."""
+        host_ids = np.asarray(host_ids, dtype=np.int64)
+        if not self.n:
+            return np.full(len(host_ids), -1, dtype=np.int64)
+        posicoes = np.minimum(np.searchsorted(self.ids, host_ids), self.n - 1)
+        return np.where(self.ids[posicoes] == host_ids, posicoes, -1)
+
+    def top(self, mascara=None, k=10):
+        """Anfitriões com mais avaliações entre as linhas da máscara (todas, sem máscara).
+
+        Retorna ``host_id``, ``host_name``, ``number_of_reviews`` e ``anfitriao``,
+        o rótulo do gráfico: o nome, com o id quando dois do topo têm o mesmo nome.
+        """
+        linhas = np.flatnonzero(self.codigo >= 0) if mascara is None else np.flatnonzero(mascara)
+        linhas = linhas[self.codigo[linhas] >= 0]
+        somas = self._somar(linhas, self.avaliacoes)
+        presentes = np.flatnonzero(np.bincount(self.codigo[linhas], minlength=self.n))
+        topo = presentes[np.argsort(-somas[presentes], kind='stable')[:k]]
+
+        nomes = pd.Series(np.asarray(self.nomes)[topo], dtype=object)
+        repetidos = nomes.duplicated(keep=False) | nomes.isna()
+        rotulos = nomes.where(~repetidos, nomes.fillna('?') + ' (' + pd.Series(self.ids[topo].astype(str), dtype=object) + ')')
+        return pd.DataFrame({
+            'host_id': self.ids[topo],
+            'host_name': nomes,
+            'number_of_reviews': somas[topo].astype(np.int64),
+            'anfitriao': rotulos,
+        })
+
+    def linhas(self, host_id):
+        """Posições das linhas do anfitrião ``host_id`` (vazio se não existir)."""
+        codigo = self.codigos([host_id])[0]
+        if codigo < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.ordem[self.inicio[codigo]:self.inicio[codigo + 1]]
+
+    def detalhe(self, df, host_id, mascara=None):
+        """Listings do anfitrião ``host_id`` no snapshot ``df`` (só os da máscara, se informada)."""
+        linhas = self.linhas(host_id)
+        if mascara is not None:
+            linhas = linhas[np.asarray(mascara)[linhas]]
+        return df.iloc[linhas]
+
+
+def dimensao_anfitrioes(df):
+    """Dimensão de anfitriões do snapshot ``df``, criada na primeira chamada e reaproveitada depois."""
+    return por_snapshot(df, 'anfitrioes', lambda: DimensaoAnfitrioes(df))
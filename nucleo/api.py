@@ -0,0 +1,404 @@
+"""API HTTP leve com as agregações dos dashboards, sem dependências além do pandas.
+
+As rotas respondem JSON para qualquer combinação de filtros, usando o mesmo
+motor de filtros, cubo e dimensão de anfitriões do ``airbnb_v3.py``::
+
+    python -m nucleo.api --porta 8000
+    python -m nucleo.api --sintetico 50000      # snapshot sintético local
+
+    GET /metricas?bairro=Copacabana&preco_min=100&preco_max=800
+    GET /precos/bairros?tipo_quarto=Private%20room&pagina=2&por_pagina=20
+    GET /avaliacoes/bairros?data_inicio=2023-01-01&data_fim=2023-12-31
+    GET /avaliacoes/tipos
+    GET /avaliacoes/mes
+    GET /anfitrioes/top?k=20
+    GET /anfitrioes/12345?bairro=Copacabana
+    GET /precos/robustos?por=tipo_quarto
+    GET /atividade/mes?bairro=Copacabana&janela=3
+    GET /atividade/bairros?data_inicio=2023-01-01
+
+Filtros: ``bairro``, ``tipo_quarto``, ``preco_min``, ``preco_max``,
+``data_inicio``, ``data_fim``, ``incluir_sem_data`` e ``robusto`` (``1``/``0``,
+sem os preços atípicos). Sem ``preco_*`` vale a faixa inteira, como o slider
+do dashboard. As listas longas são paginadas (``pagina``, ``por_pagina``).
+``/anfitrioes/<host_id>`` traz os totais do anfitrião no snapshot inteiro e,
+paginados, os listings dele que passam pelos filtros. ``/precos/robustos``
+traz mediana, IQR, MAD e médias robustas do snapshot inteiro, por bairro ou
+por tipo de quarto, e não usa os filtros. As rotas de
+``/atividade`` saem da série mensal do snapshot (``nucleo.series``), que só
+tem bairro, tipo de quarto e as datas como recorte.
+
+O ETag de cada resposta é derivado da versão do snapshot e dos parâmetros
+normalizados, então ``If-None-Match`` responde 304 sem recalcular nada e
+deixa de bater quando o snapshot muda. As respostas prontas ficam num
+``CacheTTL``; o cálculo roda numa thread para não travar o laço de eventos.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import math
+from http import HTTPStatus
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from nucleo import analise
+from nucleo.cache import CacheTTL
+from nucleo.relatorio import argumentos_analise, normalizar_filtros, visao_padrao
+from nucleo.snapshot import Snapshot
+
+log = logging.getLogger(__name__)
+
+POR_PAGINA = 50
+MAX_POR_PAGINA = 500
+MAX_TOP = 100
+MAX_JANELA = 36
+MAX_CABECALHO = 16 * 1024
+
+COLUNAS_ANFITRIAO = ['id', 'name', 'neighbourhood', 'room_type', 'price', 'number_of_reviews', 'last_review',
+                     'availability_365']
+
+_respostas = CacheTTL(max_itens=512, ttl=5 * 60, nome='api')
+
+
+class ErroRequisicao(Exception):
+    """Erro que vira uma resposta HTTP com ``status`` e mensagem JSON."""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _inteiro(parametros, nome, padrao, minimo, maximo):
+    try:
+        valor = int(parametros.get(nome, padrao))
+    except ValueError:
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, f'{nome} deve ser inteiro') from None
+    if not minimo <= valor <= maximo:
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, f'{nome} deve estar entre {minimo} e {maximo}')
+    return valor
+
+
+def _booleano(parametros, nome):
+    return parametros.get(nome, '0').lower() in ('1', 'true', 'sim')
+
+
+def filtros_da_consulta(snapshot, parametros):
+    """Filtros canônicos (``relatorio.normalizar_filtros``) a partir da query string."""
+    filtros = visao_padrao(snapshot)
+    filtros['robusto'] = _booleano(parametros, 'robusto')
+    for campo in ('bairro', 'tipo_quarto'):
+        if parametros.get(campo):
+            filtros[campo] = parametros[campo]
+    try:
+        if 'preco_min' in parametros or 'preco_max' in parametros:
+            inicio, fim = filtros['preco']
+            filtros['preco'] = (float(parametros.get('preco_min', inicio)), float(parametros.get('preco_max', fim)))
+            if not all(map(math.isfinite, filtros['preco'])):
+                raise ValueError('preco_min e preco_max devem ser números finitos')
+        if 'data_inicio' in parametros or 'data_fim' in parametros:
+            datas = snapshot.df['last_review']
+            filtros['datas'] = (pd.Timestamp(parametros.get('data_inicio', datas.min())),
+                                pd.Timestamp(parametros.get('data_fim', datas.max())))
+            if any(pd.isna(data) for data in filtros['datas']):
+                raise ValueError('data_inicio e data_fim devem ser datas')
+            filtros['incluir_sem_data'] = _booleano(parametros, 'incluir_sem_data')
+    except ValueError as erro:
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, f'filtro inválido: {erro}') from None
+    return normalizar_filtros(snapshot, filtros)
+
+
+def _registros(df):
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _paginar(df, parametros):
+    por_pagina = _inteiro(parametros, 'por_pagina', POR_PAGINA, 1, MAX_POR_PAGINA)
+    paginas = max(1, math.ceil(len(df) / por_pagina))
+    pagina = _inteiro(parametros, 'pagina', 1, 1, paginas)
+    inicio = (pagina - 1) * por_pagina
+    return {
+        'itens': _registros(df.iloc[inicio:inicio + por_pagina]),
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'paginas': paginas,
+        'total': len(df),
+    }
+
+
+def _metricas(snapshot, argumentos, parametros):
+    return analise.metricas(analise.resumir(snapshot, **argumentos))
+
+
+def _precos_bairros(snapshot, argumentos, parametros):
+    tabela = analise.resumir(snapshot, **argumentos).por_bairro()
+    return _paginar(tabela[['neighbourhood', 'listings', 'price', 'price_std']].sort_values('price', ascending=False), parametros)
+
+
+def _avaliacoes_bairros(snapshot, argumentos, parametros):
+    tabela = analise.resumir(snapshot, **argumentos).por_bairro()
+    return _paginar(tabela[['neighbourhood', 'listings', 'number_of_reviews']].sort_values('number_of_reviews', ascending=False), parametros)
+
+
+def _avaliacoes_tipos(snapshot, argumentos, parametros):
+    tabela = analise.resumir(snapshot, **argumentos).por_tipo_quarto()
+    return {'itens': _registros(tabela[['room_type', 'listings', 'number_of_reviews']].sort_values('number_of_reviews', ascending=False))}
+
+
+def _avaliacoes_mes(snapshot, argumentos, parametros):
+    mascara = analise.filtrar(snapshot, **argumentos)
+    return _paginar(analise.avaliacoes_por_mes(snapshot, mascara, argumentos.get('datas')), parametros)
+
+
+def _anfitrioes_top(snapshot, argumentos, parametros):
+    k = _inteiro(parametros, 'k', 10, 1, MAX_TOP)
+    return {'itens': _registros(snapshot.anfitrioes.top(analise.filtrar(snapshot, **argumentos), k=k))}
+
+
+def _anfitriao(snapshot, argumentos, parametros):
+    host_id = _inteiro(parametros, 'host_id', 0, 0, np.iinfo(np.int64).max)
+    dimensao = snapshot.anfitrioes
+    if dimensao.codigos([host_id])[0] < 0:
+        raise ErroRequisicao(HTTPStatus.NOT_FOUND, f'anfitrião {host_id} não encontrado')
+    listings = dimensao.detalhe(snapshot.df, host_id, analise.filtrar(snapshot, **argumentos))
+    colunas = [c for c in COLUNAS_ANFITRIAO if c in listings.columns]
+    return {
+        'anfitriao': _registros(dimensao.totais.loc[[host_id]].reset_index())[0],
+        **_paginar(listings[colunas], parametros),
+    }
+
+
+def _precos_robustos(snapshot, argumentos, parametros):
+    por = parametros.get('por', 'bairro')
+    if por not in ('bairro', 'tipo_quarto'):
+        raise ErroRequisicao(HTTPStatus.BAD_REQUEST, 'por deve ser bairro ou tipo_quarto')
+    tabela = snapshot.robusto.por_bairro if por == 'bairro' else snapshot.robusto.por_tipo_quarto
+    return _paginar(tabela.sort_values('mediana', ascending=False), parametros)
+
+
+def _atividade_mes(snapshot, argumentos, parametros):
+    janela = _inteiro(parametros, 'janela', 1, 1, MAX_JANELA)
+    tabela = analise.tendencia(snapshot, argumentos.get('bairro'), argumentos.get('tipo_quarto'),
+                               argumentos.get('datas'), janela)
+    return _paginar(tabela, parametros)
+
+
+def _atividade_bairros(snapshot, argumentos, parametros):
+    inicio, fim = argumentos.get('datas', (None, None))
+    return _paginar(snapshot.series.por_bairro(argumentos.get('tipo_quarto'), inicio, fim), parametros)
+
+
+# Rota -> (função, parâmetros além dos filtros que mudam a resposta)
+ROTAS = {
+    '/metricas': (_metricas, ()),
+    '/precos/bairros': (_precos_bairros, ('pagina', 'por_pagina')),
+    '/avaliacoes/bairros': (_avaliacoes_bairros, ('pagina', 'por_pagina')),
+    '/avaliacoes/tipos': (_avaliacoes_tipos, ()),
+    '/avaliacoes/mes': (_avaliacoes_mes, ('pagina', 'por_pagina')),
+    '/anfitrioes/top': (_anfitrioes_top, ('k',)),
+    '/precos/robustos': (_precos_robustos, ('por', 'pagina', 'por_pagina')),
+    '/atividade/mes': (_atividade_mes, ('janela', 'pagina', 'por_pagina')),
+    '/atividade/bairros': (_atividade_bairros, ('pagina', 'por_pagina')),
+}
+
+# Rotas com um id no fim do caminho (``/anfitrioes/<host_id>``): prefixo -> (função, parâmetro do id, extras)
+ROTAS_POR_ID = {
+    '/anfitrioes': (_anfitriao, 'host_id', ('pagina', 'por_pagina')),
+}
+
+
+def _rota(caminho, parametros):
+    """Função, parâmetros extras e parâmetros da consulta (com o id do caminho) de ``caminho``."""
+    if caminho in ROTAS:
+        return *ROTAS[caminho], parametros
+    prefixo, _, identificador = caminho.rpartition('/')
+    if prefixo in ROTAS_POR_ID and identificador:
+        funcao, nome, extras = ROTAS_POR_ID[prefixo]
+        return funcao, extras, {**parametros, nome: identificador}
+    raise ErroRequisicao(HTTPStatus.NOT_FOUND, f'rota desconhecida: {caminho}')
+
+
+def _json_padrao(valor):
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, (pd.Timestamp, datetime.date)):
+        return valor.isoformat()
+    raise TypeError(f'{type(valor).__name__} não é serializável')
+
+
+def _corpo(dados):
+    return json.dumps(dados, ensure_ascii=False, allow_nan=False, default=_json_padrao).encode('utf-8')
+
+
+class Resposta(NamedTuple):
+    """Corpo JSON pronto e o ETag que o identifica."""
+    status: HTTPStatus
+    corpo: bytes
+    etag: str = None
+
+
+def _limpar_nan(dados):
+    # json não aceita NaN: médias de grupos sem preço viram null
+    if isinstance(dados, dict):
+        return {k: _limpar_nan(v) for k, v in dados.items()}
+    if isinstance(dados, list):
+        return [_limpar_nan(v) for v in dados]
+    if isinstance(dados, (float, np.floating)) and math.isnan(dados):
+        return None
+    return dados
+
+
+def consultar(snapshot, caminho, parametros, etag_cliente=None):
+    """Resposta de ``caminho`` para os ``parametros`` da query string (sem I/O de rede)."""
+    funcao, extras, parametros = _rota(caminho, parametros)
+    normal = filtros_da_consulta(snapshot, parametros)
+    identidade = json.dumps([snapshot.versao, caminho, normal, {p: parametros.get(p) for p in extras}],
+                            sort_keys=True, ensure_ascii=False, default=str)
+    etag = '"' + hashlib.sha1(identidade.encode('utf-8')).hexdigest()[:20] + '"'
+    if etag_cliente and etag in (e.strip() for e in etag_cliente.split(',')):
+        return Resposta(HTTPStatus.NOT_MODIFIED, b'', etag)
+
+    def calcular():
+        dados = funcao(snapshot, argumentos_analise(normal), parametros)
+        return _corpo({'versao': snapshot.versao, 'filtros': normal, **_limpar_nan(dados)})
+
+    return Resposta(HTTPStatus.OK, _respostas.obter_ou_criar(identidade, calcular), etag)
+
+
+def _erro(status, mensagem):
+    return Resposta(status, _corpo({'erro': mensagem}))
+
+
+class ServidorAPI:
+    """Servidor HTTP/1.1 mínimo sobre ``asyncio`` para as rotas de ``ROTAS``.
+
+    ``obter_snapshot`` é chamado (numa thread) a cada requisição; com
+    ``analise.carregar`` o snapshot vem do cache do processo e uma nova versão
+    da fonte aparece sozinha nos ETags.
+    """
+
+    def __init__(self, obter_snapshot):
+        self.obter_snapshot = obter_snapshot
+
+    def responder(self, caminho, parametros, etag_cliente=None):
+        if caminho == '/saude':
+            snapshot = self.obter_snapshot()
+            rotas = sorted([*ROTAS, *(f'{prefixo}/<{nome}>' for prefixo, (_, nome, _) in ROTAS_POR_ID.items())])
+            return Resposta(HTTPStatus.OK, _corpo({'versao': snapshot.versao, 'linhas': len(snapshot), 'rotas': rotas}))
+        try:
+            return consultar(self.obter_snapshot(), caminho, parametros, etag_cliente)
+        except ErroRequisicao as erro:
+            return _erro(erro.status, str(erro))
+
+    async def _ler_requisicao(self, leitor):
+        linha = await leitor.readline()
+        if not linha:
+            return None
+        try:
+            metodo, alvo, versao = linha.decode('latin-1').split()
+        except ValueError:
+            raise ErroRequisicao(HTTPStatus.BAD_REQUEST, 'linha de requisição inválida') from None
+        cabecalhos, tamanho = {}, len(linha)
+        while True:
+            linha = await leitor.readline()
+            tamanho += len(linha)
+            if tamanho > MAX_CABECALHO:
+                raise ErroRequisicao(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'cabeçalhos grandes demais')
+            if linha in (b'\r\n', b'\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        return metodo, alvo, versao, cabecalhos
+
+    async def _escrever(self, escritor, resposta, metodo, manter):
+        cabecalhos = [
+            f'HTTP/1.1 {resposta.status.value} {resposta.status.phrase}',
+            'Content-Type: application/json; charset=utf-8',
+            f'Content-Length: {len(resposta.corpo)}',
+            'Cache-Control: no-cache',
+            f'Connection: {"keep-alive" if manter else "close"}',
+        ]
+        if resposta.etag:
+            cabecalhos.append(f'ETag: {resposta.etag}')
+        escritor.write(('\r\n'.join(cabecalhos) + '\r\n\r\n').encode('latin-1'))
+        if metodo != 'HEAD':
+            escritor.write(resposta.corpo)
+        await escritor.drain()
+
+    async def atender(self, leitor, escritor):
+        laco = asyncio.get_running_loop()
+        try:
+            while True:
+                metodo, manter = 'GET', False
+                try:
+                    requisicao = await self._ler_requisicao(leitor)
+                    if requisicao is None:
+                        break
+                    metodo, alvo, versao, cabecalhos = requisicao
+                    conexao = cabecalhos.get('connection', '').lower()
+                    manter = conexao == 'keep-alive' or (versao == 'HTTP/1.1' and conexao != 'close')
+                    if metodo not in ('GET', 'HEAD'):
+                        raise ErroRequisicao(HTTPStatus.METHOD_NOT_ALLOWED, f'método {metodo} não suportado')
+                    partes = urlsplit(alvo)
+                    parametros = dict(parse_qsl(partes.query))
+                    inicio = laco.time()
+                    resposta = await laco.run_in_executor(
+                        None, self.responder, partes.path.rstrip('/') or '/', parametros, cabecalhos.get('if-none-match'))
+                    log.info('%s %s %d %.1fms', metodo, alvo, resposta.status.value, (laco.time() - inicio) * 1000)
+                except ErroRequisicao as erro:
+                    resposta, manter = _erro(erro.status, str(erro)), False
+                except Exception:
+                    log.exception('erro ao atender a requisição')
+                    resposta, manter = _erro(HTTPStatus.INTERNAL_SERVER_ERROR, 'erro interno'), False
+                await self._escrever(escritor, resposta, metodo, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def servir(self, host='127.0.0.1', porta=8000):
+        servidor = await asyncio.start_server(self.atender, host, porta)
+        enderecos = ', '.join(f'http://{s.getsockname()[0]}:{s.getsockname()[1]}' for s in servidor.sockets)
+        log.info('API ouvindo em %s', enderecos)
+        async with servidor:
+            await servidor.serve_forever()
+
+
+def snapshot_sintetico(linhas, semente=0):
+    """Snapshot local gerado por ``nucleo.sintetico``, para desenvolvimento e testes."""
+    from nucleo.sintetico import gerar_listings
+
+    return Snapshot(analise.limpar(gerar_listings(linhas, semente=semente)), f'sintetico:{linhas}',
+                    f'sintetico-{linhas}-{semente}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='API HTTP com as agregações dos listings.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8000)
+    parser.add_argument('--fonte', help='URL ou arquivo de listings (padrão: AIRBNB_LISTINGS ou o snapshot do RJ)')
+    parser.add_argument('--sintetico', type=int, metavar='LINHAS', help='serve um snapshot sintético com LINHAS listings')
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    if args.sintetico:
+        snapshot = snapshot_sintetico(args.sintetico, args.semente)
+        servidor = ServidorAPI(lambda: snapshot)
+    else:
+        servidor = ServidorAPI(lambda: analise.carregar(args.fonte))
+    try:
+        asyncio.run(servidor.servir(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
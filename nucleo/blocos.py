@@ -0,0 +1,201 @@
+"""Agregação em blocos (out-of-core) para os arquivos grandes do Inside Airbnb.
+
+Os arquivos detalhados (``listings.csv.gz``, ``calendar.csv.gz``,
+``reviews.csv.gz``) não cabem confortavelmente num único DataFrame. Aqui eles
+são lidos em blocos (CSV com ``chunksize`` ou Parquet mapeado em memória, lote
+a lote). Cada bloco vira agregados parciais pequenos, que são somados ao
+acumulado, então a memória fica limitada pelo tamanho do bloco e pelo número de
+grupos. Com ``processos > 1`` os blocos são agregados num pool de processos,
+com poucos blocos em voo por vez. Os parciais também podem ser esboços
+mescláveis (``nucleo.sketches``), para rankings e quantis aproximados.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from nucleo.limpeza import converter_numero
+from nucleo.sketches import esbocar_listings
+
+TAMANHO_BLOCO = 200_000
+
+COLUNAS_LISTINGS = [
+    'id', 'host_id', 'host_name', 'neighbourhood', 'neighbourhood_cleansed', 'room_type',
+    'price', 'minimum_nights', 'number_of_reviews', 'availability_365',
+]
+COLUNAS_DIMENSAO = ['id', 'host_id', 'neighbourhood', 'neighbourhood_cleansed', 'room_type']
+
+MEDIDAS = ['n', 'n_preco', 'soma_preco', 'soma_preco2', 'soma_avaliacoes', 'soma_noites', 'soma_disponibilidade']
+
+# Agrupamentos calculados sobre os listings, os mesmos usados pelos painéis
+GRUPOS_LISTINGS = {
+    'bairro_tipo': ['neighbourhood', 'room_type'],
+    'anfitriao': ['host_id', 'host_name'],
+}
+
+
+def ler_em_blocos(caminho, colunas=None, tamanho=TAMANHO_BLOCO):
+    """Gera DataFrames de até ``tamanho`` linhas do CSV (inclusive .gz) ou Parquet."""
+    caminho = str(caminho)
+    if caminho.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        arquivo = pq.ParquetFile(caminho, memory_map=True)
+        if colunas is not None:
+            colunas = [c for c in colunas if c in arquivo.schema_arrow.names]
+        for lote in arquivo.iter_batches(batch_size=tamanho, columns=colunas):
+            yield lote.to_pandas()
+        return
+
+    usecols = None if colunas is None else (lambda c: c in colunas)
+    yield from pd.read_csv(caminho, usecols=usecols, chunksize=tamanho, low_memory=False)
+
+
+def _normalizar(bloco):
+    # Nos listings detalhados o bairro padronizado está em neighbourhood_cleansed
+    if 'neighbourhood_cleansed' in bloco.columns:
+        bloco = bloco.assign(neighbourhood=bloco['neighbourhood_cleansed'])
+    return bloco
+
+
+def _parcial_listings(bloco):
+    bloco = _normalizar(bloco)
+    precos = converter_numero(bloco['price']).valores
+    base = pd.DataFrame({
+        'n': 1,
+        'n_preco': precos.notna().astype(int),
+        'soma_preco': precos.fillna(0.0),
+        'soma_preco2': precos.fillna(0.0) ** 2,
+        'soma_avaliacoes': bloco['number_of_reviews'].fillna(0),
+        'soma_noites': bloco['minimum_nights'].fillna(0),
+        'soma_disponibilidade': bloco['availability_365'].fillna(0),
+    })
+    parcial = {}
+    for nome, chaves in GRUPOS_LISTINGS.items():
+        for chave in chaves:
+            base[chave] = bloco[chave].to_numpy()
+        parcial[nome] = base.groupby(chaves, dropna=False, sort=False)[MEDIDAS].sum()
+    return parcial
+
+
+def _parcial_esbocos(bloco):
+    bloco = _normalizar(bloco)
+    return esbocar_listings(bloco.assign(price=converter_numero(bloco['price']).valores))
+
+
+def _combinar(acumulado, parcial):
+    for nome, tabela in parcial.items():
+        if nome not in acumulado:
+            acumulado[nome] = tabela
+        elif isinstance(tabela, pd.DataFrame):
+            acumulado[nome] = acumulado[nome].add(tabela, fill_value=0)
+        else:
+            acumulado[nome].mesclar(tabela)
+    return acumulado
+
+
+def executar_em_blocos(blocos, funcao, processos=1, em_voo=None):
+    """Aplica ``funcao`` a cada bloco e soma os parciais (dicionários de DataFrames ou esboços).
+
+    Com ``processos > 1`` no máximo ``em_voo`` blocos (padrão: 2 por processo)
+    ficam na memória ao mesmo tempo.
+    """
+    acumulado = {}
+    if processos <= 1:
+        for bloco in blocos:
+            _combinar(acumulado, funcao(bloco))
+        return acumulado
+
+    em_voo = em_voo or 2 * processos
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        pendentes = set()
+        for bloco in blocos:
+            pendentes.add(pool.submit(funcao, bloco))
+            if len(pendentes) >= em_voo:
+                feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in feitos:
+                    _combinar(acumulado, futuro.result())
+        for futuro in wait(pendentes).done:
+            _combinar(acumulado, futuro.result())
+    return acumulado
+
+
+def _vazio(medidas, chaves):
+    indice = pd.MultiIndex.from_arrays([[] for _ in chaves], names=chaves) if len(chaves) > 1 else pd.Index([], name=chaves[0])
+    return pd.DataFrame(columns=medidas, index=indice, dtype=float)
+
+
+def _finalizar(tabela):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        preco = tabela['soma_preco'] / tabela['n_preco']
+        variancia = tabela['soma_preco2'] / tabela['n_preco'] - preco ** 2
+    return pd.DataFrame({
+        'listings': tabela['n'].astype(np.int64),
+        'price': preco,
+        'price_std': np.sqrt(variancia.clip(lower=0)),
+        'number_of_reviews': tabela['soma_avaliacoes'].astype(np.int64),
+        'minimum_nights': tabela['soma_noites'] / tabela['n'],
+        'availability_365': tabela['soma_disponibilidade'] / tabela['n'],
+    }).reset_index()
+
+
+def agregar_listings(caminho, tamanho=TAMANHO_BLOCO, processos=1):
+    """Agregados por (bairro, tipo de quarto) e por anfitrião, lendo o arquivo em blocos.
+
+    Retorna ``{'bairro_tipo': DataFrame, 'anfitriao': DataFrame}`` com as mesmas
+    medidas dos painéis (listings, preço médio e desvio, avaliações, médias de
+    noites mínimas e de disponibilidade).
+    """
+    blocos = ler_em_blocos(caminho, COLUNAS_LISTINGS, tamanho)
+    acumulado = executar_em_blocos(blocos, _parcial_listings, processos)
+    # Arquivo sem linhas não gera nenhum parcial: as tabelas saem vazias
+    return {nome: _finalizar(acumulado.get(nome, _vazio(MEDIDAS, chaves))) for nome, chaves in GRUPOS_LISTINGS.items()}
+
+
+def esbocar_arquivo(caminho, tamanho=TAMANHO_BLOCO, processos=1):
+    """Esboços de ``esbocar_listings`` (top anfitriões e bairros, quantis de preço) lendo em blocos."""
+    blocos = ler_em_blocos(caminho, COLUNAS_LISTINGS, tamanho)
+    return executar_em_blocos(blocos, _parcial_esbocos, processos)
+
+
+def dimensao_listings(caminho, tamanho=TAMANHO_BLOCO):
+    """Tabela pequena ``id -> (bairro, tipo de quarto, host_id)`` para juntar calendar/reviews."""
+    colunas = ['id', 'neighbourhood', 'room_type', 'host_id']
+    partes = [_normalizar(bloco)[colunas] for bloco in ler_em_blocos(caminho, COLUNAS_DIMENSAO, tamanho)]
+    dimensao = pd.concat(partes or [pd.DataFrame(columns=colunas)], ignore_index=True).drop_duplicates('id').set_index('id')
+    for coluna in ['neighbourhood', 'room_type']:
+        dimensao[coluna] = dimensao[coluna].astype('category')
+    return dimensao
+
+
+def _parcial_calendario(bloco):
+    ocupado = bloco['available'].astype(str).str.lower().isin(['f', 'false'])
+    base = pd.DataFrame({'listing_id': bloco['listing_id'].to_numpy(), 'dias': 1, 'dias_ocupados': ocupado.astype(int)})
+    return {'listing': base.groupby('listing_id', sort=False)[['dias', 'dias_ocupados']].sum()}
+
+
+def _parcial_reviews(bloco):
+    base = pd.DataFrame({'listing_id': bloco['listing_id'].to_numpy(), 'avaliacoes': 1})
+    return {'listing': base.groupby('listing_id', sort=False)[['avaliacoes']].sum()}
+
+
+def _por_bairro_tipo(por_listing, dimensao):
+    # As medidas do calendar e dos reviews são contagens; a soma entre blocos as deixa em float
+    juntos = por_listing.round().astype(np.int64).join(dimensao[['neighbourhood', 'room_type']], how='inner')
+    return juntos.groupby(['neighbourhood', 'room_type'], observed=True).sum().reset_index()
+
+
+def agregar_calendario(caminho, dimensao, tamanho=TAMANHO_BLOCO, processos=1):
+    """Dias e dias ocupados (indisponíveis) por (bairro, tipo de quarto), a partir do calendar."""
+    blocos = ler_em_blocos(caminho, ['listing_id', 'available'], tamanho)
+    por_listing = executar_em_blocos(blocos, _parcial_calendario, processos).get('listing', _vazio(['dias', 'dias_ocupados'], ['listing_id']))
+    resultado = _por_bairro_tipo(por_listing, dimensao)
+    resultado['taxa_ocupacao'] = resultado['dias_ocupados'] / resultado['dias']
+    return resultado
+
+
+def agregar_reviews(caminho, dimensao, tamanho=TAMANHO_BLOCO, processos=1):
+    """Quantidade de reviews por (bairro, tipo de quarto), a partir do reviews.csv."""
+    blocos = ler_em_blocos(caminho, ['listing_id'], tamanho)
+    por_listing = executar_em_blocos(blocos, _parcial_reviews, processos).get('listing', _vazio(['avaliacoes'], ['listing_id']))
+    return _por_bairro_tipo(por_listing, dimensao)
@@ -0,0 +1,102 @@
+"""Cache em memória do processo, compartilhado entre reruns e sessões do Streamlit."""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from nucleo.instrumentacao import contar, etapa
+
+
+class CacheTTL:
+    """Cache LRU com expiração por tempo (TTL), seguro para uso entre threads.
+
+    Quando o número de itens passa de ``max_itens`` o item usado há mais tempo
+    é descartado. Itens mais velhos que ``ttl`` segundos são tratados como
+    ausentes. ``ttl=None`` desliga a expiração. Com ``nome``, acertos e falhas
+    também são contados na medição ativa (``cache.<nome>.acertos``/``falhas``).
+    """
+
+    def __init__(self, max_itens=8, ttl=None, nome=None):
+        self.max_itens = max_itens
+        self.nome = nome
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()  # chave -> (instante em que foi guardado, valor)
+        self._lock = threading.Lock()
+        self._locks_chave = {}
+
+    def __len__(self):
+        return len(self._itens)
+
+    def _expirado(self, instante):
+        return self.ttl is not None and time.monotonic() - instante > self.ttl
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or self._expirado(item[0]):
+                self._itens.pop(chave, None)
+                self.falhas += 1
+                acerto = False
+            else:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                acerto = True
+        if self.nome:
+            contar(f'cache.{self.nome}.{"acertos" if acerto else "falhas"}')
+        return item[1] if acerto else padrao
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def obter_ou_criar(self, chave, fabrica):
+        # Um lock por chave evita que duas sessões baixem o mesmo arquivo ao mesmo tempo
+        # sem bloquear quem está pedindo outra chave.
+        ausente = object()
+        valor = self.obter(chave, ausente)
+        if valor is not ausente:
+            return valor
+        with self._lock:
+            lock_chave = self._locks_chave.setdefault(chave, threading.Lock())
+        with lock_chave:
+            with self._lock:
+                item = self._itens.get(chave)
+            if item is not None and not self._expirado(item[0]):
+                return item[1]
+            valor = fabrica()
+            self.guardar(chave, valor)
+        with self._lock:
+            self._locks_chave.pop(chave, None)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+# Estruturas derivadas (índices, cubos...) de cada snapshot, liberadas junto com o DataFrame
+_derivados = {}
+_lock_derivados = threading.Lock()
+
+
+def por_snapshot(df, nome, fabrica):
+    """Calcula ``fabrica()`` uma única vez para o DataFrame ``df`` e guarda com o nome ``nome``."""
+    chave = id(df)
+    with _lock_derivados:
+        memo = _derivados.get(chave)
+        if memo is None:
+            memo = _derivados[chave] = {'_lock': threading.Lock()}
+            weakref.finalize(df, _derivados.pop, chave, None)
+    with memo['_lock']:
+        if nome in memo:
+            contar(f'derivado.{nome}.acertos')
+        else:
+            contar(f'derivado.{nome}.falhas')
+            with etapa(f'derivado.{nome}'):
+                memo[nome] = fabrica()
+        return memo[nome]
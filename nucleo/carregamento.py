@@ -0,0 +1,190 @@
+"""Carregamento dos listings do Inside Airbnb.
+
+O CSV é baixado (ou lido do disco) uma única vez, tipado pelo esquema de
+``nucleo.esquema`` e gravado em Parquet no diretório de cache. Depois disso os reruns do Streamlit reaproveitam o
+DataFrame guardado no cache do processo, e novas sessões leem o Parquet local,
+sem depender da rede. ``AIRBNB_SNAPSHOT=compacto|mmap`` liga o snapshot
+compacto e compartilhado de ``nucleo.compacto``.
+
+Na primeira carga de uma fonte, ``carregar_em_segundo_plano`` baixa o arquivo
+numa thread do processo enquanto ``amostra_listings`` lê só as primeiras
+linhas (do Parquet do cache, quando existe), para os dashboards mostrarem uma
+prévia.
+"""
+import hashlib
+import os
+import threading
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from nucleo.cache import CacheTTL
+from nucleo import esquema
+from nucleo.compacto import abrir_arrow, compactar, gravar_arrow
+from nucleo.instrumentacao import etapa
+
+URL_RJ = 'https://data.insideairbnb.com/brazil/rj/rio-de-janeiro/2024-06-27/visualisations/listings.csv'
+
+# Pode ser sobrescrito para apontar para outro diretório ou para um arquivo local (modo offline)
+DIR_CACHE = Path(os.environ.get('AIRBNB_CACHE_DIR', Path(__file__).resolve().parent.parent / 'dados' / 'cache'))
+FONTE_PADRAO = os.environ.get('AIRBNB_LISTINGS', URL_RJ)
+
+# '' (DataFrame tipado), 'compacto' ou 'mmap' (compacto e mapeado de um arquivo Arrow)
+MODO_SNAPSHOT = os.environ.get('AIRBNB_SNAPSHOT', '')
+
+# Linhas lidas para a prévia enquanto o arquivo inteiro carrega
+LINHAS_AMOSTRA = int(os.environ.get('AIRBNB_LINHAS_AMOSTRA', '5000'))
+
+# Snapshots mantidos em memória: poucos itens, pois cada um é o arquivo inteiro
+_cache = CacheTTL(max_itens=4, ttl=6 * 60 * 60, nome='listings')
+_amostras = CacheTTL(max_itens=4, ttl=6 * 60 * 60, nome='amostras')
+
+# Cargas completas em andamento, por chave da fonte: sessões que chegam juntas esperam a mesma
+_cargas = {}
+_lock_cargas = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='carga-listings')
+
+
+def _eh_url(fonte):
+    return fonte.startswith(('http://', 'https://'))
+
+
+def _chave(fonte):
+    # Snapshots do Inside Airbnb são imutáveis por data, então a URL basta como chave.
+    # Para arquivos locais a chave muda quando o arquivo é alterado.
+    if _eh_url(fonte):
+        return fonte
+    info = os.stat(fonte)
+    return f'{os.path.abspath(fonte)}:{info.st_mtime_ns}:{info.st_size}'
+
+
+def _caminho_cache(chave):
+    nome = hashlib.sha1(chave.encode('utf-8')).hexdigest()[:16]
+    return DIR_CACHE / f'listings-{nome}-v{esquema.VERSAO}.parquet'
+
+
+def versao_fonte(fonte):
+    """Identificador curto do conteúdo da fonte; muda quando o arquivo local muda."""
+    return hashlib.sha1(_chave(str(fonte)).encode('utf-8')).hexdigest()[:12]
+
+
+def tipar_listings(df):
+    """Converte as colunas do CSV bruto para o esquema usado nas análises (``nucleo.esquema``)."""
+    return esquema.aplicar(df)
+
+
+def _ler_tipado(fonte, chave):
+    destino = _caminho_cache(chave)
+    if destino.exists():
+        with etapa('carga.parquet_cache'):
+            return pd.read_parquet(destino)
+
+    if fonte.endswith('.parquet'):
+        with etapa('carga.parquet'):
+            return tipar_listings(pd.read_parquet(fonte))
+
+    with etapa('carga.csv'):
+        df = pd.read_csv(fonte)
+    with etapa('carga.tipagem'):
+        df = tipar_listings(df)
+
+    # Grava em arquivo temporário e renomeia, para outra sessão nunca ler um Parquet pela metade
+    DIR_CACHE.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_suffix(f'.{os.getpid()}.tmp')
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, destino)
+    return df
+
+
+def _ler_fonte(fonte, chave):
+    if MODO_SNAPSHOT == 'mmap':
+        # Todos os processos mapeiam o mesmo arquivo: as páginas ficam uma vez só na memória
+        arrow = _caminho_cache(chave).with_suffix('.arrow')
+        if not arrow.exists():
+            DIR_CACHE.mkdir(parents=True, exist_ok=True)
+            with etapa('carga.arrow'):
+                gravar_arrow(compactar(_ler_tipado(fonte, chave)), arrow)
+        return abrir_arrow(arrow)
+    df = _ler_tipado(fonte, chave)
+    return compactar(df) if MODO_SNAPSHOT == 'compacto' else df
+
+
+def carregar_listings(fonte=None):
+    """Retorna o DataFrame tipado de listings da ``fonte`` (URL ou caminho local).
+
+    O DataFrame retornado é compartilhado entre sessões: não deve ser modificado.
+    """
+    fonte = str(fonte or FONTE_PADRAO)
+    chave = _chave(fonte)
+    return _cache.obter_ou_criar(chave, lambda: _ler_fonte(fonte, chave))
+
+
+def carregar_em_segundo_plano(fonte=None):
+    """``Future`` com o DataFrame de ``carregar_listings(fonte)``, carregado numa thread do processo.
+
+    Já vem resolvido quando o snapshot está no cache em memória.
+    """
+    fonte = str(fonte or FONTE_PADRAO)
+    chave = _chave(fonte)
+    df = _cache.obter(chave)
+    if df is not None:
+        futuro = Future()
+        futuro.set_result(df)
+        return futuro
+    with _lock_cargas:
+        futuro = _cargas.get(chave)
+        if futuro is None:
+            futuro = _executor.submit(carregar_listings, fonte)
+            _cargas[chave] = futuro
+            # Concluída, a carga sai daqui: o DataFrame fica só no _cache (e expira com ele)
+            futuro.add_done_callback(lambda _: _descartar_carga(chave))
+    return futuro
+
+
+def _descartar_carga(chave):
+    with _lock_cargas:
+        _cargas.pop(chave, None)
+
+
+def _inicio_parquet(caminho, linhas):
+    import pyarrow.parquet as pq
+
+    # Só os primeiros row groups são lidos do arquivo
+    lote = next(pq.ParquetFile(caminho).iter_batches(batch_size=linhas), None)
+    return lote.to_pandas() if lote is not None else pd.read_parquet(caminho)
+
+
+def _ler_amostra(fonte, chave, linhas):
+    cache = _caminho_cache(chave)
+    if cache.exists():
+        return tipar_listings(_inicio_parquet(cache, linhas))
+    if fonte.endswith('.parquet'):
+        return tipar_listings(_inicio_parquet(fonte, linhas))
+    if _eh_url(fonte):
+        # Lê o corpo aos poucos e fecha a conexão depois das primeiras linhas, sem baixar o
+        # arquivo inteiro (o download completo é o da carga em segundo plano)
+        with urllib.request.urlopen(fonte, timeout=30) as resposta:
+            return tipar_listings(pd.read_csv(resposta, nrows=linhas))
+    return tipar_listings(pd.read_csv(fonte, nrows=linhas))
+
+
+def amostra_listings(fonte=None, linhas=LINHAS_AMOSTRA):
+    """As primeiras ``linhas`` da fonte, tipadas: prévia enquanto o arquivo inteiro carrega.
+
+    Vem do Parquet do cache em disco quando ele já existe.
+    """
+    fonte = str(fonte or FONTE_PADRAO)
+    chave = _chave(fonte)
+
+    def ler():
+        with etapa('carga.amostra'):
+            return _ler_amostra(fonte, chave, linhas)
+
+    return _amostras.obter_ou_criar((chave, linhas), ler)
+
+
+def limpar_cache():
+    """Esvazia o cache em memória (o Parquet em disco é mantido)."""
+    _cache.limpar()
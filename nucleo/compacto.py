@@ -0,0 +1,104 @@
+"""Snapshot compacto e somente leitura, compartilhado entre sessões e processos.
+
+Com ``AIRBNB_SNAPSHOT=compacto`` o DataFrame do snapshot, já no esquema de
+``nucleo.esquema``, tem os números reduzidos ainda mais, ao menor tipo que
+representa os valores do arquivo sem perda, e o texto de baixa cardinalidade
+que sobrou em categorias. Com ``AIRBNB_SNAPSHOT=mmap`` ele também é
+gravado uma vez num arquivo Arrow (IPC, sem compressão) ao lado do Parquet do
+cache, e cada processo abre esse arquivo mapeado em memória: as colunas são
+visões somente leitura das páginas do arquivo, que o sistema operacional
+compartilha entre todos os processos do servidor.
+
+Em qualquer modo o snapshot é um só por processo (``carregar_listings``) e as
+estruturas derivadas também (``por_snapshot``); por sessão ficam só os filtros
+escolhidos e os resultados pequenos de cada rerun.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Texto com até esta fração de valores distintos vira categoria
+FRACAO_CATEGORIA = 0.5
+
+_METADADOS = b'nucleo'
+
+
+def _reduzir_float(valores):
+    reduzidos = valores.astype(np.float32)
+    exato = np.array_equal(reduzidos.astype(np.float64), valores, equal_nan=True)
+    return reduzidos if exato else valores
+
+
+def compactar(df):
+    """Cópia de ``df`` com numéricos reduzidos sem perda e texto repetitivo em categorias."""
+    colunas = {}
+    for nome, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            colunas[nome] = serie
+        elif pd.api.types.is_integer_dtype(serie.dtype) and not pd.api.types.is_extension_array_dtype(serie.dtype):
+            colunas[nome] = pd.to_numeric(serie, downcast='integer')
+        elif pd.api.types.is_float_dtype(serie.dtype):
+            colunas[nome] = pd.Series(_reduzir_float(serie.to_numpy(dtype=np.float64)), index=serie.index, name=nome)
+        elif pd.api.types.is_string_dtype(serie.dtype) and serie.nunique() <= FRACAO_CATEGORIA * len(serie):
+            colunas[nome] = serie.astype('category')
+        else:
+            colunas[nome] = serie
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def gravar_arrow(df, caminho):
+    """Grava ``df`` num arquivo Arrow IPC que ``abrir_arrow`` mapeia sem cópia.
+
+    NaN dos floats fica como valor (não como nulo), datas ficam como inteiros e
+    categorias como códigos, com os rótulos nos metadados: assim todas as
+    colunas numéricas podem ser lidas como visões do arquivo.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    arrays, especiais = {}, {}
+    for nome, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            arrays[nome] = pa.array(serie.cat.codes.to_numpy())
+            especiais[nome] = {'categorias': serie.cat.categories.astype(str).tolist()}
+        elif pd.api.types.is_datetime64_dtype(serie.dtype):
+            valores = serie.to_numpy()
+            arrays[nome] = pa.array(valores.view(np.int64))
+            especiais[nome] = {'datetime': str(valores.dtype)}
+        elif pd.api.types.is_numeric_dtype(serie.dtype):
+            arrays[nome] = pa.array(serie.to_numpy(), from_pandas=False)
+        else:
+            arrays[nome] = pa.array(serie, type=pa.large_string(), from_pandas=True)
+    tabela = pa.table(arrays).replace_schema_metadata({_METADADOS: json.dumps(especiais)})
+
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with pa.OSFile(temporario, 'wb') as arquivo:
+        with ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(temporario, caminho)
+
+
+def abrir_arrow(caminho):
+    """DataFrame somente leitura cujas colunas apontam para o arquivo mapeado em memória."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    tabela = ipc.open_file(pa.memory_map(str(caminho), 'r')).read_all()
+    especiais = json.loads(tabela.schema.metadata.get(_METADADOS, b'{}'))
+    colunas = {}
+    for nome in tabela.column_names:
+        coluna = tabela.column(nome)
+        if pa.types.is_large_string(coluna.type) or pa.types.is_string(coluna.type):
+            colunas[nome] = pd.arrays.ArrowStringArray(coluna, dtype=pd.StringDtype('pyarrow', na_value=np.nan))
+            continue
+        valores = coluna.chunk(0).to_numpy(zero_copy_only=True) if coluna.num_chunks == 1 else coluna.to_numpy()
+        especial = especiais.get(nome, {})
+        if 'categorias' in especial:
+            colunas[nome] = pd.Categorical.from_codes(valores, categories=especial['categorias'], validate=False)
+        elif 'datetime' in especial:
+            colunas[nome] = valores.view(especial['datetime'])
+        else:
+            colunas[nome] = valores
+    return pd.DataFrame(colunas, copy=False)
@@ -0,0 +1,219 @@
+"""Cubo pré-agregado para os painéis e big numbers dos dashboards.
+
+Uma vez por snapshot os listings são agregados em células
+(bairro, tipo de quarto, faixa de preço, mês da última avaliação) com contagem,
+soma e soma dos quadrados das medidas. Cada seleção da barra lateral é
+respondida somando as células do cubo. Só as células cortadas ao meio pelos
+limites de preço ou de data (as das bordas do intervalo) voltam às linhas
+originais, e apenas às linhas dessas células.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.cache import por_snapshot
+from nucleo.filtros import TODOS, _datas64
+
+# Estado de cada faixa de preço / mês em relação ao intervalo selecionado
+FORA, INTEIRA, PARCIAL = 0, 1, 2
+
+MEDIDAS = ['n', 'n_preco', 'soma_preco', 'soma_preco2', 'soma_avaliacoes', 'soma_noites']
+
+
+def _codigos(serie):
+    # Categoria nula ganha o código logo depois das categorias, como o NaN do groupby:
+    # a linha conta nos totais e na outra dimensão, mas não aparece na própria tabela
+    serie = serie.astype('category')
+    codigos = serie.cat.codes.to_numpy().astype(np.int64)
+    codigos[codigos < 0] = len(serie.cat.categories)
+    return codigos, serie.cat.categories
+
+
+def _limites_por_bloco(valores, blocos, n_blocos):
+    # Menor e maior valor de cada bloco, para saber se o bloco cabe inteiro no intervalo
+    minimos = np.full(n_blocos, np.inf)
+    maximos = np.full(n_blocos, -np.inf)
+    validos = blocos >= 0
+    np.minimum.at(minimos, blocos[validos], valores[validos])
+    np.maximum.at(maximos, blocos[validos], valores[validos])
+    return minimos, maximos
+
+
+def _estado(minimos, maximos, inicio, fim):
+    inicio = -np.inf if inicio is None else inicio
+    fim = np.inf if fim is None else fim
+    estado = np.full(len(minimos), PARCIAL, dtype=np.int8)
+    estado[(minimos >= inicio) & (maximos <= fim)] = INTEIRA
+    estado[(maximos < inicio) | (minimos > fim)] = FORA
+    return estado
+
+
+class Resumo:
+    """Resultado do cubo para uma seleção: poucas linhas por (bairro, tipo de quarto)."""
+
+    def __init__(self, celulas, bairros, tipos_quarto):
+        self.celulas = celulas
+        self._bairros = bairros
+        self._tipos_quarto = tipos_quarto
+
+    def _por(self, coluna, categorias, nome):
+        codigos = self.celulas[coluna].to_numpy()
+        somas = {m: np.bincount(codigos, weights=self.celulas[m].to_numpy(), minlength=len(categorias) + 1)[:len(categorias)]
+                 for m in MEDIDAS}
+        presentes = somas['n'] > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            preco = somas['soma_preco'] / somas['n_preco']
+            variancia = somas['soma_preco2'] / somas['n_preco'] - preco ** 2
+        return pd.DataFrame({
+            nome: np.asarray(categorias)[presentes],
+            'listings': somas['n'][presentes].astype(np.int64),
+            'price': preco[presentes],
+            'price_std': np.sqrt(np.clip(variancia[presentes], 0, None)),
+            'number_of_reviews': somas['soma_avaliacoes'][presentes].astype(np.int64),
+        })
+
+    def por_bairro(self):
+        return self._por('bairro', self._bairros, 'neighbourhood')
+
+    def por_tipo_quarto(self):
+        return self._por('tipo', self._tipos_quarto, 'room_type')
+
+    def _soma(self, medida):
+        return self.celulas[medida].sum()
+
+    @property
+    def total_listings(self):
+        return int(self._soma('n'))
+
+    @property
+    def total_avaliacoes(self):
+        return int(self._soma('soma_avaliacoes'))
+
+    @property
+    def preco_medio(self):
+        n = self._soma('n_preco')
+        return self._soma('soma_preco') / n if n else float('nan')
+
+    @property
+    def media_noites(self):
+        n = self._soma('n')
+        return self._soma('soma_noites') / n if n else float('nan')
+
+
+class Cubo:
+    """Agregados de soma/contagem/soma dos quadrados por
+    (bairro, tipo de quarto, faixa de preço, mês da última avaliação)."""
+
+    def __init__(self, df, n_faixas_preco=32):
+        self.n = len(df)
+        self.bairro, self.bairros = _codigos(df['neighbourhood'])
+        self.tipo, self.tipos_quarto = _codigos(df['room_type'])
+        # Um código a mais em cada dimensão para a categoria nula
+        self.n_bairros, self.n_tipos = len(self.bairros) + 1, len(self.tipos_quarto) + 1
+        self.precos = df['price'].to_numpy(dtype=float)
+        self.datas = pd.to_datetime(df['last_review']).to_numpy().astype('datetime64[ns]').astype(np.int64)
+        self.sem_data = pd.isna(df['last_review']).to_numpy()
+        self.avaliacoes = df['number_of_reviews'].to_numpy(dtype=float)
+        self.noites = df['minimum_nights'].to_numpy(dtype=float)
+
+        # Faixas de preço por quantis; preço nulo fica na faixa -1
+        sem_preco = np.isnan(self.precos)
+        arestas = np.unique(np.nanquantile(self.precos, np.linspace(0, 1, n_faixas_preco + 1))) if (~sem_preco).any() else np.zeros(1)
+        self.n_faixas = max(len(arestas) - 1, 1)
+        faixa = np.clip(np.searchsorted(arestas, self.precos, side='right') - 1, 0, self.n_faixas - 1)
+        faixa[sem_preco] = -1
+        self.faixa_min, self.faixa_max = _limites_por_bloco(self.precos, faixa, self.n_faixas)
+
+        # Meses da última avaliação numerados a partir do primeiro; sem data fica no mês -1
+        meses = pd.to_datetime(df['last_review']).to_numpy().astype('datetime64[M]').astype(np.int64)
+        self.mes0 = int(meses[~self.sem_data].min()) if (~self.sem_data).any() else 0
+        mes = meses - self.mes0
+        mes[self.sem_data] = -1
+        self.n_meses = int(mes.max()) + 1 if (~self.sem_data).any() else 1
+        self.mes_min, self.mes_max = _limites_por_bloco(self.datas.astype(float), mes, self.n_meses)
+
+        # Chave única de célula e ordem das linhas por célula
+        chave = ((self.bairro * self.n_tipos + self.tipo) * (self.n_faixas + 1) + faixa + 1) * (self.n_meses + 1) + mes + 1
+        chaves, primeiras, self.celula = np.unique(chave, return_index=True, return_inverse=True)
+        self.n_celulas = len(chaves)
+        self.cel_bairro = self.bairro[primeiras]
+        self.cel_tipo = self.tipo[primeiras]
+        self.cel_faixa = faixa[primeiras]
+        self.cel_mes = mes[primeiras]
+
+        self.ordem = np.argsort(self.celula, kind='stable')
+        self.tamanho = np.bincount(self.celula, minlength=self.n_celulas)
+        self.inicio = np.r_[0, np.cumsum(self.tamanho)[:-1]]
+
+        self.medidas = pd.DataFrame(self._agregar(np.arange(self.n), self.celula, self.n_celulas))
+        self.medidas['bairro'] = self.cel_bairro
+        self.medidas['tipo'] = self.cel_tipo
+
+    def _agregar(self, linhas, grupos, n_grupos):
+        precos = self.precos[linhas]
+        tem_preco = ~np.isnan(precos)
+        precos = np.where(tem_preco, precos, 0.0)
+        return {
+            'n': np.bincount(grupos, minlength=n_grupos).astype(float),
+            'n_preco': np.bincount(grupos, weights=tem_preco, minlength=n_grupos),
+            'soma_preco': np.bincount(grupos, weights=precos, minlength=n_grupos),
+            'soma_preco2': np.bincount(grupos, weights=precos ** 2, minlength=n_grupos),
+            'soma_avaliacoes': np.bincount(grupos, weights=self.avaliacoes[linhas], minlength=n_grupos),
+            'soma_noites': np.bincount(grupos, weights=self.noites[linhas], minlength=n_grupos),
+        }
+
+    def _linhas_das_celulas(self, celulas):
+        tamanhos = self.tamanho[celulas]
+        deslocamento = np.repeat(self.inicio[celulas] - np.r_[0, np.cumsum(tamanhos)[:-1]], tamanhos)
+        return self.ordem[deslocamento + np.arange(tamanhos.sum())]
+
+    def resumo(self, bairro=None, tipo_quarto=None, preco=None, datas=None, incluir_sem_data=False):
+        """Agregados da seleção, com os mesmos parâmetros de ``MotorFiltros.mascara``."""
+        selecionadas = np.ones(self.n_celulas, dtype=bool)
+        if bairro not in (None, TODOS):
+            selecionadas &= self.cel_bairro == self.bairros.get_indexer([bairro])[0]
+        if tipo_quarto not in (None, TODOS):
+            selecionadas &= self.cel_tipo == self.tipos_quarto.get_indexer([tipo_quarto])[0]
+
+        # Estado das faixas de preço (posição 0 é a faixa de preço nulo)
+        estado_faixa = np.r_[INTEIRA, np.full(self.n_faixas, INTEIRA, dtype=np.int8)]
+        if preco is not None:
+            estado_faixa = np.r_[FORA, _estado(self.faixa_min, self.faixa_max, *preco)]
+        estado_mes = np.r_[INTEIRA, np.full(self.n_meses, INTEIRA, dtype=np.int8)]
+        if datas is not None:
+            inicio, fim = (None if d is None else float(d.astype('datetime64[ns]').astype(np.int64)) for d in _datas64(datas))
+            estado_mes = np.r_[INTEIRA if incluir_sem_data else FORA, _estado(self.mes_min, self.mes_max, inicio, fim)]
+
+        ef = estado_faixa[self.cel_faixa + 1]
+        em = estado_mes[self.cel_mes + 1]
+        selecionadas &= (ef != FORA) & (em != FORA)
+        inteiras = selecionadas & (ef == INTEIRA) & (em == INTEIRA)
+        parciais = np.flatnonzero(selecionadas & ~inteiras)
+
+        celulas = self.medidas[inteiras]
+        if len(parciais):
+            # Células de borda: confere preço e data linha a linha, só nas linhas dessas células
+            linhas = self._linhas_das_celulas(parciais)
+            manter = np.ones(len(linhas), dtype=bool)
+            if preco is not None:
+                manter &= (self.precos[linhas] >= preco[0]) & (self.precos[linhas] <= preco[1])
+            if datas is not None:
+                com_data = ~self.sem_data[linhas]
+                dentro = com_data.copy()
+                if inicio is not None:
+                    dentro &= self.datas[linhas] >= inicio
+                if fim is not None:
+                    dentro &= self.datas[linhas] <= fim
+                manter &= dentro | (~com_data & incluir_sem_data)
+            linhas = linhas[manter]
+            grupos = self.bairro[linhas] * self.n_tipos + self.tipo[linhas]
+            bordas = pd.DataFrame(self._agregar(linhas, grupos, self.n_bairros * self.n_tipos))
+            bordas['bairro'] = np.arange(len(bordas)) // self.n_tipos
+            bordas['tipo'] = np.arange(len(bordas)) % self.n_tipos
+            celulas = pd.concat([celulas, bordas[bordas['n'] > 0]], ignore_index=True)
+
+        return Resumo(celulas, self.bairros, self.tipos_quarto)
+
+
+def cubo_agregado(df):
+    """Cubo do snapshot ``df``, criado na primeira chamada e reaproveitado depois."""
+    return por_snapshot(df, 'cubo', lambda: Cubo(df))
@@ -0,0 +1,127 @@
+"""Esquema explícito do snapshot de listings: colunas mantidas e o tipo de cada uma.
+
+O ``pd.read_csv`` deixa texto como string Python, inteiros em int64 e reais
+em float64. Aqui cada coluna tem tipo declarado:
+
+- texto repetitivo (bairro, tipo de quarto, nome do anfitrião, licença) vira
+  categoria: cada texto distinto é guardado uma vez e as linhas guardam só o código;
+- contagens vão para o menor inteiro que comporta a faixa do Inside Airbnb
+  (colunas com nulos ficam em float32, que guarda NaN);
+- avaliações por mês e coordenadas ficam em float32 (coordenadas com precisão
+  de ~0,5 m no Rio); o preço fica em float64, para os valores do slider, da
+  API e das médias saírem sem ruído de arredondamento;
+- ``id`` e ``host_id`` continuam int64 (os ids novos passam de 2^53 em float).
+
+Colunas inteiramente vazias no arquivo carregado são descartadas (no
+``listings.csv`` resumido do Rio, ``neighbourhood_group`` e ``license``), a
+não ser as que as análises leem, que ficam sempre no snapshot.
+
+Seleções continuam sendo máscaras somente leitura sobre o snapshot
+(``MotorFiltros.mascara``): nenhum painel copia linhas filtradas.
+
+Relatório de memória de um arquivo::
+
+    python -m nucleo.esquema listings.csv
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from nucleo.limpeza import converter_numero
+
+# Muda quando o esquema muda: o Parquet do cache tipado é gravado com esta versão no nome
+VERSAO = 3
+
+ESQUEMA = {
+    'id': 'int64',
+    'name': 'texto',
+    'host_id': 'int64',
+    'host_name': 'category',
+    'neighbourhood_group': 'category',
+    'neighbourhood': 'category',
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'room_type': 'category',
+    'price': 'preco',
+    'minimum_nights': 'int32',
+    'number_of_reviews': 'int32',
+    'last_review': 'data',
+    'reviews_per_month': 'float32',
+    'calculated_host_listings_count': 'int32',
+    'availability_365': 'int16',
+    'number_of_reviews_ltm': 'int32',
+    'license': 'category',
+}
+
+# Colunas do esquema que as análises não leem: só elas (e as de fora do esquema) são
+# descartadas quando vêm vazias
+OPCIONAIS = ['neighbourhood_group', 'license']
+
+
+def _converter(serie, tipo):
+    if tipo == 'category':
+        return serie if isinstance(serie.dtype, pd.CategoricalDtype) else serie.astype('category')
+    if tipo == 'texto':
+        return serie.astype('str')
+    if tipo == 'data':
+        return pd.to_datetime(serie, errors='coerce')
+    if tipo == 'preco':
+        valores = serie if pd.api.types.is_numeric_dtype(serie.dtype) else converter_numero(serie).valores
+        return valores.astype(np.float64)
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if tipo.startswith('int') and numeros.isna().any():
+        return numeros.astype(np.float32)
+    return numeros.astype(tipo)
+
+
+def _descartar(nome, serie):
+    return (nome not in ESQUEMA or nome in OPCIONAIS) and serie.isna().all()
+
+
+def aplicar(df):
+    """``df`` no esquema: sem as colunas vazias descartáveis e com os tipos de ``ESQUEMA``.
+
+    Colunas fora do esquema (dos listings detalhados, por exemplo) passam sem mudança.
+    """
+    colunas = {}
+    for nome, serie in df.items():
+        if _descartar(nome, serie):
+            continue
+        colunas[nome] = _converter(serie, ESQUEMA[nome]) if nome in ESQUEMA else serie
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def memoria(df):
+    """Bytes ocupados por ``df``, contando o conteúdo do texto."""
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+
+def relatorio_memoria(bruto, tipado):
+    """Tipo e bytes de cada coluna antes e depois do esquema (descartadas com 0 bytes depois)."""
+    antes = bruto.memory_usage(deep=True, index=False)
+    depois = tipado.memory_usage(deep=True, index=False).reindex(antes.index, fill_value=0)
+    return pd.DataFrame({
+        'tipo_antes': bruto.dtypes.astype(str),
+        'tipo_depois': tipado.dtypes.astype(str).reindex(antes.index, fill_value='descartada'),
+        'bytes_antes': antes,
+        'bytes_depois': depois,
+    }).rename_axis('coluna').reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Memória do snapshot de listings antes e depois do esquema.')
+    parser.add_argument('fonte', help='CSV (ou Parquet) de listings do Inside Airbnb')
+    args = parser.parse_args(argv)
+
+    bruto = pd.read_parquet(args.fonte) if args.fonte.endswith('.parquet') else pd.read_csv(args.fonte)
+    tipado = aplicar(bruto)
+    tabela = relatorio_memoria(bruto, tipado)
+    tabela.to_csv(sys.stdout, index=False)
+    antes, depois = tabela['bytes_antes'].sum(), tabela['bytes_depois'].sum()
+    print(f'{len(bruto)} linhas: {antes / 2 ** 20:.1f} MB -> {depois / 2 ** 20:.1f} MB ({antes / depois:.1f}x menor)')
+
+
+if __name__ == '__main__':
+    main()
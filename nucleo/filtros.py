@@ -0,0 +1,149 @@
+"""Motor de filtros vetorizado para os filtros da barra lateral.
+
+Os códigos das colunas categóricas e os índices ordenados de preço e data são
+calculados uma vez por snapshot. Cada seleção vira uma comparação de inteiros
+(bairro, tipo de quarto) ou uma busca binária (faixas de preço e data), sem
+lambdas executadas linha a linha.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.cache import CacheTTL, por_snapshot
+
+# Valor usado nas caixas de seleção para "sem filtro"
+TODOS = 'Todos'
+
+
+def _datas64(datas):
+    return tuple(None if d is None else np.datetime64(pd.Timestamp(d)) for d in datas)
+
+
+class IndiceOrdenado:
+    """Posições das linhas ordenadas pelo valor de uma coluna numérica ou de data.
+
+    Valores nulos (NaN/NaT) ficam fora do índice, em ``nulos``.
+    """
+
+    def __init__(self, valores):
+        valores = np.asarray(valores)
+        nulos = np.isnat(valores) if valores.dtype.kind == 'M' else np.isnan(valores)
+        validos = np.flatnonzero(~nulos)
+        self.ordem = validos[np.argsort(valores[validos], kind='stable')]
+        self.valores = valores[self.ordem]
+        self.nulos = np.flatnonzero(nulos)
+
+    def fatia(self, inicio=None, fim=None):
+        """Intervalo ``[lo, hi)`` de ``ordem`` com valores entre ``inicio`` e ``fim`` (inclusive)."""
+        lo = 0 if inicio is None else int(np.searchsorted(self.valores, inicio, side='left'))
+        hi = len(self.valores) if fim is None else int(np.searchsorted(self.valores, fim, side='right'))
+        return lo, max(lo, hi)
+
+    def linhas(self, inicio=None, fim=None):
+        """Posições das linhas com valor entre ``inicio`` e ``fim`` (inclusive)."""
+        lo, hi = self.fatia(inicio, fim)
+        return self.ordem[lo:hi]
+
+
+class _Categorias:
+    """Códigos inteiros de uma coluna categórica."""
+
+    def __init__(self, serie):
+        serie = serie.astype('category')
+        self.codigos = serie.cat.codes.to_numpy()
+        self.posicao = {valor: codigo for codigo, valor in enumerate(serie.cat.categories)}
+
+    def mascara(self, valor):
+        codigo = self.posicao.get(valor)
+        if codigo is None:
+            return np.zeros(len(self.codigos), dtype=bool)
+        return self.codigos == codigo
+
+
+class MotorFiltros:
+    """Resolve combinações de bairro, tipo de quarto, preço e data em máscaras booleanas."""
+
+    def __init__(self, df, max_mascaras=64):
+        self.n = len(df)
+        self.bairros = _Categorias(df['neighbourhood'])
+        self.tipos_quarto = _Categorias(df['room_type'])
+        self.precos = IndiceOrdenado(df['price'].to_numpy(dtype=float))
+        self.datas = IndiceOrdenado(pd.to_datetime(df['last_review']).to_numpy())
+        self._mascaras = CacheTTL(max_itens=max_mascaras, nome='mascaras')
+
+    def _mascara_linhas(self, linhas):
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[linhas] = True
+        return mascara
+
+    def _calcular(self, bairro, tipo_quarto, preco, datas, incluir_sem_data):
+        partes = []
+        if bairro is not None:
+            partes.append(self.bairros.mascara(bairro))
+        if tipo_quarto is not None:
+            partes.append(self.tipos_quarto.mascara(tipo_quarto))
+        if preco is not None:
+            partes.append(self._mascara_linhas(self.precos.linhas(*preco)))
+        if datas is not None:
+            linhas = self.datas.linhas(*_datas64(datas))
+            if incluir_sem_data:
+                linhas = np.concatenate([linhas, self.datas.nulos])
+            partes.append(self._mascara_linhas(linhas))
+
+        if not partes:
+            return np.ones(self.n, dtype=bool)
+        mascara = partes[0].copy()
+        for parte in partes[1:]:
+            mascara &= parte
+        return mascara
+
+    def mascara(self, bairro=None, tipo_quarto=None, preco=None, datas=None, incluir_sem_data=False):
+        """Máscara booleana das linhas que atendem a todos os filtros informados.
+
+        ``bairro`` e ``tipo_quarto`` aceitam ``None`` ou ``TODOS`` para não filtrar;
+        ``preco`` e ``datas`` são tuplas ``(inicio, fim)`` inclusivas. Com um filtro
+        de datas, anúncios sem ``last_review`` (NaT) só entram se
+        ``incluir_sem_data`` for verdadeiro. A máscara é compartilhada pelo cache
+        e por isso somente leitura.
+        """
+        bairro = None if bairro == TODOS else bairro
+        tipo_quarto = None if tipo_quarto == TODOS else tipo_quarto
+        preco = None if preco is None else tuple(preco)
+        datas = None if datas is None else tuple(datas)
+
+        incluir_sem_data = bool(incluir_sem_data) and datas is not None
+
+        chave = (bairro, tipo_quarto, preco, datas, incluir_sem_data)
+        mascara = self._mascaras.obter(chave)
+        if mascara is None:
+            mascara = self._calcular(bairro, tipo_quarto, preco, datas, incluir_sem_data)
+            mascara.setflags(write=False)
+            self._mascaras.guardar(chave, mascara)
+        return mascara
+
+    def indices(self, **filtros):
+        """Posições das linhas selecionadas, em ordem crescente."""
+        return np.flatnonzero(self.mascara(**filtros))
+
+    def serie_mensal(self, valores, mascara=None, datas=None):
+        """Soma de ``valores`` por mês de ``last_review``, usando o índice ordenado de datas.
+
+        Como o índice já está ordenado, cada mês é um bloco contíguo e a soma sai
+        de um único ``np.add.reduceat``. Linhas sem data não entram na série.
+        """
+        lo, hi = self.datas.fatia(*_datas64(datas)) if datas is not None else (0, len(self.datas.ordem))
+        linhas = self.datas.ordem[lo:hi]
+        meses = self.datas.valores[lo:hi].astype('datetime64[M]')
+        if mascara is not None:
+            selecionadas = mascara[linhas]
+            linhas, meses = linhas[selecionadas], meses[selecionadas]
+        if not len(linhas):
+            return pd.Series(dtype=float)
+
+        inicio_blocos = np.flatnonzero(np.r_[True, meses[1:] != meses[:-1]])
+        somas = np.add.reduceat(np.nan_to_num(np.asarray(valores, dtype=float)[linhas]), inicio_blocos)
+        return pd.Series(somas, index=pd.DatetimeIndex(meses[inicio_blocos]))
+
+
+def motor_filtros(df):
+    """Motor de filtros do snapshot ``df``, criado na primeira chamada e reaproveitado depois."""
+    return por_snapshot(df, 'motor_filtros', lambda: MotorFiltros(df))
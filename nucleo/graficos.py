@@ -0,0 +1,122 @@
+"""Especificações dos gráficos (Altair) e do mapa (pydeck) dos painéis.
+
+Altair e pydeck só são importados quando um gráfico é montado, para que o
+núcleo continue leve em jobs que não desenham nada.
+"""
+from nucleo.instrumentacao import cronometrado
+from nucleo.mapa import camada_mapa
+
+# Centro do Rio de Janeiro e zoom inicial do mapa
+LATITUDE_RJ = -22.9068
+LONGITUDE_RJ = -43.1729
+ZOOM_MAPA = 10
+
+
+def _tamanho_json(objeto):
+    # Bytes enviados ao navegador: spec Vega-Lite do gráfico ou JSON do deck
+    return len(objeto.to_json().encode('utf-8'))
+
+
+def _marca(cor):
+    return {'color': cor} if cor else {}
+
+
+@cronometrado('grafico.bairros_mais_caros', tamanho=_tamanho_json)
+def bairros_mais_caros(tabela, cor='pink'):
+    """Gráfico cruzado com barra e linha do preço médio por bairro."""
+    import altair as alt
+
+    bar_chart = alt.Chart(tabela).mark_bar(**_marca(cor)).encode(
+        x=alt.X('neighbourhood', sort='-y', title='Bairro'),
+        y=alt.Y('price', title='Preço Médio (R$)')
+    ).properties(width=600)
+
+    line_chart = alt.Chart(tabela).mark_line(color='red').encode(
+        x=alt.X('neighbourhood', sort='-y'),
+        y='price'
+    )
+    return bar_chart + line_chart
+
+
+@cronometrado('grafico.avaliacoes_por_bairro', tamanho=_tamanho_json)
+def avaliacoes_por_bairro(tabela, cor='pink'):
+    import altair as alt
+
+    return alt.Chart(tabela).mark_bar(**_marca(cor)).encode(
+        x=alt.X('neighbourhood', sort='-y', title='Bairro'),
+        y=alt.Y('number_of_reviews', title='Número de Avaliações')
+    ).properties(width=600)
+
+
+@cronometrado('grafico.avaliacoes_por_tipo', tamanho=_tamanho_json)
+def avaliacoes_por_tipo(tabela):
+    """Gráfico de pizza das avaliações por tipo de quarto."""
+    import altair as alt
+
+    return alt.Chart(tabela).mark_arc().encode(
+        theta=alt.Theta(field='number_of_reviews', type='quantitative', title='Número de Avaliações'),
+        color=alt.Color(field='room_type', type='nominal', title='Tipo de Quarto'),
+        tooltip=['room_type', 'number_of_reviews']
+    ).properties(width=600, height=400)
+
+
+@cronometrado('grafico.top_anfitrioes', tamanho=_tamanho_json)
+def top_anfitrioes(tabela, cor='pink'):
+    import altair as alt
+
+    return alt.Chart(tabela).mark_bar(**_marca(cor)).encode(
+        x=alt.X('anfitriao', sort='-y', title='Anfitrião'),
+        y=alt.Y('number_of_reviews', title='Número de Avaliações'),
+        tooltip=['host_name', 'host_id', 'number_of_reviews']
+    ).properties(width=600)
+
+
+@cronometrado('grafico.avaliacoes_por_mes', tamanho=_tamanho_json)
+def avaliacoes_por_mes(tabela):
+    import altair as alt
+
+    return alt.Chart(tabela).mark_line(color='red').encode(
+        x=alt.X('mes', type='temporal', title='Mês da Última Avaliação'),
+        y=alt.Y('reviews_per_month', title='Avaliações por Mês')
+    ).properties(width=600)
+
+
+@cronometrado('grafico.tendencia', tamanho=_tamanho_json)
+def tendencia(tabela):
+    import altair as alt
+
+    base = alt.Chart(tabela).encode(x=alt.X('mes', type='temporal', title='Mês'))
+    ativos = base.mark_line(color='red').encode(y=alt.Y('ativos', title='Anúncios Ativos'))
+    ocupacao = base.mark_line(color='gray', strokeDash=[4, 2]).encode(
+        y=alt.Y('ocupacao', title='Ocupação Estimada', axis=alt.Axis(format='%'))
+    )
+    return alt.layer(ativos, ocupacao).resolve_scale(y='independent').properties(width=600)
+
+
+@cronometrado('grafico.decaimento', tamanho=_tamanho_json)
+def decaimento(tabela):
+    import altair as alt
+
+    return alt.Chart(tabela).mark_area(color='pink', line={'color': 'red'}).encode(
+        x=alt.X('meses_sem_avaliacao', title='Meses Desde a Última Avaliação'),
+        y=alt.Y('fracao_recente', title='Anúncios Avaliados Neste Prazo', axis=alt.Axis(format='%'))
+    ).properties(width=600)
+
+
+@cronometrado('grafico.mapa', tamanho=_tamanho_json)
+def mapa(tipo, dados, zoom=ZOOM_MAPA):
+    """Deck do pydeck para o resultado de ``nucleo.analise.dados_do_mapa``."""
+    import pydeck as pdk
+
+    view_state = pdk.ViewState(
+        latitude=LATITUDE_RJ,
+        longitude=LONGITUDE_RJ,
+        zoom=zoom,
+        pitch=50,
+    )
+    layer, tooltip = camada_mapa(tipo, dados)
+    return pdk.Deck(
+        layers=[layer],
+        initial_view_state=view_state,
+        tooltip=tooltip
+    )
@@ -0,0 +1,137 @@
+"""Grafo de cálculo com dependências declaradas e memorização por impressão digital.
+
+Cada nó declara de quais entradas ou nós depende. A chave de um nó é o hash
+das impressões digitais das dependências: se nenhuma mudou desde o rerun
+anterior, o valor guardado é reaproveitado sem chamar a função. A impressão
+de um nó é a própria chave ou, com ``impressao=``, um hash do valor
+calculado, o que corta a propagação quando um nó é recalculado mas dá o
+mesmo resultado (mudar o preço sem mudar o top 10 não redesenha o gráfico).
+
+A avaliação é preguiçosa: só os nós pedidos (e o que eles usam) são
+calculados. A memória é um dicionário comum, no Streamlit o
+``st.session_state`` da sessão, e guarda um valor por nó.
+"""
+import hashlib
+import json
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from nucleo.instrumentacao import contar, etapa
+
+
+def impressao_digital(valor):
+    """Hash do conteúdo de ``valor`` (DataFrames, arrays, dicts e valores simples)."""
+    h = hashlib.sha1()
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        if isinstance(valor, pd.DataFrame):
+            esquema = list(zip(valor.columns.astype(str), valor.dtypes.astype(str)))
+        else:
+            esquema = [(str(valor.name), str(valor.dtype))]
+        h.update(repr(esquema).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+    elif isinstance(valor, np.ndarray):
+        h.update(f'{valor.dtype}{valor.shape}'.encode('utf-8'))
+        h.update(np.ascontiguousarray(valor).tobytes())
+    else:
+        h.update(json.dumps(valor, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+class No(NamedTuple):
+    funcao: Callable
+    dependencias: tuple
+    impressao: Callable = None
+
+
+class Grafo:
+    """Entradas e nós de cálculo; ``avaliar`` resolve os nós para um conjunto de entradas."""
+
+    def __init__(self):
+        self.entradas = {}
+        self.nos = {}
+
+    def entrada(self, nome, impressao=impressao_digital):
+        """Declara uma entrada; ``impressao`` diz quando ela mudou (padrão: pelo conteúdo)."""
+        self.entradas[nome] = impressao
+
+    def no(self, nome, *dependencias, impressao=None):
+        """Decorador que registra ``funcao(*valores das dependencias)`` como o nó ``nome``."""
+        def registrar(funcao):
+            self.adicionar(nome, funcao, *dependencias, impressao=impressao)
+            return funcao
+        return registrar
+
+    def adicionar(self, nome, funcao, *dependencias, impressao=None):
+        for dependencia in dependencias:
+            if dependencia not in self.entradas and dependencia not in self.nos:
+                raise ValueError(f'{nome}: dependência desconhecida {dependencia!r}')
+        self.nos[nome] = No(funcao, tuple(dependencias), impressao)
+
+    def avaliar(self, memoria, **entradas):
+        """``Avaliacao`` deste rerun; ``memoria`` guarda os valores entre reruns."""
+        faltando = set(self.entradas) - set(entradas)
+        if faltando:
+            raise ValueError(f'entradas sem valor: {sorted(faltando)}')
+        return Avaliacao(self, memoria, entradas)
+
+
+class Avaliacao:
+    """Valores dos nós para um conjunto de entradas, calculados sob demanda."""
+
+    def __init__(self, grafo, memoria, entradas):
+        self.grafo = grafo
+        self.memoria = memoria
+        self.entradas = entradas
+        self.recalculados = []
+        self.reaproveitados = []
+        self._impressoes = {}
+        self._chaves = {}
+
+    def chave(self, nome):
+        """Hash das impressões das dependências do nó: se não mudou, o valor guardado vale."""
+        if nome not in self._chaves:
+            no = self.grafo.nos[nome]
+            partes = [nome] + [self.impressao(dependencia) for dependencia in no.dependencias]
+            self._chaves[nome] = hashlib.sha1('\x1f'.join(partes).encode('utf-8')).hexdigest()
+        return self._chaves[nome]
+
+    def impressao(self, nome):
+        """Impressão digital de uma entrada ou nó (calcula o nó se ela depende do valor)."""
+        if nome not in self._impressoes:
+            if nome in self.grafo.entradas:
+                self._impressoes[nome] = str(self.grafo.entradas[nome](self.entradas[nome]))
+            elif self.grafo.nos[nome].impressao is None:
+                self._impressoes[nome] = self.chave(nome)
+            else:
+                self[nome]
+                self._impressoes[nome] = self.memoria[nome][2]
+        return self._impressoes[nome]
+
+    def __getitem__(self, nome):
+        if nome in self.grafo.entradas:
+            return self.entradas[nome]
+        chave = self.chave(nome)
+        guardado = self.memoria.get(nome)
+        if guardado is not None and guardado[0] == chave:
+            if nome not in self.reaproveitados and nome not in self.recalculados:
+                self.reaproveitados.append(nome)
+                contar('grafo.reaproveitados')
+            return guardado[1]
+
+        no = self.grafo.nos[nome]
+        argumentos = [self[dependencia] for dependencia in no.dependencias]
+        with etapa(f'grafo.{nome}'):
+            valor = no.funcao(*argumentos)
+        impressao = chave if no.impressao is None else str(no.impressao(valor))
+        # Só grava depois de calcular: um rerun interrompido no meio não deixa valor pela metade
+        self.memoria[nome] = (chave, valor, impressao)
+        self.recalculados.append(nome)
+        contar('grafo.recalculados')
+        return valor
+
+    def invalidar(self, nome):
+        """Descarta o valor guardado do nó (ex.: uma resposta com erro que deve ser refeita)."""
+        self.memoria.pop(nome, None)
+        self._impressoes.pop(nome, None)
@@ -0,0 +1,184 @@
+"""Serviço de análises por IA (Gemini) com cache em disco e chamadas concorrentes.
+
+Cada resposta é guardada num SQLite local, com chave no hash de
+(modelo, prompt, tabela agregada, filtros). Só os pedidos sem resposta em cache
+vão para o modelo, todos ao mesmo tempo num pool de threads e cada um com o
+seu tempo limite.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextvars import copy_context
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as TempoEsgotado
+
+from nucleo.cache import CacheTTL
+from nucleo.carregamento import DIR_CACHE
+from nucleo.instrumentacao import contar, etapa, payload
+
+MODELO_PADRAO = 'gemini-1.5-flash'
+
+
+class BackendGemini:
+    """Chamadas ao Gemini. O modelo é criado uma vez e reaproveitado."""
+
+    def __init__(self, modelo=MODELO_PADRAO, api_key=None):
+        import google.generativeai as ai
+
+        if api_key:
+            ai.configure(api_key=api_key)
+        self.nome = modelo
+        self._modelo = ai.GenerativeModel(modelo)
+
+    def gerar(self, prompt, timeout=None):
+        opcoes = {'timeout': timeout} if timeout else None
+        return self._modelo.generate_content(prompt, request_options=opcoes).text
+
+
+class BackendFalso:
+    """Backend local e determinístico, para testes e uso offline."""
+
+    def __init__(self, atraso=0.0, nome='falso'):
+        self.nome = nome
+        self.atraso = atraso
+        self.chamadas = 0
+        self._lock = threading.Lock()
+
+    def gerar(self, prompt, timeout=None):
+        with self._lock:
+            self.chamadas += 1
+        if timeout is not None and self.atraso > timeout:
+            time.sleep(timeout)
+            raise TempoEsgotado(f'sem resposta em {timeout}s')
+        time.sleep(self.atraso)
+        resumo = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+        return f'Análise simulada do prompt {resumo} ({len(prompt)} caracteres).'
+
+
+class CacheDisco:
+    """Cache persistente de respostas em SQLite, com expiração (TTL) e descarte LRU."""
+
+    def __init__(self, caminho, max_itens=500, ttl=7 * 24 * 60 * 60):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self._conexao = sqlite3.connect(str(caminho), check_same_thread=False)
+        self._conexao.execute(
+            'CREATE TABLE IF NOT EXISTS respostas '
+            '(chave TEXT PRIMARY KEY, texto TEXT NOT NULL, criado REAL NOT NULL, acessado REAL NOT NULL)'
+        )
+        self._conexao.commit()
+
+    def obter(self, chave):
+        agora = time.time()
+        with self._lock:
+            linha = self._conexao.execute('SELECT texto, criado FROM respostas WHERE chave = ?', (chave,)).fetchone()
+            if linha is None or (self.ttl is not None and agora - linha[1] > self.ttl):
+                if linha is not None:
+                    self._conexao.execute('DELETE FROM respostas WHERE chave = ?', (chave,))
+                    self._conexao.commit()
+                self.falhas += 1
+                contar('cache.ia.falhas')
+                return None
+            self._conexao.execute('UPDATE respostas SET acessado = ? WHERE chave = ?', (agora, chave))
+            self._conexao.commit()
+            self.acertos += 1
+            contar('cache.ia.acertos')
+            return linha[0]
+
+    def guardar(self, chave, texto):
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute('INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?)', (chave, texto, agora, agora))
+            # Descarta as respostas usadas há mais tempo quando passa do limite
+            self._conexao.execute(
+                'DELETE FROM respostas WHERE chave IN '
+                '(SELECT chave FROM respostas ORDER BY acessado DESC LIMIT -1 OFFSET ?)',
+                (self.max_itens,),
+            )
+            self._conexao.commit()
+
+
+def chave_analise(modelo, prompt, tabela=None, filtros=None):
+    """Hash que identifica uma resposta: modelo, prompt, tabela agregada e filtros."""
+    partes = [
+        modelo,
+        prompt,
+        None if tabela is None else tabela.to_csv(index=False),
+        None if filtros is None else sorted((k, str(v)) for k, v in filtros.items()),
+    ]
+    return hashlib.sha256(json.dumps(partes, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ServicoAnalise:
+    """Despacha análises para o backend, reaproveitando o cache e chamando em paralelo."""
+
+    def __init__(self, backend, cache=None, max_paralelo=5, timeout=30.0):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix='analise-ia')
+
+    def _chamar(self, chave, prompt):
+        with etapa(f'ia.{self.backend.nome}'):
+            texto = self.backend.gerar(prompt, timeout=self.timeout)
+        payload('ia.resposta', len(texto.encode('utf-8')))
+        if self.cache is not None:
+            self.cache.guardar(chave, texto)
+        return texto
+
+    def analisar(self, prompt, tabela=None, filtros=None):
+        """Retorna um ``Future`` com o texto da análise; já resolvido se estava em cache."""
+        chave = chave_analise(self.backend.nome, prompt, tabela, filtros)
+        payload('ia.prompt', lambda: len(prompt.encode('utf-8')))
+        texto = self.cache.obter(chave) if self.cache is not None else None
+        if texto is not None:
+            futuro = Future()
+            futuro.set_result(texto)
+            return futuro
+        # Roda numa cópia do contexto para a chamada entrar na medição deste rerun
+        return self._executor.submit(copy_context().run, self._chamar, chave, prompt)
+
+    def analisar_varios(self, pedidos, filtros=None):
+        """Dispara todos os pedidos ``{nome: (prompt, tabela)}`` e retorna ``{nome: Future}``."""
+        return {nome: self.analisar(prompt, tabela, filtros) for nome, (prompt, tabela) in pedidos.items()}
+
+    def concluidos(self, futuros):
+        """Gera ``(nome, texto, erro)`` na ordem em que as respostas chegam.
+
+        Pedidos que não respondem dentro de ``timeout`` saem com ``erro``
+        preenchido, sem bloquear os demais.
+        """
+        nomes = {futuro: nome for nome, futuro in futuros.items()}
+        pendentes = set(nomes)
+        try:
+            for futuro in as_completed(nomes, timeout=self.timeout):
+                pendentes.discard(futuro)
+                erro = futuro.exception()
+                yield nomes[futuro], None if erro else futuro.result(), erro
+        except TempoEsgotado:
+            for futuro in pendentes:
+                futuro.cancel()
+                yield nomes[futuro], None, TempoEsgotado(f'sem resposta em {self.timeout}s')
+
+
+# Um serviço por (modelo, chave de API) para todo o processo, compartilhado entre sessões
+_servicos = CacheTTL(max_itens=4)
+
+
+def servico_analise(modelo=MODELO_PADRAO, api_key=None):
+    """Serviço compartilhado do processo. Com ``AIRBNB_IA_FALSA=1`` usa o backend local."""
+    def criar():
+        if os.environ.get('AIRBNB_IA_FALSA'):
+            backend = BackendFalso()
+        else:
+            backend = BackendGemini(modelo, api_key)
+        return ServicoAnalise(backend, CacheDisco(DIR_CACHE / 'analises.sqlite'))
+
+    return _servicos.obter_ou_criar((modelo, api_key), criar)
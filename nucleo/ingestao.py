@@ -0,0 +1,321 @@
+"""Ingestão de vários snapshots (cidade e data) num dataset particionado.
+
+Cada snapshot fica em ``dados/listings/cidade=<cidade>/data=<AAAA-MM-DD>/``,
+com os listings tipados em Parquet e as diferenças em relação ao snapshot
+anterior da mesma cidade. Ingerir um snapshot novo processa só a partição
+dele e lê do snapshot anterior apenas as colunas usadas na comparação.
+
+Uso pela linha de comando::
+
+    python -m nucleo.ingestao registrar rio-de-janeiro 2024-06-27 listings.csv
+    python -m nucleo.ingestao ingerir
+    python -m nucleo.ingestao listar
+    python -m nucleo.ingestao comparar rio-de-janeiro 2024-03-28 2024-06-27
+    python -m nucleo.ingestao ranking --top 10
+    python -m nucleo.ingestao tendencia rio-de-janeiro --janela 3
+
+Na ingestão também são gravados esboços mescláveis (``nucleo.sketches``) da
+partição, de onde saem rankings e quantis aproximados de várias cidades sem
+reler os listings, e o rollup mensal de atividade (``nucleo.series``), que
+junta os snapshots de uma cidade numa série só.
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from nucleo.carregamento import carregar_listings, tipar_listings
+from nucleo.series import SerieTemporal, mesclar_rollups, rollup_listings
+from nucleo.sketches import esbocar_listings, esbocos_como_dict, esbocos_de_dict, mesclar_esbocos
+
+DIR_DADOS = Path(os.environ.get('AIRBNB_DADOS_DIR', Path(__file__).resolve().parent.parent / 'dados'))
+
+URL_INSIDE_AIRBNB = 'https://data.insideairbnb.com/{pais}/{regiao}/{cidade}/{data}/visualisations/listings.csv'
+
+# Colunas comparadas entre snapshots para marcar um listing como alterado
+COLUNAS_COMPARACAO = ['price', 'number_of_reviews', 'availability_365', 'minimum_nights', 'room_type']
+
+ARQUIVO_LISTINGS = 'listings.parquet'
+ARQUIVO_DIFERENCAS = 'diferencas.parquet'
+ARQUIVO_ESBOCOS = 'esbocos.json'
+ARQUIVO_SERIES = 'series.parquet'
+
+
+def url_inside_airbnb(pais, regiao, cidade, data):
+    return URL_INSIDE_AIRBNB.format(pais=pais, regiao=regiao, cidade=cidade, data=data)
+
+
+def diferencas(anterior, atual, colunas=COLUNAS_COMPARACAO):
+    """Listings novos, removidos e alterados entre dois snapshots, comparados pelo ``id``."""
+    colunas = [c for c in colunas if c in anterior.columns and c in atual.columns]
+    juntos = anterior[['id', *colunas]].merge(
+        atual[['id', *colunas]], on='id', how='outer', suffixes=('_antes', '_depois'), indicator=True
+    )
+    alterado = pd.Series(False, index=juntos.index)
+    for coluna in colunas:
+        antes = juntos[f'{coluna}_antes'].astype(object)
+        depois = juntos[f'{coluna}_depois'].astype(object)
+        alterado |= ~((antes == depois) | (antes.isna() & depois.isna()))
+
+    juntos['status'] = 'igual'
+    juntos.loc[alterado, 'status'] = 'alterado'
+    juntos.loc[juntos['_merge'] == 'right_only', 'status'] = 'novo'
+    juntos.loc[juntos['_merge'] == 'left_only', 'status'] = 'removido'
+    juntos = juntos.drop(columns='_merge')
+    return juntos[juntos['status'] != 'igual'].reset_index(drop=True)
+
+
+class Repositorio:
+    """Registro de snapshots e dataset particionado por cidade e data."""
+
+    def __init__(self, raiz=DIR_DADOS):
+        self.raiz = Path(raiz)
+        self.arquivo_registro = self.raiz / 'registro.json'
+        self._lock = threading.Lock()
+
+    def _ler_registro(self):
+        if not self.arquivo_registro.exists():
+            return []
+        return json.loads(self.arquivo_registro.read_text(encoding='utf-8'))
+
+    def _gravar_registro(self, registro):
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        temporario = self.arquivo_registro.with_suffix('.tmp')
+        temporario.write_text(json.dumps(registro, indent=2, ensure_ascii=False), encoding='utf-8')
+        os.replace(temporario, self.arquivo_registro)
+
+    def particao(self, cidade, data):
+        return self.raiz / 'listings' / f'cidade={cidade}' / f'data={data}'
+
+    def registrar(self, cidade, data, fonte):
+        """Registra um snapshot (URL ou arquivo local) para ser ingerido depois."""
+        data = pd.Timestamp(data).strftime('%Y-%m-%d')
+        with self._lock:
+            registro = [s for s in self._ler_registro() if (s['cidade'], s['data']) != (cidade, data)]
+            entrada = {'cidade': cidade, 'data': data, 'fonte': str(fonte), 'ingerido_em': None}
+            registro.append(entrada)
+            registro.sort(key=lambda s: (s['cidade'], s['data']))
+            self._gravar_registro(registro)
+        return entrada
+
+    def snapshots(self, cidade=None, ingeridos=True):
+        """Snapshots registrados, em ordem de cidade e data."""
+        return [
+            s for s in self._ler_registro()
+            if (cidade is None or s['cidade'] == cidade) and (not ingeridos or s['ingerido_em'])
+        ]
+
+    def anterior(self, cidade, data):
+        """Último snapshot ingerido da ``cidade`` antes de ``data``, ou ``None``."""
+        anteriores = [s for s in self.snapshots(cidade) if s['data'] < data]
+        return anteriores[-1] if anteriores else None
+
+    def proximo(self, cidade, data):
+        """Primeiro snapshot ingerido da ``cidade`` depois de ``data``, ou ``None``."""
+        proximos = [s for s in self.snapshots(cidade) if s['data'] > data]
+        return proximos[0] if proximos else None
+
+    def ler(self, cidade, data, colunas=None):
+        """Lê um snapshot do dataset, opcionalmente só algumas colunas."""
+        return pd.read_parquet(self.particao(cidade, data) / ARQUIVO_LISTINGS, columns=colunas)
+
+    def carregar(self, cidade, data):
+        """Snapshot completo pelo cache de processo de ``carregar_listings``."""
+        return carregar_listings(self.particao(cidade, data) / ARQUIVO_LISTINGS)
+
+    def ingerir(self, cidade, data, fonte=None):
+        """Processa só a partição do snapshot e grava as diferenças para o anterior.
+
+        Se já houver um snapshot ingerido mais novo da cidade (ingestão fora de
+        ordem), as diferenças dele passam a ser contra este.
+        """
+        data = pd.Timestamp(data).strftime('%Y-%m-%d')
+        if fonte is None:
+            fonte = next((s['fonte'] for s in self._ler_registro() if (s['cidade'], s['data']) == (cidade, data)), None)
+            if fonte is None:
+                raise ValueError(f'snapshot {cidade} {data} não registrado: informe a fonte')
+        else:
+            self.registrar(cidade, data, fonte)
+
+        fonte = str(fonte)
+        df = tipar_listings(pd.read_parquet(fonte) if fonte.endswith('.parquet') else pd.read_csv(fonte))
+
+        destino = self.particao(cidade, data)
+        destino.mkdir(parents=True, exist_ok=True)
+        temporario = destino / f'{ARQUIVO_LISTINGS}.tmp'
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, destino / ARQUIVO_LISTINGS)
+        self._gravar_esbocos(destino, esbocar_listings(df))
+        self._gravar_series(destino, rollup_listings(df))
+
+        colunas = ['id', *COLUNAS_COMPARACAO]
+        comparacao = df[[c for c in colunas if c in df.columns]]
+        resumo = {'cidade': cidade, 'data': data, 'linhas': len(df), 'anterior': None, 'proximo': None}
+        anterior = self.anterior(cidade, data)
+        if anterior is not None:
+            mudancas = diferencas(self.ler(cidade, anterior['data'], colunas), comparacao)
+            self._gravar_diferencas(destino, mudancas)
+            resumo['anterior'] = anterior['data']
+            resumo.update(mudancas['status'].value_counts().to_dict())
+        proximo = self.proximo(cidade, data)
+        if proximo is not None:
+            self._gravar_diferencas(self.particao(cidade, proximo['data']),
+                                    diferencas(comparacao, self.ler(cidade, proximo['data'], colunas)))
+            resumo['proximo'] = proximo['data']
+
+        with self._lock:
+            registro = self._ler_registro()
+            for s in registro:
+                if (s['cidade'], s['data']) == (cidade, data):
+                    s['ingerido_em'] = datetime.now().isoformat(timespec='seconds')
+                    s['linhas'] = len(df)
+            self._gravar_registro(registro)
+        return resumo
+
+    def _gravar_diferencas(self, destino, mudancas):
+        temporario = destino / f'{ARQUIVO_DIFERENCAS}.tmp'
+        mudancas.to_parquet(temporario, index=False)
+        os.replace(temporario, destino / ARQUIVO_DIFERENCAS)
+
+    def _gravar_esbocos(self, destino, esbocos):
+        temporario = destino / f'{ARQUIVO_ESBOCOS}.tmp'
+        temporario.write_text(json.dumps(esbocos_como_dict(esbocos)), encoding='utf-8')
+        os.replace(temporario, destino / ARQUIVO_ESBOCOS)
+
+    def esbocos_particao(self, cidade, data):
+        """Esboços de um snapshot; partições ingeridas antes dos esboços são esboçadas agora."""
+        destino = self.particao(cidade, data)
+        caminho = destino / ARQUIVO_ESBOCOS
+        if caminho.exists():
+            return esbocos_de_dict(json.loads(caminho.read_text(encoding='utf-8')))
+        esbocos = esbocar_listings(self.ler(cidade, data, ['host_id', 'neighbourhood', 'price', 'number_of_reviews']))
+        self._gravar_esbocos(destino, esbocos)
+        return esbocos
+
+    def esbocos(self, cidades=None, datas=None):
+        """Esboços mesclados dos snapshots escolhidos.
+
+        Sem ``datas`` usa o snapshot mais recente de cada cidade (somar
+        snapshots da mesma cidade contaria os mesmos listings mais de uma vez).
+        """
+        escolhidos = {}
+        for s in self.snapshots():
+            if cidades is not None and s['cidade'] not in cidades:
+                continue
+            if datas is not None and s['data'] not in datas:
+                continue
+            chave = (s['cidade'], s['data']) if datas is not None else s['cidade']
+            escolhidos[chave] = s
+        acumulado = {}
+        for s in escolhidos.values():
+            mesclar_esbocos(acumulado, self.esbocos_particao(s['cidade'], s['data']))
+        return acumulado
+
+    def _gravar_series(self, destino, rollup):
+        temporario = destino / f'{ARQUIVO_SERIES}.tmp'
+        rollup.to_parquet(temporario, index=False)
+        os.replace(temporario, destino / ARQUIVO_SERIES)
+
+    def series_particao(self, cidade, data):
+        """Rollup mensal de um snapshot; partições ingeridas antes das séries são processadas agora."""
+        destino = self.particao(cidade, data)
+        caminho = destino / ARQUIVO_SERIES
+        if caminho.exists():
+            return pd.read_parquet(caminho)
+        rollup = rollup_listings(self.ler(cidade, data, [
+            'neighbourhood', 'room_type', 'last_review', 'reviews_per_month', 'number_of_reviews', 'minimum_nights',
+        ]))
+        self._gravar_series(destino, rollup)
+        return rollup
+
+    def series(self, cidade, datas=None):
+        """``SerieTemporal`` da cidade com os rollups dos snapshots ingeridos (ou só de ``datas``)."""
+        rollups = {
+            s['data']: self.series_particao(cidade, s['data'])
+            for s in self.snapshots(cidade) if datas is None or s['data'] in datas
+        }
+        return SerieTemporal(mesclar_rollups(rollups))
+
+    def ingerir_pendentes(self):
+        """Ingere, em ordem de data, os snapshots registrados que ainda não foram processados."""
+        return [self.ingerir(s['cidade'], s['data']) for s in self.snapshots(ingeridos=False) if not s['ingerido_em']]
+
+    def diferencas(self, cidade, data):
+        """Diferenças gravadas na ingestão do snapshot (vazio para o primeiro da cidade)."""
+        caminho = self.particao(cidade, data) / ARQUIVO_DIFERENCAS
+        return pd.read_parquet(caminho) if caminho.exists() else pd.DataFrame(columns=['id', 'status'])
+
+    def comparar(self, cidade, data_a, data_b, colunas=COLUNAS_COMPARACAO):
+        """Diferenças entre dois snapshots quaisquer, lendo só ``id`` e ``colunas`` de cada um."""
+        colunas = ['id', *colunas]
+        return diferencas(self.ler(cidade, data_a, colunas), self.ler(cidade, data_b, colunas), colunas[1:])
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Ingestão de snapshots do Inside Airbnb')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    registrar = comandos.add_parser('registrar', help='registra um snapshot (URL ou arquivo local)')
+    registrar.add_argument('cidade')
+    registrar.add_argument('data')
+    registrar.add_argument('fonte')
+
+    comandos.add_parser('ingerir', help='ingere os snapshots registrados ainda não processados')
+    comandos.add_parser('listar', help='lista os snapshots registrados')
+
+    comparar = comandos.add_parser('comparar', help='resume as diferenças entre dois snapshots')
+    comparar.add_argument('cidade')
+    comparar.add_argument('data_a')
+    comparar.add_argument('data_b')
+
+    ranking = comandos.add_parser('ranking', help='top anfitriões, bairros e quantis de preço pelos esboços')
+    ranking.add_argument('--cidades', nargs='+')
+    ranking.add_argument('--datas', nargs='+', help='snapshots a somar (padrão: o mais recente de cada cidade)')
+    ranking.add_argument('--top', type=int, default=10)
+
+    tendencia = comandos.add_parser('tendencia', help='anúncios ativos e ocupação estimada por mês')
+    tendencia.add_argument('cidade')
+    tendencia.add_argument('--bairro')
+    tendencia.add_argument('--tipo-quarto')
+    tendencia.add_argument('--janela', type=int, default=1, help='média móvel em meses')
+    tendencia.add_argument('--meses', type=int, default=24, help='últimos N meses mostrados')
+
+    args = parser.parse_args(argumentos)
+    repositorio = Repositorio()
+    if args.comando == 'registrar':
+        print(repositorio.registrar(args.cidade, args.data, args.fonte))
+    elif args.comando == 'ingerir':
+        for resumo in repositorio.ingerir_pendentes():
+            print(resumo)
+    elif args.comando == 'listar':
+        for s in repositorio.snapshots(ingeridos=False):
+            print(f"{s['cidade']}\t{s['data']}\t{s.get('linhas', '-')}\t{s['ingerido_em'] or 'pendente'}")
+    elif args.comando == 'comparar':
+        print(repositorio.comparar(args.cidade, args.data_a, args.data_b)['status'].value_counts().to_string())
+    elif args.comando == 'ranking':
+        esbocos = repositorio.esbocos(args.cidades, args.datas)
+        if not esbocos:
+            print('nenhum snapshot ingerido')
+            return
+        for nome in ['anfitrioes', 'bairros']:
+            print(f"{nome} (avaliações; erro máximo {esbocos[nome].erro:.0f})")
+            print(esbocos[nome].top(args.top).to_string(index=False))
+        precos = esbocos['precos']
+        quantis = [0.01, 0.25, 0.5, 0.75, 0.99]
+        print(f'preço (erro de posto ~{precos.erro:.1%}):', dict(zip(quantis, precos.quantil(quantis).round(2).tolist())))
+    elif args.comando == 'tendencia':
+        serie = repositorio.series(args.cidade)
+        if not len(serie):
+            print('nenhum snapshot ingerido')
+            return
+        mensal = serie.mensal(args.bairro, args.tipo_quarto, janela=args.janela).tail(args.meses)
+        mensal['mes'] = mensal['mes'].dt.strftime('%Y-%m')
+        print(mensal[['mes', 'ativos', 'avaliacoes', 'ocupacao']].round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""Medição de tempo, memória, cache e tamanho de payloads de cada rerun.
+
+A medição é ligada por rerun com ``iniciar``/``finalizar`` (ou ``medir``) e
+fica numa ``ContextVar``: as funções ``etapa``, ``contar``, ``payload`` e
+``marco`` podem ser chamadas de qualquer lugar do núcleo e não fazem nada quando não há
+medição ativa, custando só uma leitura da variável de contexto.
+
+Variáveis de ambiente:
+
+- ``AIRBNB_DEBUG=1`` liga a medição em todo rerun; ``AIRBNB_DEBUG=memoria``
+  também mede o pico de memória de cada etapa (``tracemalloc``, bem mais lento
+  e global ao processo: fica ligado enquanto houver alguma medição de memória
+  ativa, de qualquer sessão);
+- ``AIRBNB_METRICAS=<arquivo>`` acrescenta cada medição ao arquivo em JSON Lines.
+
+Toda medição finalizada também sai no log ``nucleo.instrumentacao`` (nível
+INFO) como uma linha JSON.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+log = logging.getLogger(__name__)
+
+MODO_DEBUG = os.environ.get('AIRBNB_DEBUG', '')
+ARQUIVO_METRICAS = os.environ.get('AIRBNB_METRICAS')
+
+_atual = ContextVar('medicao_atual', default=None)
+_NULO = nullcontext()
+
+# Medições de memória ativas; o tracemalloc é desligado quando a última termina
+_trava_memoria = threading.Lock()
+_medicoes_memoria = 0
+_liga_tracemalloc = False
+
+
+class Medicao:
+    """Etapas cronometradas, contadores, payloads e marcos de uma execução (um rerun).
+
+    Etapas podem ser aninhadas e podem vir de outras threads (desde que
+    rodem numa cópia do contexto, ver ``ServicoAnalise``); o pico de memória
+    só é medido na thread que criou a medição.
+    """
+
+    def __init__(self, nome='rerun', memoria=False):
+        self.nome = nome
+        self.memoria = memoria
+        self.etapas = []
+        self.contadores = Counter()
+        self.payloads = Counter()
+        self.marcos = {}
+        self.inicio = time.perf_counter()
+        self.segundos = None
+        self._thread = threading.get_ident()
+        self._niveis = {}  # thread -> profundidade atual de etapas aninhadas
+        self._picos = []  # pico de memória de cada etapa aberta na thread principal
+        self._token = None
+
+    @contextmanager
+    def etapa(self, nome):
+        thread = threading.get_ident()
+        nivel = self._niveis.get(thread, 0)
+        self._niveis[thread] = nivel + 1
+        memoria = self.memoria and thread == self._thread and tracemalloc.is_tracing()
+        if memoria:
+            # O pico de cada etapa também vale para a etapa que a contém
+            _, pico = tracemalloc.get_traced_memory()
+            if self._picos:
+                self._picos[-1] = max(self._picos[-1], pico)
+            tracemalloc.reset_peak()
+            self._picos.append(0)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            registro = {
+                'nome': nome,
+                'nivel': nivel,
+                'inicio': inicio - self.inicio,
+                'segundos': time.perf_counter() - inicio,
+            }
+            if memoria:
+                _, pico = tracemalloc.get_traced_memory()
+                pico = max(self._picos.pop(), pico)
+                if self._picos:
+                    self._picos[-1] = max(self._picos[-1], pico)
+                registro['pico_memoria'] = pico
+            if thread != self._thread:
+                registro['thread'] = threading.current_thread().name
+            self._niveis[thread] = nivel
+            self.etapas.append(registro)
+
+    def contar(self, nome, n=1):
+        self.contadores[nome] += n
+
+    def payload(self, nome, tamanho):
+        """Soma ``tamanho`` bytes ao payload ``nome`` (gráfico, mapa, prompt...)."""
+        self.payloads[nome] += int(tamanho)
+
+    def marco(self, nome):
+        """Registra quando (segundos desde o início) ``nome`` aconteceu pela primeira vez."""
+        self.marcos.setdefault(nome, time.perf_counter() - self.inicio)
+
+    def como_dict(self):
+        return {
+            'nome': self.nome,
+            'segundos': self.segundos if self.segundos is not None else time.perf_counter() - self.inicio,
+            'etapas': sorted(self.etapas, key=lambda etapa: etapa['inicio']),
+            'contadores': dict(self.contadores),
+            'payloads': dict(self.payloads),
+            'marcos': dict(self.marcos),
+        }
+
+
+def habilitada():
+    """Se a medição deve ser ligada por padrão (``AIRBNB_DEBUG`` ou ``AIRBNB_METRICAS``)."""
+    return bool(MODO_DEBUG or ARQUIVO_METRICAS)
+
+
+def atual():
+    """Medição ativa no contexto atual, ou ``None``."""
+    return _atual.get()
+
+
+def _ligar_memoria():
+    global _medicoes_memoria, _liga_tracemalloc
+    with _trava_memoria:
+        if _medicoes_memoria == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _liga_tracemalloc = True
+        _medicoes_memoria += 1
+
+
+def _desligar_memoria():
+    global _medicoes_memoria, _liga_tracemalloc
+    with _trava_memoria:
+        _medicoes_memoria -= 1
+        if _medicoes_memoria == 0 and _liga_tracemalloc:
+            tracemalloc.stop()
+            _liga_tracemalloc = False
+
+
+def iniciar(nome='rerun', memoria=None):
+    """Cria uma medição e a torna ativa no contexto atual.
+
+    Prefira ``medir``: uma medição iniciada precisa ser finalizada no mesmo
+    contexto, mesmo se o código medido levantar exceção.
+    """
+    if memoria is None:
+        memoria = MODO_DEBUG == 'memoria'
+    medicao = Medicao(nome, memoria=memoria)
+    if memoria:
+        _ligar_memoria()
+    medicao._token = _atual.set(medicao)
+    return medicao
+
+
+def finalizar(medicao):
+    """Desativa a medição e exporta o resultado para o log e para ``AIRBNB_METRICAS``."""
+    if medicao._token is None:
+        return medicao.como_dict()
+    _atual.reset(medicao._token)
+    medicao._token = None
+    medicao.segundos = time.perf_counter() - medicao.inicio
+    if medicao.memoria:
+        _desligar_memoria()
+
+    dados = medicao.como_dict()
+    linha = json.dumps(dados, ensure_ascii=False, default=str)
+    log.info(linha)
+    if ARQUIVO_METRICAS:
+        with open(ARQUIVO_METRICAS, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(linha + '\n')
+    return dados
+
+
+@contextmanager
+def medir(nome='rerun', memoria=None):
+    """Medição ativa durante o bloco ``with``, finalizada mesmo se o bloco for interrompido."""
+    medicao = iniciar(nome, memoria)
+    try:
+        yield medicao
+    finally:
+        finalizar(medicao)
+
+
+def etapa(nome):
+    """Context manager que cronometra ``nome`` na medição ativa (ou não faz nada)."""
+    medicao = _atual.get()
+    return _NULO if medicao is None else medicao.etapa(nome)
+
+
+def contar(nome, n=1):
+    medicao = _atual.get()
+    if medicao is not None:
+        medicao.contar(nome, n)
+
+
+def payload(nome, tamanho):
+    """Registra o tamanho de um payload; ``tamanho`` pode ser uma função, só chamada se houver medição."""
+    medicao = _atual.get()
+    if medicao is not None:
+        medicao.payload(nome, tamanho() if callable(tamanho) else tamanho)
+
+
+def marco(nome):
+    """Marca um ponto do rerun, como a primeira pintura útil (big numbers na tela)."""
+    medicao = _atual.get()
+    if medicao is not None:
+        medicao.marco(nome)
+
+
+def cronometrado(nome, tamanho=None):
+    """Decorador que mede a função como a etapa ``nome``.
+
+    ``tamanho(resultado)``, se informado, dá os bytes do resultado (spec do
+    gráfico, JSON do mapa, prompt) e só é calculado com medição ativa.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            medicao = _atual.get()
+            if medicao is None:
+                return funcao(*args, **kwargs)
+            with medicao.etapa(nome):
+                resultado = funcao(*args, **kwargs)
+            if tamanho is not None:
+                medicao.payload(nome, tamanho(resultado))
+            return resultado
+        return medida
+    return decorador
@@ -0,0 +1,87 @@
+"""Limpeza de valores numéricos e formatação de moeda sem depender do locale do sistema.
+
+``converter_numero`` entende preços como ``$1,234.00`` (formato do Inside
+Airbnb), ``R$ 1.234,56`` e ``1234``, tudo com operações vetorizadas do pandas,
+e devolve também as linhas rejeitadas. ``formatar_moeda`` substitui o
+``locale.currency`` com ``pt_BR.UTF-8``: não depende do locale estar instalado
+nem altera estado global do processo, então pode ser usado por várias sessões
+ao mesmo tempo.
+"""
+import logging
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# Só o símbolo de moeda e espaços são removidos antes de validar; qualquer outro caractere rejeita o valor
+_IGNORADOS = r'US\$|R\$|\$|\s'
+# Vírgula decimal com 1 ou 2 dígitos, com pontos de milhar ou não antes: '1.234,56', '1234,56', '12,5'
+_VIRGULA_DECIMAL = r'-?(?:\d{1,3}(?:\.\d{3})+|\d+),\d{1,2}'
+# Pontos separando grupos de três dígitos: '1.234.567'
+_PONTOS_MILHAR = r'-?\d{1,3}(?:\.\d{3}){2,}'
+# Formato do Inside Airbnb: vírgulas de milhar e ponto decimal opcionais: '1,234.00', '1234', '.5'
+_FORMATO_US = r'-?(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+)'
+# Posições onde entra o separador de milhar na parte inteira
+_GRUPOS_MILHAR = r'\B(?=(\d{3})+(?!\d))'
+
+
+class ResultadoNumerico(NamedTuple):
+    valores: pd.Series
+    rejeitados: pd.Index
+
+
+def converter_numero(serie):
+    """Converte textos numéricos (com símbolo de moeda e separadores) em float.
+
+    Valores vazios viram NaN; valores fora dos formatos aceitos (texto além do
+    símbolo de moeda, notação científica, separadores fora do lugar) também
+    viram NaN e têm o índice listado em ``rejeitados``.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return ResultadoNumerico(serie.astype(float), serie.index[:0])
+
+    texto = serie.astype('string').str.strip()
+    vazio = texto.isna() | (texto == '')
+    limpo = texto.str.replace(_IGNORADOS, '', regex=True)
+
+    virgula_decimal = limpo.str.fullmatch(_VIRGULA_DECIMAL).fillna(False)
+    pontos_milhar = limpo.str.fullmatch(_PONTOS_MILHAR).fillna(False)
+    valido = virgula_decimal | pontos_milhar | limpo.str.fullmatch(_FORMATO_US).fillna(False)
+
+    normalizado = limpo.str.replace(',', '', regex=False)
+    normalizado = normalizado.mask(pontos_milhar, limpo.str.replace('.', '', regex=False))
+    normalizado = normalizado.mask(
+        virgula_decimal, limpo.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    )
+
+    valores = pd.to_numeric(normalizado.where(valido), errors='coerce').astype(float)
+    rejeitados = serie.index[(~vazio & valores.isna()).to_numpy()]
+    if len(rejeitados):
+        log.warning('%d valores de %r rejeitados (ex.: %s)', len(rejeitados), serie.name,
+                    list(serie.loc[rejeitados[:3]]))
+    return ResultadoNumerico(pd.Series(valores.to_numpy(), index=serie.index, name=serie.name), rejeitados)
+
+
+def formatar_moeda(valor, casas=2):
+    """Formata um número como Real: ``1234.5`` -> ``'R$ 1.234,50'``."""
+    if valor is None or pd.isna(valor):
+        return '-'
+    texto = f'{abs(valor):,.{casas}f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+    return f'-R$ {texto}' if valor < 0 else f'R$ {texto}'
+
+
+def formatar_moeda_coluna(serie, casas=2):
+    """Versão vetorizada de ``formatar_moeda`` para uma coluna inteira."""
+    valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+    nulos = np.isnan(valores)
+    escala = 10 ** casas
+    unidades = np.floor(np.abs(np.nan_to_num(valores)) * escala + 0.5).astype(np.int64)
+
+    inteiro = pd.Series(unidades // escala, index=serie.index).astype(str).str.replace(_GRUPOS_MILHAR, '.', regex=True)
+    texto = 'R$ ' + inteiro
+    if casas:
+        texto = texto + ',' + pd.Series(unidades % escala, index=serie.index).astype(str).str.zfill(casas)
+    texto = texto.where(valores >= 0, '-' + texto)
+    return texto.where(~nulos, '-')
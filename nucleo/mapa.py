@@ -0,0 +1,251 @@
+"""Dados do mapa de listings: payload enxuto e agregação espacial no servidor.
+
+As coordenadas de cada listing são quantizadas uma vez por snapshot numa grade
+fina (o índice espacial). Agregar numa grade mais grossa, para um zoom menor, é
+só um deslocamento de bits sobre esses inteiros. Os pontos também ficam
+ordenados por longitude, então recortar a janela visível é uma busca binária
+seguida de um teste de latitude na fatia encontrada.
+
+Para as consultas de vizinhança (raio e k mais próximos) os pontos também são
+agrupados em baldes de ~1 km, ordenados pela chave do balde: os candidatos
+de um raio são algumas fatias contíguas (uma por coluna de baldes) e só eles
+passam pela distância de haversine.
+"""
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from nucleo.cache import por_snapshot
+from nucleo.limpeza import formatar_moeda_coluna
+
+# Colunas realmente usadas pela camada de pontos (posição e tooltip)
+COLUNAS_PONTOS = ['longitude', 'latitude', 'name', 'number_of_reviews']
+
+# Id da camada do mapa: a seleção do pydeck (picking) chega agrupada por ele
+ID_CAMADA = 'listings'
+
+# Acima disso os pontos são agregados em células antes de ir para o navegador
+LIMITE_PONTOS = 20_000
+
+ZOOM_BASE = 18
+PIXELS_CELULA = 24
+METROS_POR_GRAU = 111_320
+RAIO_TERRA_KM = 6371.0088
+
+# Baldes das consultas de vizinhança: 2**6 células da grade base por lado (~0,9 km)
+NIVEL_BALDES = 6
+
+
+def tamanho_celula(zoom, pixels=PIXELS_CELULA):
+    """Lado da célula, em graus, que ocupa ``pixels`` na tela no nível de ``zoom``."""
+    return 360.0 / (2 ** zoom) / 256 * pixels
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Distância (km) do ponto ``(lat, lon)`` a cada ponto de ``lats``/``lons``."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class IndiceEspacial:
+    """Coordenadas quantizadas numa grade fina e ordem dos pontos por longitude."""
+
+    def __init__(self, df, zoom_base=ZOOM_BASE):
+        self.zoom_base = zoom_base
+        self.lon = df['longitude'].to_numpy(dtype=float)
+        self.lat = df['latitude'].to_numpy(dtype=float)
+        self.precos = df['price'].to_numpy(dtype=float)
+        self.avaliacoes = df['number_of_reviews'].to_numpy(dtype=float)
+
+        # Pontos sem coordenada ficam fora do mapa e das consultas (célula 0 só para não estourar o int64)
+        self.validos = np.isfinite(self.lon) & np.isfinite(self.lat)
+        base = tamanho_celula(zoom_base)
+        self.ix = np.floor(np.where(self.validos, self.lon, 0.0) / base).astype(np.int64)
+        self.iy = np.floor(np.where(self.validos, self.lat, 0.0) / base).astype(np.int64)
+
+        self.ordem_lon = np.argsort(self.lon, kind='stable')
+        self.lon_ordenada = self.lon[self.ordem_lon]
+
+    def na_janela(self, oeste, sul, leste, norte, linhas=None):
+        """Posições dos pontos dentro da janela (em graus), opcionalmente restritas a ``linhas``."""
+        lo = np.searchsorted(self.lon_ordenada, oeste, side='left')
+        hi = np.searchsorted(self.lon_ordenada, leste, side='right')
+        candidatas = self.ordem_lon[lo:hi]
+        candidatas = candidatas[(self.lat[candidatas] >= sul) & (self.lat[candidatas] <= norte)]
+        if linhas is not None:
+            candidatas = np.intersect1d(candidatas, linhas, assume_unique=True)
+        return np.sort(candidatas)
+
+    @cached_property
+    def _baldes(self):
+        # Montados na primeira consulta de vizinhança: chave do balde por ponto, em ordem
+        validos = np.flatnonzero(self.validos)
+        bx = self.ix[validos] >> NIVEL_BALDES
+        by = self.iy[validos] >> NIVEL_BALDES
+        if not len(validos):
+            return np.empty(0, dtype=np.int64), validos, 0, 0, 1, 0.0
+        bx0, by0 = bx.min(), by.min()
+        altura = by.max() - by0 + 1
+        chaves = (bx - bx0) * altura + (by - by0)
+        ordem = np.argsort(chaves, kind='stable')
+        lat, lon = self.lat[validos], self.lon[validos]
+        diagonal = float(haversine_km(lat.min(), lon.min(), lat.max(), lon.max()))
+        return chaves[ordem], validos[ordem], bx0, by0, altura, diagonal
+
+    def no_raio(self, lat, lon, raio_km, mascara=None, k=None):
+        """Posições e distâncias (km) dos pontos a até ``raio_km`` de ``(lat, lon)``, do mais perto ao mais longe.
+
+        Com ``k``, só os ``k`` mais próximos dentro do raio.
+        """
+        chaves, pontos, bx0, by0, altura, _ = self._baldes
+        lado = tamanho_celula(self.zoom_base) * 2 ** NIVEL_BALDES
+        dlat = raio_km / RAIO_TERRA_KM * 180 / np.pi
+        dlon = dlat / max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+
+        # Baldes que cobrem o retângulo do raio: uma faixa contígua de chaves por coluna
+        largura = (chaves[-1] // altura + 1) if len(chaves) else 0
+        by_a = max(int(np.floor((lat - dlat) / lado)) - by0, 0)
+        by_b = min(int(np.floor((lat + dlat) / lado)) - by0, altura - 1)
+        colunas = np.arange(max(int(np.floor((lon - dlon) / lado)) - bx0, 0),
+                            min(int(np.floor((lon + dlon) / lado)) - bx0, largura - 1) + 1)
+        if by_a > by_b or not len(colunas):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        inicio = np.searchsorted(chaves, colunas * altura + by_a, side='left')
+        fim = np.searchsorted(chaves, colunas * altura + by_b, side='right')
+        candidatos = np.concatenate([pontos[a:b] for a, b in zip(inicio, fim)])
+        if mascara is not None:
+            candidatos = candidatos[mascara[candidatos]]
+
+        distancias = haversine_km(lat, lon, self.lat[candidatos], self.lon[candidatos])
+        dentro = distancias <= raio_km
+        candidatos, distancias = candidatos[dentro], distancias[dentro]
+        if k is not None and len(candidatos) > k:
+            primeiros = np.argpartition(distancias, k - 1)[:k]
+            candidatos, distancias = candidatos[primeiros], distancias[primeiros]
+        ordem = np.argsort(distancias, kind='stable')
+        return candidatos[ordem], distancias[ordem]
+
+    def mais_proximos(self, lat, lon, k, mascara=None):
+        """Posições e distâncias (km) dos ``k`` pontos mais próximos de ``(lat, lon)``.
+
+        O raio dobra a partir do lado de um balde até conter ``k`` pontos: como
+        o raio devolve todos os pontos dentro dele, os ``k`` primeiros são exatos.
+        """
+        _, pontos, _, _, _, diagonal = self._baldes
+        if not len(pontos) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Além deste raio todos os pontos já foram vistos
+        maximo = diagonal + haversine_km(lat, lon, self.lat[pontos[0]], self.lon[pontos[0]])
+        raio = tamanho_celula(self.zoom_base) * 2 ** NIVEL_BALDES * METROS_POR_GRAU / 1000
+        while True:
+            posicoes, distancias = self.no_raio(lat, lon, raio, mascara, k=k)
+            if len(posicoes) >= k or raio > maximo:
+                return posicoes, distancias
+            raio *= 2
+
+    def resumir(self, posicoes, distancias):
+        """Estatísticas de preço e avaliações de um conjunto de vizinhos."""
+        precos = self.precos[posicoes]
+        precos = precos[~np.isnan(precos)]
+        tem_preco = len(precos) > 0
+        return {
+            'listings': len(posicoes),
+            'distancia_max_km': float(distancias.max()) if len(distancias) else 0.0,
+            'preco_medio': float(precos.mean()) if tem_preco else float('nan'),
+            'preco_mediano': float(np.median(precos)) if tem_preco else float('nan'),
+            'preco_min': float(precos.min()) if tem_preco else float('nan'),
+            'preco_max': float(precos.max()) if tem_preco else float('nan'),
+            'total_avaliacoes': int(np.nansum(self.avaliacoes[posicoes])),
+        }
+
+    def agregar(self, zoom, linhas):
+        """Células da grade do ``zoom`` com contagem de listings e preço médio (só pontos com coordenadas)."""
+        linhas = linhas[self.validos[linhas]]
+        deslocamento = max(self.zoom_base - int(zoom), 0)
+        ix = self.ix[linhas] >> deslocamento
+        iy = self.iy[linhas] >> deslocamento
+        if not len(linhas):
+            return pd.DataFrame(columns=['longitude', 'latitude', 'listings', 'price', 'lado'])
+        # Uma chave inteira por célula, para agrupar com np.unique em 1D
+        ix0, iy0 = ix.min(), iy.min()
+        largura = iy.max() - iy0 + 1
+        chaves, grupo = np.unique((ix - ix0) * largura + (iy - iy0), return_inverse=True)
+        celulas = (chaves // largura + ix0, chaves % largura + iy0)
+
+        precos = self.precos[linhas]
+        tem_preco = ~np.isnan(precos)
+        contagem = np.bincount(grupo)
+        n_preco = np.bincount(grupo, weights=tem_preco)
+        soma_preco = np.bincount(grupo, weights=np.where(tem_preco, precos, 0.0))
+
+        lado = tamanho_celula(self.zoom_base) * 2 ** deslocamento
+        with np.errstate(invalid='ignore', divide='ignore'):
+            preco_medio = soma_preco / n_preco
+        return pd.DataFrame({
+            'longitude': (celulas[0] + 0.5) * lado,
+            'latitude': (celulas[1] + 0.5) * lado,
+            'listings': contagem,
+            'price': np.round(preco_medio, 2),
+            'lado': lado,
+        })
+
+
+def indice_espacial(df):
+    """Índice espacial do snapshot ``df``, criado na primeira chamada e reaproveitado depois."""
+    return por_snapshot(df, 'indice_espacial', lambda: IndiceEspacial(df))
+
+
+def dados_mapa(df, mascara, zoom=10, janela=None, limite_pontos=LIMITE_PONTOS, agrupar=None):
+    """Dados do mapa para as linhas da ``mascara`` que têm avaliações e coordenadas.
+
+    Retorna ``('pontos', DataFrame)`` com só as colunas da camada, ou
+    ``('grade', DataFrame)`` com as células agregadas quando há mais pontos que
+    ``limite_pontos`` (ou quando ``agrupar`` for verdadeiro). ``janela`` é
+    ``(oeste, sul, leste, norte)`` em graus.
+    """
+    indice = indice_espacial(df)
+    linhas = np.flatnonzero(mascara & (df['number_of_reviews'].to_numpy() > 0) & indice.validos)
+    if janela is not None:
+        linhas = indice.na_janela(*janela, linhas=linhas)
+
+    if agrupar is None:
+        agrupar = len(linhas) > limite_pontos
+    if not agrupar:
+        return 'pontos', df[COLUNAS_PONTOS].iloc[linhas].reset_index(drop=True)
+    return 'grade', indice.agregar(zoom, linhas)
+
+
+def camada_mapa(tipo, dados):
+    """Camada pydeck e tooltip para o resultado de ``dados_mapa``."""
+    import pydeck as pdk
+
+    if tipo == 'pontos':
+        camada = pdk.Layer(
+            'ScatterplotLayer',
+            id=ID_CAMADA,
+            data=dados,
+            get_position='[longitude, latitude]',
+            get_radius=200,
+            get_color=[255, 0, 0],
+            pickable=True
+        )
+        return camada, {"text": "{name}\nNúmero de Avaliações: {number_of_reviews}"}
+
+    # Raio da célula proporcional à raiz da quantidade de listings
+    dados = dados.assign(
+        raio=dados['lado'] * METROS_POR_GRAU / 2 * np.sqrt(dados['listings'] / max(dados['listings'].max(), 1)),
+        preco_medio=formatar_moeda_coluna(dados['price']),
+    )
+    camada = pdk.Layer(
+        'ScatterplotLayer',
+        id=ID_CAMADA,
+        data=dados[['longitude', 'latitude', 'listings', 'preco_medio', 'raio']],
+        get_position='[longitude, latitude]',
+        get_radius='raio',
+        get_color=[255, 0, 0, 160],
+        pickable=True
+    )
+    return camada, {"text": "Anúncios: {listings}\nPreço médio: {preco_medio}"}
@@ -0,0 +1,156 @@
+"""Grafo de cálculo dos painéis dos dashboards.
+
+Entradas: ``snapshot``, ``filtros`` (os da barra lateral), ``agrupar_mapa``,
+``janela_tendencia`` e ``servico_ia``. Cada painel depende só do que usa:
+
+    filtros ── normal ── disco ── tabelas ─┬─ tabela.<analise> ─┬─ grafico.<analise>
+                 │                         └─ metricas          └─ prompt.<painel> ── ia.<painel>
+                 ├─ mascara ── mapa (+ agrupar_mapa) ── grafico.mapa
+                 ├─ tabela.tendencia (+ janela_tendencia) ── grafico.tendencia
+                 └─ tabela.decaimento ── grafico.decaimento
+
+``normal`` são os filtros canônicos (``relatorio.normalizar_filtros``); um
+slider que muda sem mudar a seleção não recalcula nada. As tabelas vêm do
+relatório pré-calculado em disco quando ele existe e do cubo caso contrário,
+e cada tabela tem impressão pelo conteúdo: um gráfico só é redesenhado, e um
+prompt só vai à IA, quando a tabela dele mudou. Trocar a exibição do mapa
+refaz só o mapa.
+"""
+from nucleo import analise, relatorio
+from nucleo.grafo import Grafo, impressao_digital
+from nucleo.prompts import montar_prompt
+
+# Painéis com análise por IA (prova.py): nome -> (título, tabela usada no prompt)
+PAINEIS_IA = {
+    'bairros_caros': ('Top 10 Bairros Mais Caros', 'bairros_mais_caros'),
+    'avaliacoes_bairro': ('Quantidade de Avaliações por Bairro', 'avaliacoes_por_bairro'),
+    'avaliacoes_tipo': ('Quantidade de Avaliações por Tipo de Quarto', 'avaliacoes_por_tipo'),
+    'anfitrioes': ('Top 10 Anfitriões com Mais Avaliações', 'top_anfitrioes'),
+    'mapa': ('Mapa de Locais com Avaliações', 'distribuicao_mapa'),
+}
+
+GRAFO = Grafo()
+GRAFO.entrada('snapshot', impressao=lambda snapshot: snapshot.versao)
+GRAFO.entrada('filtros')
+GRAFO.entrada('agrupar_mapa')
+GRAFO.entrada('janela_tendencia')
+GRAFO.entrada('servico_ia', impressao=lambda servico: servico.backend.nome)
+
+
+@GRAFO.no('normal', 'snapshot', 'filtros', impressao=impressao_digital)
+def _normal(snapshot, filtros):
+    return relatorio.normalizar_filtros(snapshot, filtros)
+
+
+@GRAFO.no('disco', 'snapshot', 'normal', impressao=lambda disco: disco is not None)
+def _disco(snapshot, normal):
+    return relatorio.pre_calculado(snapshot, normal)
+
+
+@GRAFO.no('tabelas', 'snapshot', 'normal', 'disco')
+def _tabelas(snapshot, normal, disco):
+    if disco is not None:
+        return disco.metricas, disco.tabelas
+    metricas, tabelas, _ = relatorio.calcular_tabelas(snapshot, normal)
+    return metricas, tabelas
+
+
+@GRAFO.no('metricas', 'tabelas', impressao=impressao_digital)
+def _metricas(tabelas):
+    return tabelas[0]
+
+
+@GRAFO.no('mascara', 'snapshot', 'normal')
+def _mascara(snapshot, normal):
+    return analise.filtrar(snapshot, **relatorio.argumentos_analise(normal))
+
+
+@GRAFO.no('mapa', 'snapshot', 'mascara', 'agrupar_mapa', 'disco')
+def _mapa(snapshot, mascara, agrupar_mapa, disco):
+    if disco is not None and agrupar_mapa is None:
+        return disco.mapa
+    return analise.dados_do_mapa(snapshot, mascara, agrupar=agrupar_mapa)
+
+
+@GRAFO.no('grafico.mapa', 'mapa')
+def _grafico_mapa(mapa):
+    from nucleo import graficos
+
+    return graficos.mapa(*mapa)
+
+
+@GRAFO.no('tabela.distribuicao_mapa', 'snapshot', 'normal', impressao=impressao_digital)
+def _distribuicao_mapa(snapshot, normal):
+    # Localização dos anúncios, resumida por bairro para o prompt do mapa
+    resumo = analise.resumir(snapshot, **relatorio.argumentos_analise(normal))
+    return resumo.por_bairro()[['neighbourhood', 'listings', 'number_of_reviews']].sort_values('listings', ascending=False)
+
+
+def _argumentos_serie(normal):
+    # A série mensal só tem bairro e tipo de quarto como dimensões; as datas recortam os meses
+    argumentos = relatorio.argumentos_analise(normal)
+    return {campo: argumentos.get(campo) for campo in ('bairro', 'tipo_quarto')}, argumentos.get('datas')
+
+
+@GRAFO.no('tabela.tendencia', 'snapshot', 'normal', 'janela_tendencia', impressao=impressao_digital)
+def _tendencia(snapshot, normal, janela):
+    filtros, datas = _argumentos_serie(normal)
+    return analise.tendencia(snapshot, datas=datas, janela=janela, **filtros)
+
+
+@GRAFO.no('grafico.tendencia', 'tabela.tendencia')
+def _grafico_tendencia(tabela):
+    from nucleo import graficos
+
+    return graficos.tendencia(tabela)
+
+
+@GRAFO.no('tabela.decaimento', 'snapshot', 'normal', impressao=impressao_digital)
+def _decaimento(snapshot, normal):
+    filtros, _ = _argumentos_serie(normal)
+    return analise.decaimento(snapshot, **filtros)
+
+
+@GRAFO.no('grafico.decaimento', 'tabela.decaimento')
+def _grafico_decaimento(tabela):
+    from nucleo import graficos
+
+    return graficos.decaimento(tabela)
+
+
+def _registrar_analise(nome):
+    def tabela(tabelas):
+        return tabelas[1][nome]
+
+    def grafico(disco, tabela):
+        from nucleo import graficos
+
+        return disco.graficos[nome] if disco is not None else getattr(graficos, nome)(tabela)
+
+    GRAFO.adicionar(f'tabela.{nome}', tabela, 'tabelas', impressao=impressao_digital)
+    GRAFO.adicionar(f'grafico.{nome}', grafico, 'disco', f'tabela.{nome}')
+
+
+def _registrar_painel_ia(nome, titulo, tabela):
+    def prompt(tabela, metricas, normal):
+        return montar_prompt(titulo, tabela, metricas, normal)
+
+    def analise_ia(servico, prompt, tabela, normal):
+        # Future da resposta: guardado no grafo, uma resposta já recebida não é pedida de novo
+        return servico.analisar(prompt.texto, tabela, filtros=normal)
+
+    GRAFO.adicionar(f'prompt.{nome}', prompt, f'tabela.{tabela}', 'metricas', 'normal',
+                    impressao=lambda prompt: impressao_digital(prompt.texto))
+    GRAFO.adicionar(f'ia.{nome}', analise_ia, 'servico_ia', f'prompt.{nome}', f'tabela.{tabela}', 'normal')
+
+
+for _nome in relatorio.ANALISES:
+    _registrar_analise(_nome)
+for _nome, (_titulo, _tabela) in PAINEIS_IA.items():
+    _registrar_painel_ia(_nome, _titulo, _tabela)
+
+
+def avaliar(memoria, snapshot, filtros, agrupar_mapa=None, servico_ia=None, janela_tendencia=1):
+    """Avaliação do grafo para um rerun; ``memoria`` guarda os valores entre reruns da sessão."""
+    return GRAFO.avaliar(memoria, snapshot=snapshot, filtros=filtros, agrupar_mapa=agrupar_mapa,
+                         servico_ia=servico_ia, janela_tendencia=janela_tendencia)
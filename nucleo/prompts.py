@@ -0,0 +1,97 @@
+"""Montagem compacta dos prompts das análises por IA.
+
+Em vez de interpolar o DataFrame inteiro no texto, cada prompt leva o contexto
+e o esquema das colunas, os filtros aplicados, algumas estatísticas da seleção
+e a tabela agregada do painel em CSV. Se o prompt passar do orçamento de
+tokens, as últimas linhas da tabela são cortadas.
+"""
+import logging
+from typing import NamedTuple
+
+from nucleo.instrumentacao import cronometrado
+
+log = logging.getLogger(__name__)
+
+CONTEXTO = 'Os dados são anúncios do Airbnb no Rio de Janeiro (Inside Airbnb).'
+
+ESQUEMA = (
+    'Colunas da base: id - número de id gerado para identificar o imóvel; name - nome da propriedade anunciada; '
+    'host_id - número de id do anfitrião da propriedade; host_name - nome do anfitrião; '
+    'neighbourhood - nome do bairro; latitude/longitude - coordenadas da propriedade; '
+    'room_type - tipo de quarto oferecido; price - preço para alugar o imóvel (R$); '
+    'minimum_nights - quantidade mínima de noites para reservar; number_of_reviews - número de reviews da propriedade; '
+    'last_review - data do último review; reviews_per_month - quantidade de reviews por mês; '
+    'calculated_host_listings_count - quantidade de imóveis do mesmo anfitrião; '
+    'availability_365 - número de dias de disponibilidade dentro de 365 dias.'
+)
+
+INSTRUCAO = 'Faça uma análise de no máximo 5 linhas sobre os resultados do painel "{titulo}".'
+
+LIMITE_TOKENS = 1500
+
+
+class Prompt(NamedTuple):
+    texto: str
+    tokens: int
+    bytes: int
+    linhas_enviadas: int
+    linhas_totais: int
+
+
+def estimar_tokens(texto):
+    """Estimativa de tokens (~4 caracteres por token), suficiente para orçamento."""
+    return (len(texto) + 3) // 4
+
+
+def descrever_filtros(filtros):
+    if not filtros:
+        return 'nenhum'
+    partes = []
+    for nome, valor in filtros.items():
+        if isinstance(valor, (tuple, list)):
+            valor = ' a '.join(str(v) for v in valor)
+        partes.append(f'{nome}={valor}')
+    return '; '.join(partes)
+
+
+def descrever_estatisticas(estatisticas):
+    partes = []
+    for nome, valor in (estatisticas or {}).items():
+        partes.append(f'{nome}={valor:.2f}' if isinstance(valor, float) else f'{nome}={valor}')
+    return '; '.join(partes) or 'nenhuma'
+
+
+@cronometrado('prompt')
+def montar_prompt(titulo, tabela, estatisticas=None, filtros=None, limite_tokens=LIMITE_TOKENS):
+    """Prompt do painel ``titulo`` com a ``tabela`` agregada, dentro de ``limite_tokens``."""
+    cabecalho = '\n'.join([
+        CONTEXTO,
+        ESQUEMA,
+        f'Filtros aplicados: {descrever_filtros(filtros)}.',
+        f'Estatísticas da seleção: {descrever_estatisticas(estatisticas)}.',
+        f'Tabela do painel "{titulo}" (CSV):',
+    ])
+    instrucao = INSTRUCAO.format(titulo=titulo)
+
+    linhas = tabela.to_csv(index=False, float_format='%.2f').splitlines()
+    cabecalho_csv, corpo = linhas[0], linhas[1:]
+
+    # Acrescenta linhas da tabela enquanto couberem no orçamento
+    disponivel = limite_tokens - estimar_tokens(cabecalho) - estimar_tokens(instrucao) - estimar_tokens(cabecalho_csv) - 16
+    enviadas = 0
+    for linha in corpo:
+        custo = estimar_tokens(linha) + 1
+        if custo > disponivel:
+            break
+        disponivel -= custo
+        enviadas += 1
+
+    partes = [cabecalho, cabecalho_csv, *corpo[:enviadas]]
+    if enviadas < len(corpo):
+        partes.append(f'(mostrando {enviadas} de {len(corpo)} linhas)')
+    partes.append(instrucao)
+    texto = '\n'.join(partes)
+
+    prompt = Prompt(texto, estimar_tokens(texto), len(texto.encode('utf-8')), enviadas, len(corpo))
+    log.debug('prompt %r: %d tokens, %d bytes, %d/%d linhas', titulo, prompt.tokens, prompt.bytes, enviadas, len(corpo))
+    return prompt
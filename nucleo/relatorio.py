@@ -0,0 +1,303 @@
+"""Relatório estático: as análises do dashboard pré-calculadas em disco.
+
+O comando ``render`` calcula, para um snapshot e um conjunto de combinações
+de filtros, as tabelas agregadas, as specs Vega-Lite dos gráficos, os big
+numbers e os dados e ladrilhos (tiles) do mapa::
+
+    python -m nucleo.relatorio render --top-bairros 5 --por-tipo
+    python -m nucleo.relatorio render --combinacoes filtros.json --saida site/
+
+Estrutura gravada (``<raiz>/<versao do snapshot>/``)::
+
+    manifesto.json                  fonte, versão e combinações renderizadas
+    <chave>/metricas.json           big numbers
+    <chave>/<analise>.csv           tabela agregada de cada análise
+    <chave>/<analise>.vl.json       spec Vega-Lite pronta para vega-embed
+    <chave>/mapa.csv                dados do mapa na exibição automática
+    <chave>/mapa/<z>/<x>/<y>.json   células agregadas por ladrilho
+
+Os dashboards usam ``pre_calculado`` para servir a combinação do rerun a
+partir do disco quando ela foi renderizada para a versão atual do snapshot,
+e caem para o cálculo ao vivo (``montar``) caso contrário.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from nucleo import analise
+from nucleo.cache import CacheTTL
+from nucleo.carregamento import DIR_CACHE
+from nucleo.filtros import TODOS
+from nucleo.instrumentacao import cronometrado
+
+DIR_RELATORIOS = Path(os.environ.get('AIRBNB_RELATORIOS', DIR_CACHE.parent / 'relatorios'))
+
+# Análises na ordem dos painéis; o nome é também o do construtor em nucleo.graficos
+ANALISES = ['bairros_mais_caros', 'avaliacoes_por_bairro', 'avaliacoes_por_tipo', 'top_anfitrioes', 'avaliacoes_por_mes']
+ZOOMS_PADRAO = [10, 11, 12, 13]
+CHAVE_PADRAO = 'padrao'
+
+# Muda quando tabelas ou specs mudam de formato; relatórios de outro formato são ignorados
+FORMATO = 1
+
+# Relatórios lidos do disco, por (versão, chave)
+_lidos = CacheTTL(max_itens=32, ttl=10 * 60, nome='relatorios')
+
+
+class Relatorio(NamedTuple):
+    """Conteúdo dos painéis para uma combinação de filtros.
+
+    ``graficos`` guarda objetos Altair quando montado ao vivo e specs
+    Vega-Lite (dicts) quando lido do disco; ``interface.grafico`` desenha os dois.
+    """
+    metricas: dict
+    tabelas: dict
+    graficos: dict
+    mapa: tuple
+    pre_calculado: bool = False
+
+
+def _data(valor):
+    return pd.Timestamp(valor).date().isoformat()
+
+
+def visao_padrao(snapshot):
+    """Filtros da barra lateral ao abrir a página: a faixa de preço inteira e nada mais."""
+    return {'preco': analise.limites_preco(snapshot)}
+
+
+def normalizar_filtros(snapshot, filtros=None):
+    """Filtros canônicos, com datas em ISO e sem o que não muda a seleção.
+
+    ``Todos`` some, e um intervalo de datas que cobre o snapshot inteiro
+    incluindo anúncios sem avaliação equivale a não filtrar datas. A faixa de
+    preço é mantida (mesmo inteira ela exclui anúncios sem preço), só limitada
+    aos extremos do snapshot. ``robusto`` só aparece quando ligado.
+    """
+    filtros = dict(filtros or {})
+    df = snapshot.df
+    normal = {}
+    for campo in ('bairro', 'tipo_quarto'):
+        if filtros.get(campo) not in (None, TODOS):
+            normal[campo] = str(filtros[campo])
+
+    preco = filtros.get('preco')
+    if preco is not None:
+        normal['preco'] = [max(float(preco[0]), float(df['price'].min())), min(float(preco[1]), float(df['price'].max()))]
+
+    datas = filtros.get('datas')
+    if datas is not None:
+        inicio, fim = _data(datas[0]), _data(datas[1])
+        cobre_tudo = inicio <= _data(df['last_review'].min()) and fim >= _data(df['last_review'].max())
+        incluir_sem_data = bool(filtros.get('incluir_sem_data', False))
+        if not (cobre_tudo and incluir_sem_data):
+            normal['datas'] = [inicio, fim]
+            normal['incluir_sem_data'] = incluir_sem_data
+
+    if filtros.get('robusto'):
+        normal['robusto'] = True
+    return normal
+
+
+def chave_filtros(snapshot, filtros=None):
+    """Nome do diretório da combinação: ``padrao`` ou um hash curto dos filtros canônicos."""
+    normal = normalizar_filtros(snapshot, filtros)
+    if normal == normalizar_filtros(snapshot, visao_padrao(snapshot)):
+        return CHAVE_PADRAO
+    texto = json.dumps(normal, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:12]
+
+
+def argumentos_analise(normal):
+    """Filtros canônicos (``normalizar_filtros``) -> argumentos de ``analise.filtrar``/``agregar``."""
+    argumentos = {k: v for k, v in normal.items() if k != 'datas'}
+    if 'preco' in normal:
+        argumentos['preco'] = tuple(normal['preco'])
+    if 'datas' in normal:
+        argumentos['datas'] = tuple(pd.Timestamp(d) for d in normal['datas'])
+    return argumentos
+
+
+def calcular_tabelas(snapshot, filtros=None):
+    """``(metricas, tabelas, mascara)`` da seleção, calculados ao vivo: o relatório sem gráficos e mapa."""
+    argumentos = argumentos_analise(normalizar_filtros(snapshot, filtros))
+    paineis = analise.agregar(snapshot, **argumentos)
+    tabelas = {
+        'bairros_mais_caros': paineis.media_preco_bairro,
+        'avaliacoes_por_bairro': paineis.avaliacoes_por_bairro,
+        'avaliacoes_por_tipo': paineis.avaliacoes_por_tipo,
+        'top_anfitrioes': paineis.top_anfitrioes,
+        'avaliacoes_por_mes': analise.avaliacoes_por_mes(snapshot, paineis.mascara, argumentos.get('datas')),
+    }
+    return analise.metricas(paineis.resumo), tabelas, paineis.mascara
+
+
+@cronometrado('relatorio.montar')
+def montar(snapshot, filtros=None, agrupar_mapa=None):
+    """Relatório calculado ao vivo a partir do cubo e do motor de filtros do snapshot."""
+    from nucleo import graficos
+
+    metricas, tabelas, mascara = calcular_tabelas(snapshot, filtros)
+    return Relatorio(
+        metricas=metricas,
+        tabelas=tabelas,
+        graficos={nome: getattr(graficos, nome)(tabela) for nome, tabela in tabelas.items()},
+        mapa=analise.dados_do_mapa(snapshot, mascara, agrupar=agrupar_mapa),
+    )
+
+
+def _ladrilho(lon, lat, zoom):
+    # Coordenadas x/y do ladrilho (esquema slippy map / XYZ) de cada ponto
+    n = 2 ** zoom
+    x = np.floor((lon + 180.0) / 360.0 * n).astype(np.int64)
+    lat_rad = np.radians(lat)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2.0 * n).astype(np.int64)
+    return x, y
+
+
+def _gravar_json(caminho, dados):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.write_text(json.dumps(dados, ensure_ascii=False, default=str), encoding='utf-8')
+
+
+def gravar_ladrilhos(snapshot, mascara, destino, zooms=ZOOMS_PADRAO):
+    """Células agregadas de cada zoom, separadas por ladrilho XYZ; retorna ``{zoom: n_ladrilhos}``."""
+    df = snapshot.df
+    linhas = np.flatnonzero(mascara & (df['number_of_reviews'].to_numpy() > 0))
+    quantidades = {}
+    for zoom in zooms:
+        celulas = snapshot.indice_espacial.agregar(zoom, linhas)
+        x, y = _ladrilho(celulas['longitude'].to_numpy(), celulas['latitude'].to_numpy(), zoom)
+        celulas = celulas.drop(columns='lado').assign(x=x, y=y)
+        for (tx, ty), grupo in celulas.groupby(['x', 'y']):
+            registros = grupo.drop(columns=['x', 'y']).to_dict(orient='records')
+            _gravar_json(destino / str(zoom) / str(tx) / f'{ty}.json', registros)
+        quantidades[zoom] = int(celulas[['x', 'y']].drop_duplicates().shape[0])
+    return quantidades
+
+
+@cronometrado('relatorio.render')
+def renderizar(snapshot, combinacoes=None, raiz=DIR_RELATORIOS, zooms=ZOOMS_PADRAO):
+    """Grava o relatório da visão padrão e de cada combinação de ``combinacoes``.
+
+    Cada combinação é aplicada sobre a visão padrão, como quem muda só aqueles
+    controles da barra lateral. Retorna o manifesto, também gravado em
+    ``<raiz>/<versao>/manifesto.json``.
+    """
+    destino_versao = Path(raiz) / snapshot.versao
+    itens = {}
+    padrao = visao_padrao(snapshot)
+    for filtros in [{}] + list(combinacoes or []):
+        normal = normalizar_filtros(snapshot, {**padrao, **filtros})
+        chave = chave_filtros(snapshot, normal)
+        if chave in itens:
+            continue
+        destino = destino_versao / chave
+        relatorio = montar(snapshot, normal)
+
+        _gravar_json(destino / 'metricas.json', relatorio.metricas)
+        for nome in ANALISES:
+            relatorio.tabelas[nome].to_csv(destino / f'{nome}.csv', index=False)
+            _gravar_json(destino / f'{nome}.vl.json', relatorio.graficos[nome].to_dict())
+        tipo, dados = relatorio.mapa
+        dados.to_csv(destino / 'mapa.csv', index=False)
+
+        mascara = analise.filtrar(snapshot, **argumentos_analise(normal))
+        ladrilhos = gravar_ladrilhos(snapshot, mascara, destino / 'mapa', zooms)
+        itens[chave] = {'filtros': normal, 'mapa': tipo, 'ladrilhos': ladrilhos}
+
+    manifesto = {
+        'fonte': snapshot.fonte,
+        'versao': snapshot.versao,
+        'linhas': len(snapshot),
+        'formato': FORMATO,
+        'gerado_em': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'analises': ANALISES,
+        'combinacoes': itens,
+    }
+    _gravar_json(destino_versao / 'manifesto.json', manifesto)
+    return manifesto
+
+
+def _ler(destino, tipo_mapa):
+    metricas = json.loads((destino / 'metricas.json').read_text(encoding='utf-8'))
+    tabelas = {nome: pd.read_csv(destino / f'{nome}.csv') for nome in ANALISES}
+    specs = {nome: json.loads((destino / f'{nome}.vl.json').read_text(encoding='utf-8')) for nome in ANALISES}
+    return Relatorio(metricas, tabelas, specs, (tipo_mapa, pd.read_csv(destino / 'mapa.csv')), pre_calculado=True)
+
+
+@cronometrado('relatorio.pre_calculado')
+def pre_calculado(snapshot, filtros=None, agrupar_mapa=None, raiz=DIR_RELATORIOS):
+    """Relatório gravado por ``renderizar`` para estes filtros e esta versão do snapshot, ou ``None``.
+
+    O mapa gravado é o da exibição automática; com ``agrupar_mapa`` definido
+    só o mapa é recalculado.
+    """
+    destino_versao = Path(raiz) / snapshot.versao
+    manifesto = destino_versao / 'manifesto.json'
+    if not manifesto.exists():
+        return None
+    chave = chave_filtros(snapshot, filtros)
+
+    def ler():
+        dados = json.loads(manifesto.read_text(encoding='utf-8'))
+        itens = dados['combinacoes']
+        if dados.get('formato') != FORMATO or chave not in itens:
+            return None
+        return _ler(destino_versao / chave, itens[chave]['mapa'])
+
+    relatorio = _lidos.obter_ou_criar((str(destino_versao), chave, manifesto.stat().st_mtime_ns), ler)
+    if relatorio is None or agrupar_mapa is None:
+        return relatorio
+    mascara = analise.filtrar(snapshot, **argumentos_analise(normalizar_filtros(snapshot, filtros)))
+    return relatorio._replace(mapa=analise.dados_do_mapa(snapshot, mascara, agrupar=agrupar_mapa))
+
+
+def obter(snapshot, filtros=None, agrupar_mapa=None, raiz=DIR_RELATORIOS):
+    """Relatório pré-calculado quando existe, senão calculado ao vivo."""
+    return pre_calculado(snapshot, filtros, agrupar_mapa, raiz) or montar(snapshot, filtros, agrupar_mapa)
+
+
+def combinacoes_comuns(snapshot, top_bairros=0, por_tipo=False):
+    """Combinações de um filtro só: os ``top_bairros`` com mais listings e cada tipo de quarto."""
+    combinacoes = []
+    if top_bairros:
+        bairros = snapshot.df['neighbourhood'].value_counts().index[:top_bairros]
+        combinacoes += [{'bairro': bairro} for bairro in bairros]
+    if por_tipo:
+        combinacoes += [{'tipo_quarto': tipo} for tipo in snapshot.tipos_quarto]
+    return combinacoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Relatório estático das análises do dashboard.')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    render = subcomandos.add_parser('render', help='pré-calcula as análises de um snapshot')
+    render.add_argument('--fonte', help='URL ou arquivo de listings (padrão: AIRBNB_LISTINGS ou o snapshot do RJ)')
+    render.add_argument('--saida', type=Path, default=DIR_RELATORIOS, help='diretório raiz dos relatórios')
+    render.add_argument('--combinacoes', type=Path,
+                        help='JSON com uma lista de filtros, ex.: [{"bairro": "Copacabana", "preco": [100, 500]}]')
+    render.add_argument('--top-bairros', type=int, default=0, help='uma combinação para cada um dos N maiores bairros')
+    render.add_argument('--por-tipo', action='store_true', help='uma combinação para cada tipo de quarto')
+    render.add_argument('--zooms', type=int, nargs='+', default=ZOOMS_PADRAO, help='zooms dos ladrilhos do mapa')
+    args = parser.parse_args(argv)
+
+    snapshot = analise.carregar(args.fonte)
+    combinacoes = combinacoes_comuns(snapshot, args.top_bairros, args.por_tipo)
+    if args.combinacoes:
+        combinacoes += json.loads(args.combinacoes.read_text(encoding='utf-8'))
+    manifesto = renderizar(snapshot, combinacoes, args.saida, args.zooms)
+    print(f"{len(manifesto['combinacoes'])} combinações gravadas em {Path(args.saida) / snapshot.versao}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Estatísticas robustas de preço do snapshot e marcação de preços atípicos.
+
+Uma vez por snapshot, os preços são ordenados dentro de cada grupo (bairro,
+tipo de quarto e a combinação dos dois) e daí saem, sem laço em Python,
+mediana, quartis, IQR, MAD e médias aparada e winsorizada de cada grupo.
+
+Um preço é atípico quando fica fora das cercas de Tukey
+(``Q1 - 1,5 IQR``, ``Q3 + 1,5 IQR``) da célula bairro x tipo de quarto dele;
+células com poucos anúncios usam as cercas do tipo de quarto. Com
+``robusto=True`` nos filtros, os painéis usam só os preços típicos: a máscara
+exclui os atípicos e os agregados vêm de um segundo cubo, montado uma vez
+sobre essas linhas, então alternar entre bruto e robusto não recalcula nada
+por rerun.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.cache import por_snapshot
+from nucleo.cubo import Cubo
+
+FATOR_IQR = 1.5
+PROPORCAO_APARADA = 0.1
+
+# Abaixo disso a célula bairro x tipo de quarto usa as cercas do tipo de quarto
+MINIMO_CELULA = 10
+
+COLUNAS_CUBO = ['neighbourhood', 'room_type', 'price', 'last_review', 'number_of_reviews', 'minimum_nights']
+
+
+def _codigos(serie):
+    serie = serie.astype('category')
+    return serie.cat.codes.to_numpy().astype(np.int64), serie.cat.categories
+
+
+class Ordenados:
+    """Valores ordenados dentro de cada grupo, com o início e o tamanho de cada grupo."""
+
+    def __init__(self, valores, grupos, n_grupos):
+        ordem = np.lexsort((valores, grupos))
+        self.valores = valores[ordem]
+        self.tamanho = np.bincount(grupos, minlength=n_grupos)
+        self.inicio = np.r_[0, np.cumsum(self.tamanho)[:-1]]
+        self._acumulado = np.r_[0.0, np.cumsum(self.valores)]
+
+    def quantil(self, q):
+        """Quantil ``q`` de cada grupo, com interpolação linear (``nan`` nos grupos vazios)."""
+        vazios = self.tamanho == 0
+        if vazios.all():
+            return np.full(len(self.tamanho), np.nan)
+        posicao = self.inicio + q * np.maximum(self.tamanho - 1, 0)
+        abaixo = np.where(vazios, 0, np.floor(posicao)).astype(np.int64)
+        acima = np.where(vazios, 0, np.ceil(posicao)).astype(np.int64)
+        fracao = posicao - np.floor(posicao)
+        return np.where(vazios, np.nan, self.valores[abaixo] * (1 - fracao) + self.valores[acima] * fracao)
+
+    def _soma(self, inicio, fim):
+        return self._acumulado[fim] - self._acumulado[inicio]
+
+    def media(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._soma(self.inicio, self.inicio + self.tamanho) / self.tamanho
+
+    def media_aparada(self, proporcao=PROPORCAO_APARADA):
+        """Média sem os ``proporcao`` menores e maiores valores de cada grupo."""
+        corte = np.floor(self.tamanho * proporcao).astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._soma(self.inicio + corte, self.inicio + self.tamanho - corte) / (self.tamanho - 2 * corte)
+
+    def media_winsorizada(self, proporcao=PROPORCAO_APARADA):
+        """Média com os extremos de cada grupo trocados pelo último valor mantido de cada lado."""
+        corte = np.floor(self.tamanho * proporcao).astype(np.int64)
+        if not len(self.valores):
+            return np.full(len(self.tamanho), np.nan)
+        miolo = self._soma(self.inicio + corte, self.inicio + self.tamanho - corte)
+        ultimo = len(self.valores) - 1
+        menor = self.valores[np.minimum(self.inicio + corte, ultimo)]
+        maior = self.valores[np.clip(self.inicio + self.tamanho - corte - 1, 0, ultimo)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (miolo + corte * (menor + maior)) / self.tamanho
+
+
+def _estatisticas(precos, grupos, n_grupos, proporcao):
+    ordenados = Ordenados(precos, grupos, n_grupos)
+    q1, mediana, q3 = (ordenados.quantil(q) for q in (0.25, 0.5, 0.75))
+    desvios = Ordenados(np.abs(precos - mediana[grupos]), grupos, n_grupos)
+    return {
+        'listings': ordenados.tamanho,
+        'mediana': mediana,
+        'q1': q1,
+        'q3': q3,
+        'iqr': q3 - q1,
+        'mad': desvios.quantil(0.5),
+        'media': ordenados.media(),
+        'media_aparada': ordenados.media_aparada(proporcao),
+        'media_winsorizada': ordenados.media_winsorizada(proporcao),
+    }
+
+
+class EstatisticasRobustas:
+    """Mediana, quartis, MAD e médias robustas de preço por bairro e por tipo de
+    quarto, e a marcação de preço atípico de cada linha."""
+
+    def __init__(self, df, fator=FATOR_IQR, proporcao=PROPORCAO_APARADA, minimo_celula=MINIMO_CELULA):
+        self.fator = fator
+        bairro, bairros = _codigos(df['neighbourhood'])
+        tipo, tipos_quarto = _codigos(df['room_type'])
+        precos = df['price'].to_numpy(dtype=float)
+        linhas = np.flatnonzero(~np.isnan(precos) & (bairro >= 0) & (tipo >= 0))
+        precos, bairro, tipo = precos[linhas], bairro[linhas], tipo[linhas]
+
+        # Cercas de Tukey por célula bairro x tipo de quarto, ou do tipo de quarto nas células pequenas
+        celula = bairro * len(tipos_quarto) + tipo
+        por_celula = Ordenados(precos, celula, len(bairros) * len(tipos_quarto))
+        por_tipo = _estatisticas(precos, tipo, len(tipos_quarto), proporcao)
+        q1, q3 = por_celula.quantil(0.25)[celula], por_celula.quantil(0.75)[celula]
+        pequena = por_celula.tamanho[celula] < minimo_celula
+        q1[pequena], q3[pequena] = por_tipo['q1'][tipo[pequena]], por_tipo['q3'][tipo[pequena]]
+        iqr = q3 - q1
+        atipico = (precos < q1 - fator * iqr) | (precos > q3 + fator * iqr)
+
+        self.atipico = np.zeros(len(df), dtype=bool)
+        self.atipico[linhas[atipico]] = True
+        self.atipico.flags.writeable = False
+        # Linhas mantidas no modo robusto: preços típicos (sem preço seguem como no filtro bruto)
+        self.tipicos = ~self.atipico
+        self.tipicos.flags.writeable = False
+
+        tipicos = precos[~atipico]
+        self.limites = (float(tipicos.min()), float(tipicos.max())) if len(tipicos) else (0.0, 0.0)
+
+        por_bairro = _estatisticas(precos, bairro, len(bairros), proporcao)
+        por_bairro['atipicos'] = np.bincount(bairro[atipico], minlength=len(bairros))
+        por_tipo['atipicos'] = np.bincount(tipo[atipico], minlength=len(tipos_quarto))
+        self.por_bairro = pd.DataFrame({'neighbourhood': np.asarray(bairros), **por_bairro})
+        self.por_bairro = self.por_bairro[self.por_bairro['listings'] > 0].reset_index(drop=True)
+        self.por_tipo_quarto = pd.DataFrame({'room_type': np.asarray(tipos_quarto), **por_tipo})
+        self.por_tipo_quarto = self.por_tipo_quarto[self.por_tipo_quarto['listings'] > 0].reset_index(drop=True)
+
+    @property
+    def n_atipicos(self):
+        return int(self.atipico.sum())
+
+
+def estatisticas_robustas(df):
+    """Estatísticas robustas do snapshot ``df``, calculadas na primeira chamada."""
+    return por_snapshot(df, 'robusto', lambda: EstatisticasRobustas(df))
+
+
+def cubo_robusto(df):
+    """Cubo só com as linhas de preço típico do snapshot ``df`` (modo robusto dos painéis)."""
+    # Fora da fábrica: por_snapshot segura o lock do df enquanto ela roda
+    tipicos = estatisticas_robustas(df).tipicos
+    return por_snapshot(df, 'cubo_robusto', lambda: Cubo(df.loc[tipicos, COLUNAS_CUBO].reset_index(drop=True)))
@@ -0,0 +1,247 @@
+"""Séries mensais de atividade dos listings: rollup mês x bairro x tipo de quarto.
+
+Um snapshot só traz, por listing, a data da última avaliação, o total de
+avaliações e a média de avaliações por mês. Daí sai o intervalo em que o
+listing esteve ativo: da primeira avaliação estimada
+(``last_review - number_of_reviews / reviews_per_month``) até o mês da última.
+Em cada mês desse intervalo o listing conta como ativo, com
+``reviews_per_month`` avaliações e as noites ocupadas estimadas pelo modelo do
+Inside Airbnb (metade dos hóspedes avalia, estadia média de 3 noites ou o
+mínimo do anúncio, no máximo 70% do mês).
+
+O rollup é montado uma vez por snapshot, sem laço por listing: cada listing
+soma +v no primeiro mês e -v no mês seguinte ao último, e a soma acumulada
+no eixo dos meses dá os valores de cada mês. ``SerieTemporal`` guarda o cubo
+denso e a soma acumulada dele, então a soma de qualquer intervalo de meses (e
+uma média móvel inteira) sai de diferenças da acumulada.
+
+Na ingestão (``nucleo.ingestao``) o rollup de cada partição é gravado ao lado
+dos listings; ``mesclar_rollups`` junta os snapshots de uma cidade, cada mês
+respondido pelo primeiro snapshot tirado depois dele, que ainda vê os
+listings daquele mês que saíram do ar depois.
+"""
+import numpy as np
+import pandas as pd
+
+from nucleo.cache import por_snapshot
+from nucleo.filtros import TODOS
+
+# Modelo de ocupação do Inside Airbnb
+TAXA_AVALIACAO = 0.5
+ESTADIA_MEDIA = 3
+TETO_OCUPACAO = 0.7
+DIAS_MES = 30
+
+# Intervalo de atividade mais longo considerado para um listing
+MAX_MESES_ATIVO = 120
+
+MEDIDAS = ['ativos', 'avaliacoes', 'noites', 'ultimas']
+
+
+def _codigos(serie):
+    serie = serie.astype('category')
+    return serie.cat.codes.to_numpy().astype(np.int64), serie.cat.categories
+
+
+def _mes(valores):
+    # Número do mês desde 1970-01
+    return pd.to_datetime(valores).to_numpy().astype('datetime64[M]').astype(np.int64)
+
+
+def _mes_como_data(numeros):
+    return pd.to_datetime(np.asarray(numeros, dtype=np.int64).astype('datetime64[M]'))
+
+
+def rollup_listings(df):
+    """Rollup mês x bairro x tipo de quarto dos listings (formato longo, só células não vazias)."""
+    bairro, bairros = _codigos(df['neighbourhood'])
+    tipo, tipos_quarto = _codigos(df['room_type'])
+    com_data = ~pd.isna(df['last_review']).to_numpy()
+    linhas = np.flatnonzero(com_data & (bairro >= 0) & (tipo >= 0))
+    colunas = ['mes', 'neighbourhood', 'room_type', *MEDIDAS]
+    if not len(linhas):
+        return pd.DataFrame(columns=colunas)
+
+    ultimo = _mes(df['last_review'].to_numpy()[linhas])
+    por_mes = np.nan_to_num(df['reviews_per_month'].to_numpy(dtype=float)[linhas])
+    total = np.nan_to_num(df['number_of_reviews'].to_numpy(dtype=float)[linhas])
+    noites_minimas = np.nan_to_num(df['minimum_nights'].to_numpy(dtype=float)[linhas])
+    bairro, tipo = bairro[linhas], tipo[linhas]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        duracao = np.where(por_mes > 0, np.ceil(total / por_mes), 1)
+    duracao = np.clip(np.nan_to_num(duracao, nan=1), 1, MAX_MESES_ATIVO).astype(np.int64)
+    primeiro = ultimo - duracao + 1
+    noites = np.minimum(por_mes / TAXA_AVALIACAO * np.maximum(ESTADIA_MEDIA, noites_minimas), TETO_OCUPACAO * DIAS_MES)
+
+    # Diferenças no eixo dos meses: +v no primeiro mês ativo, -v no mês seguinte ao último
+    mes0 = int(primeiro.min())
+    n_meses = int(ultimo.max()) - mes0 + 1
+    forma = (n_meses + 1, len(bairros), len(tipos_quarto))
+    tamanho = int(np.prod(forma))
+
+    def posicao(meses):
+        return ((meses - mes0) * forma[1] + bairro) * forma[2] + tipo
+
+    inicio, fim = posicao(primeiro), posicao(ultimo + 1)
+    valores = {}
+    for medida, v in (('ativos', np.ones(len(linhas))), ('avaliacoes', por_mes), ('noites', noites)):
+        delta = np.bincount(inicio, weights=v, minlength=tamanho) - np.bincount(fim, weights=v, minlength=tamanho)
+        valores[medida] = np.cumsum(delta.reshape(forma), axis=0)[:-1]
+    valores['ultimas'] = np.bincount(posicao(ultimo), minlength=tamanho).reshape(forma)[:-1].astype(float)
+
+    # Resíduos de ponto flutuante da soma acumulada: células sem listing ativo voltam a zero
+    valores['ativos'] = np.rint(valores['ativos'])
+    for medida in ('avaliacoes', 'noites'):
+        valores[medida][valores['ativos'] == 0] = 0.0
+    m, b, t = np.nonzero(valores['ativos'] + valores['ultimas'])
+    return pd.DataFrame({
+        'mes': _mes_como_data(m + mes0),
+        'neighbourhood': np.asarray(bairros)[b],
+        'room_type': np.asarray(tipos_quarto)[t],
+        **{medida: valores[medida][m, b, t] for medida in MEDIDAS},
+    })[colunas]
+
+
+def mesclar_rollups(rollups):
+    """Rollups de vários snapshots da mesma cidade (``{data: rollup}``) numa série só.
+
+    Cada mês vem do primeiro snapshot tirado depois dele: o snapshot de uma
+    data responde pelos meses posteriores ao do snapshot anterior.
+    """
+    partes = []
+    limite = None
+    for data in sorted(rollups):
+        rollup = rollups[data]
+        fim = pd.Timestamp(data).to_period('M').to_timestamp()
+        manter = rollup['mes'] <= fim
+        if limite is not None:
+            manter &= rollup['mes'] > limite
+        partes.append(rollup[manter])
+        limite = fim
+    if not partes:
+        return pd.DataFrame(columns=['mes', 'neighbourhood', 'room_type', *MEDIDAS])
+    return pd.concat(partes, ignore_index=True)
+
+
+class SerieTemporal:
+    """Cubo denso mês x bairro x tipo de quarto das ``MEDIDAS``, com a soma acumulada nos meses."""
+
+    def __init__(self, rollup):
+        bairro, self.bairros = _codigos(rollup['neighbourhood'])
+        tipo, self.tipos_quarto = _codigos(rollup['room_type'])
+        meses = _mes(rollup['mes'].to_numpy()) if len(rollup) else np.zeros(0, dtype=np.int64)
+        self.mes0 = int(meses.min()) if len(meses) else 0
+        self.n_meses = int(meses.max()) - self.mes0 + 1 if len(meses) else 0
+        self.meses = _mes_como_data(np.arange(self.n_meses) + self.mes0)
+
+        self.valores = np.zeros((self.n_meses, len(self.bairros), len(self.tipos_quarto), len(MEDIDAS)))
+        self.valores[meses - self.mes0, bairro, tipo] = rollup[MEDIDAS].to_numpy(dtype=float)
+        # Linha 0 zerada: a soma dos meses [i, j) é acumulado[j] - acumulado[i]
+        self.acumulado = np.concatenate([np.zeros((1, *self.valores.shape[1:])), np.cumsum(self.valores, axis=0)])
+        # Marginais da acumulada, para as seleções com "Todos" não somarem o cubo inteiro
+        self._por_bairro = self.acumulado.sum(axis=2)
+        self._por_tipo = self.acumulado.sum(axis=1)
+        self._total = self._por_tipo.sum(axis=1)
+
+    def __len__(self):
+        return self.n_meses
+
+    def _indice(self, valor, categorias):
+        if valor in (None, TODOS):
+            return slice(None)
+        posicao = categorias.get_indexer([valor])[0]
+        return [posicao] if posicao >= 0 else []
+
+    def _intervalo(self, inicio, fim):
+        # Posições do primeiro e do último mês (inclusivos); vazio quando primeiro > ultimo
+        primeiro = 0 if inicio is None else max(int(_mes([inicio])[0]) - self.mes0, 0)
+        ultimo = self.n_meses - 1 if fim is None else min(int(_mes([fim])[0]) - self.mes0, self.n_meses - 1)
+        return primeiro, ultimo
+
+    def _acumulado(self, bairro=None, tipo_quarto=None):
+        # Soma acumulada da seleção: (meses + 1) x medidas
+        todos_bairros, todos_tipos = bairro in (None, TODOS), tipo_quarto in (None, TODOS)
+        if todos_bairros and todos_tipos:
+            return self._total
+        if todos_bairros:
+            return self._por_tipo[:, self._indice(tipo_quarto, self.tipos_quarto)].sum(axis=1)
+        if todos_tipos:
+            return self._por_bairro[:, self._indice(bairro, self.bairros)].sum(axis=1)
+        fatia = self.acumulado[:, self._indice(bairro, self.bairros)][:, :, self._indice(tipo_quarto, self.tipos_quarto)]
+        return fatia.sum(axis=(1, 2))
+
+    def mensal(self, bairro=None, tipo_quarto=None, inicio=None, fim=None, janela=1):
+        """Medidas por mês entre ``inicio`` e ``fim`` (inclusivos), em média móvel de ``janela`` meses.
+
+        ``ocupacao`` é a fração das noites dos listings ativos ocupada pela estimativa.
+        """
+        acumulado = self._acumulado(bairro, tipo_quarto)
+        primeiro, ultimo = self._intervalo(inicio, fim)
+        meses = np.arange(primeiro, ultimo + 1)
+        desde = np.maximum(meses + 1 - max(int(janela), 1), 0)
+        medias = (acumulado[meses + 1] - acumulado[desde]) / (meses + 1 - desde)[:, None]
+        tabela = pd.DataFrame(medias, columns=MEDIDAS)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tabela['ocupacao'] = tabela['noites'] / (tabela['ativos'] * DIAS_MES)
+        tabela.insert(0, 'mes', self.meses[meses])
+        return tabela
+
+    def total(self, bairro=None, tipo_quarto=None, inicio=None, fim=None):
+        """Somas das medidas no intervalo de meses, e a ocupação média dele."""
+        acumulado = self._acumulado(bairro, tipo_quarto)
+        primeiro, ultimo = self._intervalo(inicio, fim)
+        somas = dict(zip(MEDIDAS, (acumulado[ultimo + 1] - acumulado[primeiro]).tolist())) if ultimo >= primeiro \
+            else dict.fromkeys(MEDIDAS, 0.0)
+        somas['meses'] = max(ultimo - primeiro + 1, 0)
+        somas['ocupacao'] = somas['noites'] / (somas['ativos'] * DIAS_MES) if somas['ativos'] else float('nan')
+        return somas
+
+    def por_bairro(self, tipo_quarto=None, inicio=None, fim=None):
+        """Listings ativos por mês e ocupação estimada de cada bairro no intervalo."""
+        primeiro, ultimo = self._intervalo(inicio, fim)
+        if tipo_quarto in (None, TODOS):
+            fatia = self._por_bairro
+        else:
+            fatia = self.acumulado[:, :, self._indice(tipo_quarto, self.tipos_quarto)].sum(axis=2)
+        somas = fatia[ultimo + 1] - fatia[primeiro] if ultimo >= primeiro else np.zeros_like(fatia[0])
+        meses = max(ultimo - primeiro + 1, 1)
+        ativos, noites = somas[:, MEDIDAS.index('ativos')], somas[:, MEDIDAS.index('noites')]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tabela = pd.DataFrame({
+                'neighbourhood': np.asarray(self.bairros),
+                'ativos_por_mes': ativos / meses,
+                'ocupacao': noites / (ativos * DIAS_MES),
+            })
+        return tabela[ativos > 0].sort_values('ocupacao', ascending=False).reset_index(drop=True)
+
+    def decaimento(self, bairro=None, tipo_quarto=None, referencia=None):
+        """Listings por meses desde a última avaliação até ``referencia`` (padrão: o último mês da série).
+
+        ``fracao_recente`` é a parte dos listings avaliada há no máximo aquele
+        número de meses: a curva mostra quão rápido os anúncios param de receber avaliações.
+        """
+        _, fim = self._intervalo(None, referencia)
+        acumulado = self._acumulado(bairro, tipo_quarto)
+        ultimas = np.diff(acumulado[:fim + 2, MEDIDAS.index('ultimas')])[::-1]
+        total = ultimas.sum()
+        return pd.DataFrame({
+            'meses_sem_avaliacao': np.arange(len(ultimas)),
+            'listings': ultimas.astype(np.int64),
+            'fracao_recente': np.cumsum(ultimas) / total if total else np.zeros(len(ultimas)),
+        })
+
+    def rollup(self):
+        """O cubo de volta ao formato longo de ``rollup_listings``."""
+        m, b, t = np.nonzero(self.valores.any(axis=3))
+        return pd.DataFrame({
+            'mes': self.meses[m],
+            'neighbourhood': np.asarray(self.bairros)[b],
+            'room_type': np.asarray(self.tipos_quarto)[t],
+            **{medida: self.valores[m, b, t, i] for i, medida in enumerate(MEDIDAS)},
+        })
+
+
+def serie_do_snapshot(df):
+    """Série temporal do snapshot ``df``, montada na primeira chamada."""
+    return por_snapshot(df, 'series', lambda: SerieTemporal(rollup_listings(df)))
@@ -0,0 +1,97 @@
+"""Gerador de listings sintéticos com o mesmo esquema do ``listings.csv`` do Inside Airbnb.
+
+Usado por benchmarks, testes de carga e pela API em modo offline. As colunas
+vêm no formato do CSV cru (preço como texto ``$1,234.00``, datas como texto),
+para que carga e limpeza também sejam exercitadas.
+"""
+import numpy as np
+import pandas as pd
+
+# Bairros do Rio com (latitude, longitude) aproximadas do centro
+BAIRROS = {
+    'Copacabana': (-22.9711, -43.1822), 'Barra da Tijuca': (-23.0004, -43.3659), 'Ipanema': (-22.9838, -43.2096),
+    'Botafogo': (-22.9519, -43.1823), 'Leblon': (-22.9847, -43.2236), 'Recreio dos Bandeirantes': (-23.0178, -43.4628),
+    'Centro': (-22.9035, -43.1786), 'Flamengo': (-22.9324, -43.1756), 'Santa Teresa': (-22.9200, -43.1890),
+    'Jacarepaguá': (-22.9470, -43.3396), 'Tijuca': (-22.9250, -43.2334), 'Laranjeiras': (-22.9370, -43.1880),
+    'Lapa': (-22.9130, -43.1800), 'Leme': (-22.9630, -43.1710), 'Glória': (-22.9200, -43.1760),
+    'Catete': (-22.9260, -43.1770), 'Lagoa': (-22.9700, -43.2070), 'Gávea': (-22.9790, -43.2330),
+    'Jardim Botânico': (-22.9670, -43.2240), 'Humaitá': (-22.9560, -43.1990), 'Urca': (-22.9480, -43.1640),
+    'São Conrado': (-22.9990, -43.2630), 'Vidigal': (-22.9930, -43.2390), 'Joá': (-23.0120, -43.2880),
+    'Itanhangá': (-22.9870, -43.3080), 'Camorim': (-22.9800, -43.4200), 'Vargem Grande': (-22.9900, -43.4900),
+    'Vargem Pequena': (-22.9950, -43.4500), 'Grumari': (-23.0450, -43.5250), 'Maracanã': (-22.9120, -43.2300),
+    'Vila Isabel': (-22.9160, -43.2470), 'Méier': (-22.9020, -43.2780), 'Santo Cristo': (-22.8970, -43.2030),
+    'Gamboa': (-22.8980, -43.1950), 'Saúde': (-22.8970, -43.1860), 'Cosme Velho': (-22.9400, -43.1970),
+}
+TIPOS_QUARTO = ['Entire home/apt', 'Private room', 'Shared room', 'Hotel room']
+PROPORCAO_TIPOS = [0.78, 0.19, 0.02, 0.01]
+NOMES = ['Maria', 'Ana', 'João', 'Pedro', 'Carla', 'Lucas', 'Fernanda', 'Paulo', 'Juliana', 'Rafael',
+         'Beatriz', 'Marcos', 'Camila', 'Bruno', 'Patrícia', 'Rodrigo', 'Aline', 'Gustavo', 'Renata', 'Felipe']
+
+COLUNAS = [
+    'id', 'name', 'host_id', 'host_name', 'neighbourhood_group', 'neighbourhood', 'latitude', 'longitude',
+    'room_type', 'price', 'minimum_nights', 'number_of_reviews', 'last_review', 'reviews_per_month',
+    'calculated_host_listings_count', 'availability_365', 'number_of_reviews_ltm', 'license',
+]
+
+
+def gerar_listings(n, semente=0, data_snapshot='2024-06-27', deslocamento=0):
+    """DataFrame cru com ``n`` listings sintéticos (como lido de um ``listings.csv``).
+
+    ``deslocamento`` é somado aos ids dos anúncios e dos anfitriões, para que
+    blocos gerados separadamente não repitam ids.
+    """
+    rng = np.random.default_rng(semente)
+    nomes_bairros = list(BAIRROS)
+    # Poucos bairros concentram a maior parte dos anúncios, como nos dados reais
+    pesos = 1 / np.arange(1, len(nomes_bairros) + 1) ** 1.1
+    bairro = rng.choice(len(nomes_bairros), size=n, p=pesos / pesos.sum())
+    centros = np.array(list(BAIRROS.values()))
+
+    tipo = rng.choice(len(TIPOS_QUARTO), size=n, p=PROPORCAO_TIPOS)
+    preco = np.round(rng.lognormal(5.5, 0.8, n) * np.where(tipo == 0, 1.0, 0.5))
+    preco[rng.random(n) < 0.002] *= 100  # anúncios com preço absurdo
+    sem_preco = rng.random(n) < 0.06
+    texto_preco = pd.Series(preco).map('${:,.2f}'.format).where(~sem_preco)
+
+    # Anfitriões: muitos com um anúncio, alguns com dezenas
+    host_id = (rng.pareto(1.2, n) * n / 20).astype(np.int64) % max(n // 2, 1) + 1000 + deslocamento
+    contagem_host = pd.Series(host_id).map(pd.Series(host_id).value_counts()).to_numpy()
+
+    avaliacoes = rng.negative_binomial(1, 0.04, n)
+    avaliacoes[rng.random(n) < 0.18] = 0
+    com_avaliacao = avaliacoes > 0
+    dias_desde = rng.exponential(250, n).astype(np.int64)
+    ultima = pd.Timestamp(data_snapshot) - pd.to_timedelta(dias_desde, unit='D')
+    ultima = pd.Series(ultima.strftime('%Y-%m-%d')).where(com_avaliacao)
+    por_mes = np.round(avaliacoes / rng.uniform(3, 60, n), 2)
+
+    ids = np.arange(n, dtype=np.int64) + 10 ** 7 + deslocamento
+    return pd.DataFrame({
+        'id': ids,
+        'name': 'Anúncio ' + pd.Series(ids).astype(str),
+        'host_id': host_id,
+        'host_name': np.asarray(NOMES)[host_id % len(NOMES)],
+        'neighbourhood_group': np.nan,
+        'neighbourhood': np.asarray(nomes_bairros)[bairro],
+        'latitude': np.round(centros[bairro, 0] + rng.normal(0, 0.006, n), 6),
+        'longitude': np.round(centros[bairro, 1] + rng.normal(0, 0.008, n), 6),
+        'room_type': np.asarray(TIPOS_QUARTO)[tipo],
+        'price': texto_preco,
+        'minimum_nights': rng.choice([1, 2, 3, 5, 7, 30], size=n, p=[0.3, 0.3, 0.2, 0.1, 0.05, 0.05]),
+        'number_of_reviews': avaliacoes,
+        'last_review': ultima,
+        'reviews_per_month': np.where(com_avaliacao, por_mes, np.nan),
+        'calculated_host_listings_count': contagem_host,
+        'availability_365': rng.integers(0, 366, n),
+        'number_of_reviews_ltm': np.minimum(avaliacoes, rng.poisson(4, n)),
+        'license': np.nan,
+    }, columns=COLUNAS)
+
+
+def gravar_csv(n, caminho, semente=0, tamanho_bloco=1_000_000):
+    """Grava ``n`` listings sintéticos em CSV, em blocos para não estourar a memória."""
+    for inicio in range(0, n, tamanho_bloco):
+        # Cada bloco tem os próprios anúncios e anfitriões
+        bloco = gerar_listings(min(tamanho_bloco, n - inicio), semente=semente + inicio, deslocamento=inicio)
+        bloco.to_csv(caminho, index=False, mode='w' if inicio == 0 else 'a', header=inicio == 0)
+    return caminho
@@ -0,0 +1,76 @@
+"""Snapshot tipado de listings e as estruturas derivadas dele."""
+from dataclasses import dataclass
+
+import pandas as pd
+
+from nucleo.anfitrioes import dimensao_anfitrioes
+from nucleo.cache import por_snapshot
+from nucleo.cubo import cubo_agregado
+from nucleo.esquema import memoria
+from nucleo.filtros import motor_filtros
+from nucleo.mapa import indice_espacial
+from nucleo.robusto import cubo_robusto, estatisticas_robustas
+from nucleo.series import serie_do_snapshot
+from nucleo.sketches import esbocos_do_snapshot
+
+
+@dataclass(frozen=True, eq=False)
+class Snapshot:
+    """Listings de uma fonte (URL ou arquivo) num instante.
+
+    ``df`` é compartilhado entre sessões e não deve ser modificado. Índices,
+    cubo e índice espacial são criados no primeiro acesso e reaproveitados
+    enquanto o DataFrame existir.
+    """
+
+    df: pd.DataFrame
+    fonte: str
+    versao: str
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def memoria(self):
+        """Bytes ocupados pelo DataFrame do snapshot (texto incluído), medidos uma vez."""
+        return por_snapshot(self.df, 'memoria', lambda: memoria(self.df))
+
+    @property
+    def motor(self):
+        return motor_filtros(self.df)
+
+    @property
+    def cubo(self):
+        return cubo_agregado(self.df)
+
+    @property
+    def robusto(self):
+        return estatisticas_robustas(self.df)
+
+    @property
+    def cubo_robusto(self):
+        return cubo_robusto(self.df)
+
+    @property
+    def series(self):
+        return serie_do_snapshot(self.df)
+
+    @property
+    def indice_espacial(self):
+        return indice_espacial(self.df)
+
+    @property
+    def anfitrioes(self):
+        return dimensao_anfitrioes(self.df)
+
+    @property
+    def esbocos(self):
+        return esbocos_do_snapshot(self.df)
+
+    @property
+    def bairros(self):
+        return sorted(self.df['neighbourhood'].dropna().unique())
+
+    @property
+    def tipos_quarto(self):
+        return sorted(self.df['room_type'].dropna().unique())
@@ -0,0 +1,167 @@
+import json
+import math
+from http import HTTPStatus
+
+import pandas as pd
+import pytest
+
+from nucleo.api import MAX_POR_PAGINA, ErroRequisicao, ServidorAPI, consultar, snapshot_sintetico
+from nucleo.snapshot import Snapshot
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    return snapshot_sintetico(4000, semente=3)
+
+
+def _json(resposta):
+    assert resposta.status == HTTPStatus.OK
+    return json.loads(resposta.corpo)
+
+
+def _selecao(df, filtros):
+    """Linhas selecionadas pelos filtros normalizados que a API devolve, em pandas."""
+    inicio, fim = filtros['preco']
+    linhas = df['price'].between(inicio, fim)
+    if 'bairro' in filtros:
+        linhas &= df['neighbourhood'] == filtros['bairro']
+    if 'tipo_quarto' in filtros:
+        linhas &= df['room_type'] == filtros['tipo_quarto']
+    if 'datas' in filtros:
+        dentro = df['last_review'].between(pd.Timestamp(filtros['datas'][0]), pd.Timestamp(filtros['datas'][1]))
+        linhas &= dentro | (df['last_review'].isna() & filtros['incluir_sem_data'])
+    return df[linhas]
+
+
+def _todas_as_paginas(snapshot, caminho, parametros):
+    dados = _json(consultar(snapshot, caminho, {**parametros, 'por_pagina': str(MAX_POR_PAGINA)}))
+    assert dados['paginas'] == 1
+    return dados
+
+
+def test_metricas_batem_com_o_pandas(snapshot):
+    dados = _json(consultar(snapshot, '/metricas', {'bairro': 'Copacabana', 'preco_min': '100', 'preco_max': '800'}))
+    selecao = _selecao(snapshot.df, dados['filtros'])
+    assert dados['listings'] == len(selecao)
+    assert dados['total_avaliacoes'] == selecao['number_of_reviews'].sum()
+    assert dados['preco_medio'] == pytest.approx(selecao['price'].mean())
+    assert dados['media_noites_minimas'] == pytest.approx(selecao['minimum_nights'].mean())
+
+
+def test_precos_por_bairro_batem_com_o_groupby(snapshot):
+    dados = _todas_as_paginas(snapshot, '/precos/bairros', {'tipo_quarto': 'Private room'})
+    esperado = _selecao(snapshot.df, dados['filtros']).groupby('neighbourhood', observed=True)['price'].agg(['size', 'mean', 'std'])
+    obtido = pd.DataFrame(dados['itens']).set_index('neighbourhood')
+    assert set(obtido.index) == set(esperado.index)
+    assert (obtido['listings'] == esperado.loc[obtido.index, 'size']).all()
+    assert obtido['price'].to_numpy() == pytest.approx(esperado.loc[obtido.index, 'mean'].to_numpy())
+    # Desvio padrão populacional, como o do cubo
+    populacional = esperado['std'] * ((esperado['size'] - 1) / esperado['size']) ** 0.5
+    assert obtido['price_std'].to_numpy() == pytest.approx(populacional.loc[obtido.index].fillna(0).to_numpy())
+    assert obtido['price'].is_monotonic_decreasing
+
+
+def test_avaliacoes_por_bairro_e_tipo_batem_com_o_groupby(snapshot):
+    parametros = {'data_inicio': '2023-06-01', 'data_fim': '2024-03-31', 'preco_min': '150'}
+    bairros = _todas_as_paginas(snapshot, '/avaliacoes/bairros', parametros)
+    selecao = _selecao(snapshot.df, bairros['filtros'])
+    esperado = selecao.groupby('neighbourhood', observed=True)['number_of_reviews'].sum()
+    obtido = pd.DataFrame(bairros['itens']).set_index('neighbourhood')['number_of_reviews']
+    assert obtido.to_dict() == esperado.to_dict()
+
+    tipos = _json(consultar(snapshot, '/avaliacoes/tipos', parametros))
+    esperado = selecao.groupby('room_type', observed=True)['number_of_reviews'].sum()
+    assert {item['room_type']: item['number_of_reviews'] for item in tipos['itens']} == esperado.to_dict()
+
+
+def test_top_anfitrioes_bate_com_o_groupby(snapshot):
+    dados = _json(consultar(snapshot, '/anfitrioes/top', {'k': '5', 'bairro': 'Ipanema'}))
+    somas = _selecao(snapshot.df, dados['filtros']).groupby('host_id')['number_of_reviews'].sum()
+    assert [item['number_of_reviews'] for item in dados['itens']] == somas.sort_values(ascending=False).head(5).tolist()
+    assert all(somas[item['host_id']] == item['number_of_reviews'] for item in dados['itens'])
+
+
+def test_anfitriao_por_id(snapshot):
+    df = snapshot.df
+    host_id = int(df['host_id'].value_counts().index[0])
+    dados = _todas_as_paginas(snapshot, f'/anfitrioes/{host_id}', {})
+    listings = df[df['host_id'] == host_id]
+    assert dados['anfitriao']['listings'] == len(listings)
+    assert dados['anfitriao']['number_of_reviews'] == listings['number_of_reviews'].sum()
+    assert sorted(item['id'] for item in dados['itens']) == sorted(_selecao(listings, dados['filtros'])['id'])
+
+
+def test_if_none_match_responde_304(snapshot):
+    parametros = {'bairro': 'Leblon'}
+    primeira = consultar(snapshot, '/metricas', parametros)
+    segunda = consultar(snapshot, '/metricas', parametros, etag_cliente=primeira.etag)
+    assert segunda.status == HTTPStatus.NOT_MODIFIED
+    assert segunda.corpo == b'' and segunda.etag == primeira.etag
+    # Lista de ETags no cabeçalho
+    assert consultar(snapshot, '/metricas', parametros, etag_cliente=f'"outro", {primeira.etag}').status == HTTPStatus.NOT_MODIFIED
+
+
+def test_etag_muda_com_parametros_e_com_a_versao(snapshot):
+    etag = consultar(snapshot, '/precos/bairros', {}).etag
+    assert consultar(snapshot, '/precos/bairros', {'por_pagina': '10'}).etag != etag
+    assert consultar(snapshot, '/precos/bairros', {'robusto': '1'}).etag != etag
+    # Parâmetro que não muda a resposta não muda o ETag
+    assert consultar(snapshot, '/precos/bairros', {'bairro': 'Todos', 'k': '3'}).etag == etag
+
+    nova_versao = Snapshot(snapshot.df, snapshot.fonte, snapshot.versao + '-nova')
+    resposta = consultar(nova_versao, '/precos/bairros', {}, etag_cliente=etag)
+    assert resposta.status == HTTPStatus.OK and resposta.etag != etag
+    assert json.loads(resposta.corpo)['versao'] == nova_versao.versao
+
+
+def test_paginacao(snapshot):
+    completa = _todas_as_paginas(snapshot, '/precos/bairros', {})['itens']
+    por_pagina = 7
+    primeira = _json(consultar(snapshot, '/precos/bairros', {'por_pagina': str(por_pagina)}))
+    assert primeira['total'] == len(completa)
+    assert primeira['paginas'] == math.ceil(len(completa) / por_pagina)
+
+    itens = []
+    for pagina in range(1, primeira['paginas'] + 1):
+        dados = _json(consultar(snapshot, '/precos/bairros', {'por_pagina': str(por_pagina), 'pagina': str(pagina)}))
+        assert dados['pagina'] == pagina and len(dados['itens']) <= por_pagina
+        itens += dados['itens']
+    assert itens == completa
+    assert len(dados['itens']) == len(completa) - por_pagina * (primeira['paginas'] - 1)
+
+
+@pytest.mark.parametrize('parametros', [
+    {'pagina': '0'},
+    {'pagina': '1000'},
+    {'pagina': 'dois'},
+    {'por_pagina': '0'},
+    {'por_pagina': str(MAX_POR_PAGINA + 1)},
+])
+def test_paginacao_fora_dos_limites(snapshot, parametros):
+    with pytest.raises(ErroRequisicao) as erro:
+        consultar(snapshot, '/precos/bairros', parametros)
+    assert erro.value.status == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize('caminho, parametros', [
+    ('/metricas', {'preco_min': 'barato'}),
+    ('/metricas', {'preco_min': 'nan'}),
+    ('/metricas', {'preco_max': 'inf'}),
+    ('/metricas', {'preco_min': '-Infinity'}),
+    ('/metricas', {'data_inicio': 'ontem'}),
+    ('/metricas', {'data_fim': 'NaT'}),
+    ('/anfitrioes/top', {'k': '0'}),
+    ('/anfitrioes/top', {'k': '1000'}),
+    ('/anfitrioes/abc', {}),
+    ('/precos/robustos', {'por': 'anfitriao'}),
+    ('/atividade/mes', {'janela': '0'}),
+])
+def test_parametros_invalidos_dao_400(snapshot, caminho, parametros):
+    resposta = ServidorAPI(lambda: snapshot).responder(caminho, parametros)
+    assert resposta.status == HTTPStatus.BAD_REQUEST
+    assert 'erro' in json.loads(resposta.corpo)
+
+
+@pytest.mark.parametrize('caminho', ['/nada', '/anfitrioes/1', '/anfitrioes/'])
+def test_rota_ou_anfitriao_desconhecido_da_404(snapshot, caminho):
+    assert ServidorAPI(lambda: snapshot).responder(caminho, {}).status == HTTPStatus.NOT_FOUND
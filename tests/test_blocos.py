@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo.blocos import agregar_calendario, agregar_listings, agregar_reviews, dimensao_listings
+from nucleo.limpeza import converter_numero
+from nucleo.sintetico import gerar_listings
+
+# Bem menor que os arquivos, para que cada grupo apareça em vários blocos
+TAMANHO = 37
+
+
+@pytest.fixture(scope='module')
+def arquivos(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp('blocos')
+    rng = np.random.default_rng(9)
+    listings = gerar_listings(600, semente=9)
+    listings.loc[rng.random(len(listings)) < 0.05, 'host_name'] = np.nan
+    listings.loc[rng.random(len(listings)) < 0.05, 'neighbourhood'] = np.nan
+
+    # Calendar e reviews com alguns listing_id que não estão nos listings
+    ids = np.r_[listings['id'].to_numpy(), [1, 2, 3]]
+    calendario = pd.DataFrame({'listing_id': rng.choice(ids, 5000), 'available': rng.choice(['t', 'f'], 5000)})
+    reviews = pd.DataFrame({'listing_id': rng.choice(ids, 3000)})
+
+    caminhos = {}
+    for nome, df in [('listings', listings), ('calendar', calendario), ('reviews', reviews)]:
+        caminhos[nome] = pasta / f'{nome}.csv'
+        df.to_csv(caminhos[nome], index=False)
+    caminhos['listings.parquet'] = pasta / 'listings.parquet'
+    listings.to_parquet(caminhos['listings.parquet'], index=False)
+    return caminhos
+
+
+def _por_grupo_pandas(df, chaves):
+    df = df.assign(price=converter_numero(df['price']).valores)
+    grupos = df.groupby(chaves, dropna=False)
+    return pd.DataFrame({
+        'listings': grupos.size(),
+        'price': grupos['price'].mean(),
+        'price_std': grupos['price'].std(ddof=0),
+        'number_of_reviews': grupos['number_of_reviews'].sum(),
+        'minimum_nights': grupos['minimum_nights'].mean(),
+        'availability_365': grupos['availability_365'].mean(),
+    }).reset_index()
+
+
+def _ordenar(df, chaves):
+    return df.sort_values(chaves, na_position='last').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('arquivo, processos', [('listings', 1), ('listings.parquet', 1), ('listings', 2)])
+def test_agregar_listings_bate_com_o_groupby(arquivos, arquivo, processos):
+    listings = pd.read_csv(arquivos['listings'])
+    resultado = agregar_listings(arquivos[arquivo], tamanho=TAMANHO, processos=processos)
+    for nome, chaves in [('bairro_tipo', ['neighbourhood', 'room_type']), ('anfitriao', ['host_id', 'host_name'])]:
+        esperado = _ordenar(_por_grupo_pandas(listings, chaves), chaves)
+        obtido = _ordenar(resultado[nome], chaves)
+        # Chaves nulas (bairro ou nome do anfitrião) viram um grupo, como no groupby com dropna=False
+        assert obtido[chaves].isna().any().any()
+        pd.testing.assert_frame_equal(obtido[chaves], esperado[chaves], check_dtype=False)
+        for coluna in ['listings', 'number_of_reviews']:
+            assert obtido[coluna].tolist() == esperado[coluna].tolist()
+        for coluna in ['price', 'price_std', 'minimum_nights', 'availability_365']:
+            assert obtido[coluna].to_numpy() == pytest.approx(esperado[coluna].to_numpy(), nan_ok=True)
+
+
+def test_calendario_e_reviews_batem_com_o_groupby(arquivos):
+    listings = pd.read_csv(arquivos['listings'])[['id', 'neighbourhood', 'room_type']]
+    dimensao = dimensao_listings(arquivos['listings'], tamanho=TAMANHO)
+    chaves = ['neighbourhood', 'room_type']
+
+    calendario = pd.read_csv(arquivos['calendar']).merge(listings, left_on='listing_id', right_on='id')
+    esperado = calendario.assign(dias_ocupados=calendario['available'] == 'f').groupby(chaves).agg(
+        dias=('listing_id', 'size'), dias_ocupados=('dias_ocupados', 'sum')).reset_index()
+    obtido = _ordenar(agregar_calendario(arquivos['calendar'], dimensao, tamanho=TAMANHO), chaves)
+    assert obtido[chaves].astype(str).to_numpy().tolist() == esperado[chaves].to_numpy().tolist()
+    assert obtido['dias'].tolist() == esperado['dias'].tolist()
+    assert obtido['dias_ocupados'].tolist() == esperado['dias_ocupados'].tolist()
+    assert obtido['taxa_ocupacao'].to_numpy() == pytest.approx((esperado['dias_ocupados'] / esperado['dias']).to_numpy())
+
+    reviews = pd.read_csv(arquivos['reviews']).merge(listings, left_on='listing_id', right_on='id')
+    esperado = reviews.groupby(chaves).size()
+    obtido = _ordenar(agregar_reviews(arquivos['reviews'], dimensao, tamanho=TAMANHO), chaves)
+    assert obtido['avaliacoes'].tolist() == esperado.tolist()
+
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet'])
+def test_arquivos_vazios_dao_tabelas_vazias(tmp_path, arquivos, formato):
+    def vazio(nome, colunas):
+        caminho = tmp_path / f'{nome}.{formato}'
+        df = pd.DataFrame({c: pd.Series(dtype='int64' if c.endswith('id') else object) for c in colunas})
+        df.to_csv(caminho, index=False) if formato == 'csv' else df.to_parquet(caminho, index=False)
+        return caminho
+
+    listings = agregar_listings(vazio('listings', ['id', 'host_id', 'host_name', 'neighbourhood', 'room_type', 'price',
+                                                   'minimum_nights', 'number_of_reviews', 'availability_365']))
+    assert listings['bairro_tipo'].empty and listings['anfitriao'].empty
+    assert {'neighbourhood', 'room_type', 'listings', 'price'} <= set(listings['bairro_tipo'].columns)
+
+    dimensao = dimensao_listings(arquivos['listings'])
+    calendario = agregar_calendario(vazio('calendar', ['listing_id', 'available']), dimensao)
+    assert calendario.empty and 'taxa_ocupacao' in calendario.columns
+    assert agregar_reviews(vazio('reviews', ['listing_id']), dimensao).empty
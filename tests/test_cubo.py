@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo import analise
+from nucleo.robusto import FATOR_IQR, MINIMO_CELULA
+from nucleo.sintetico import gerar_listings
+from nucleo.snapshot import Snapshot
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    df = analise.limpar(gerar_listings(6000, semente=11))
+    rng = np.random.default_rng(11)
+    # Algumas linhas sem bairro ou sem tipo de quarto
+    df.loc[rng.random(len(df)) < 0.01, 'neighbourhood'] = np.nan
+    df.loc[rng.random(len(df)) < 0.01, 'room_type'] = np.nan
+    return Snapshot(df, 'teste', 'teste-cubo')
+
+
+# Limites que caem no meio das faixas de preço e dos meses do cubo
+CASOS = {
+    'sem filtros': {},
+    'bairro': {'bairro': 'Copacabana'},
+    'tipo de quarto': {'tipo_quarto': 'Private room'},
+    'preco no meio das faixas': {'preco': (137.5, 612.25)},
+    'preco aberto em cima': {'preco': (250.3, 1e9)},
+    'datas no meio dos meses': {'datas': (pd.Timestamp('2023-03-15'), pd.Timestamp('2024-01-10'))},
+    'datas com sem data': {'datas': (pd.Timestamp('2023-03-15'), pd.Timestamp('2024-01-10')), 'incluir_sem_data': True},
+    'tudo junto': {'bairro': 'Ipanema', 'tipo_quarto': 'Entire home/apt', 'preco': (101.5, 899.9),
+                   'datas': (pd.Timestamp('2022-07-20'), pd.Timestamp('2024-05-02')), 'incluir_sem_data': True},
+}
+
+
+def _mascara_pandas(df, bairro=None, tipo_quarto=None, preco=None, datas=None, incluir_sem_data=False):
+    mascara = pd.Series(True, index=df.index)
+    if bairro is not None:
+        mascara &= df['neighbourhood'] == bairro
+    if tipo_quarto is not None:
+        mascara &= df['room_type'] == tipo_quarto
+    if preco is not None:
+        mascara &= df['price'].between(*preco)
+    if datas is not None:
+        dentro = df['last_review'].between(*datas)
+        mascara &= dentro | (df['last_review'].isna() & incluir_sem_data)
+    return mascara.fillna(False).to_numpy(dtype=bool, copy=True)
+
+
+def _atipicos_pandas(df):
+    """Cercas de Tukey por bairro x tipo de quarto (ou pelo tipo, nas células pequenas), em pandas."""
+    validos = df.dropna(subset=['neighbourhood', 'room_type', 'price'])
+    celula = validos.groupby(['neighbourhood', 'room_type'], observed=True)['price']
+    tipo = validos.groupby('room_type', observed=True)['price']
+    q1, q3 = celula.transform(lambda p: p.quantile(0.25)), celula.transform(lambda p: p.quantile(0.75))
+    pequena = celula.transform('size') < MINIMO_CELULA
+    q1[pequena] = tipo.transform(lambda p: p.quantile(0.25))[pequena]
+    q3[pequena] = tipo.transform(lambda p: p.quantile(0.75))[pequena]
+    iqr = q3 - q1
+    atipico = (validos['price'] < q1 - FATOR_IQR * iqr) | (validos['price'] > q3 + FATOR_IQR * iqr)
+    return atipico.reindex(df.index, fill_value=False).to_numpy(dtype=bool)
+
+
+def _esperado(snapshot, filtros, robusto):
+    df = snapshot.df
+    mascara = _mascara_pandas(df, **filtros)
+    if robusto:
+        mascara &= ~_atipicos_pandas(df)
+    return df[mascara], mascara
+
+
+@pytest.mark.parametrize('robusto', [False, True], ids=['bruto', 'robusto'])
+@pytest.mark.parametrize('nome', list(CASOS))
+def test_agregar_bate_com_o_groupby(snapshot, nome, robusto):
+    filtros = CASOS[nome]
+    selecao, mascara = _esperado(snapshot, filtros, robusto)
+    paineis = analise.agregar(snapshot, top=10, robusto=robusto, **filtros)
+
+    assert (paineis.mascara == mascara).all()
+
+    for coluna, tabela in [('neighbourhood', paineis.resumo.por_bairro()), ('room_type', paineis.resumo.por_tipo_quarto())]:
+        grupos = selecao.groupby(coluna, observed=True)
+        esperado = pd.DataFrame({
+            'listings': grupos.size(),
+            'price': grupos['price'].mean(),
+            'price_std': grupos['price'].std(ddof=0),
+            'number_of_reviews': grupos['number_of_reviews'].sum(),
+        })
+        obtido = tabela.set_index(coluna).loc[esperado.index]
+        assert len(tabela) == len(esperado)
+        assert (obtido['listings'] == esperado['listings']).all()
+        assert (obtido['number_of_reviews'] == esperado['number_of_reviews']).all()
+        assert obtido['price'].to_numpy() == pytest.approx(esperado['price'].to_numpy(), nan_ok=True)
+        assert obtido['price_std'].to_numpy() == pytest.approx(esperado['price_std'].fillna(0).to_numpy(), abs=1e-6, nan_ok=True)
+
+    # Big numbers contam também as linhas sem bairro ou tipo de quarto
+    valores = analise.metricas(paineis.resumo)
+    assert valores['listings'] == len(selecao)
+    assert valores['total_avaliacoes'] == selecao['number_of_reviews'].sum()
+    assert valores['preco_medio'] == pytest.approx(selecao['price'].mean(), nan_ok=True)
+    assert valores['media_noites_minimas'] == pytest.approx(selecao['minimum_nights'].mean(), nan_ok=True)
+
+    somas = selecao.groupby('host_id')['number_of_reviews'].sum().sort_values(ascending=False)
+    assert paineis.top_anfitrioes['number_of_reviews'].tolist() == somas.head(10).tolist()
+
+
+def test_atipicos_batem_com_as_cercas_de_tukey(snapshot):
+    assert (snapshot.robusto.atipico == _atipicos_pandas(snapshot.df)).all()
+    assert snapshot.robusto.n_atipicos > 0
+
+
+def test_cubo_sem_nenhuma_linha_selecionada(snapshot):
+    paineis = analise.agregar(snapshot, bairro='Bairro que não existe')
+    assert paineis.resumo.total_listings == 0 and paineis.resumo.por_bairro().empty
+    assert not paineis.mascara.any()
@@ -0,0 +1,135 @@
+import pandas as pd
+import pytest
+
+from nucleo import ia
+from nucleo.ia import BackendFalso, CacheDisco, ServicoAnalise, TempoEsgotado, chave_analise
+
+
+class Relogio:
+    """Substitui ``time.time`` do módulo para controlar TTL e ordem de acesso."""
+
+    def __init__(self, agora=1_000_000.0):
+        self.agora = agora
+
+    def __call__(self):
+        return self.agora
+
+    def avancar(self, segundos):
+        self.agora += segundos
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(ia.time, 'time', relogio)
+    return relogio
+
+
+def test_cache_disco_guarda_e_conta_acertos(tmp_path):
+    cache = CacheDisco(tmp_path / 'ia.sqlite')
+    assert cache.obter('a') is None
+    cache.guardar('a', 'texto')
+    assert cache.obter('a') == 'texto'
+    assert (cache.acertos, cache.falhas) == (1, 1)
+
+
+def test_cache_disco_persiste_entre_conexoes(tmp_path):
+    CacheDisco(tmp_path / 'ia.sqlite').guardar('a', 'texto')
+    assert CacheDisco(tmp_path / 'ia.sqlite').obter('a') == 'texto'
+
+
+def test_cache_disco_expira_pelo_ttl(tmp_path, relogio):
+    cache = CacheDisco(tmp_path / 'ia.sqlite', ttl=60)
+    cache.guardar('a', 'texto')
+    relogio.avancar(59)
+    assert cache.obter('a') == 'texto'
+    relogio.avancar(2)
+    assert cache.obter('a') is None
+    # A resposta vencida é apagada, não só ignorada
+    assert cache._conexao.execute('SELECT COUNT(*) FROM respostas').fetchone()[0] == 0
+
+
+def test_cache_disco_ttl_pela_criacao_e_nao_pelo_acesso(tmp_path, relogio):
+    cache = CacheDisco(tmp_path / 'ia.sqlite', ttl=60)
+    cache.guardar('a', 'texto')
+    relogio.avancar(40)
+    assert cache.obter('a') == 'texto'
+    relogio.avancar(40)
+    assert cache.obter('a') is None
+
+
+def test_cache_disco_descarta_o_usado_ha_mais_tempo(tmp_path, relogio):
+    cache = CacheDisco(tmp_path / 'ia.sqlite', max_itens=2)
+    cache.guardar('a', 'A')
+    relogio.avancar(1)
+    cache.guardar('b', 'B')
+    relogio.avancar(1)
+    assert cache.obter('a') == 'A'  # 'a' passa a ser o mais recente
+    relogio.avancar(1)
+    cache.guardar('c', 'C')
+    assert cache.obter('b') is None
+    assert cache.obter('a') == 'A'
+    assert cache.obter('c') == 'C'
+
+
+def test_chave_analise_estavel():
+    tabela = pd.DataFrame({'neighbourhood': ['Copacabana', 'Ipanema'], 'price': [300.0, 450.5]})
+    filtros = {'bairro': 'Todos', 'preco': (0, 1000)}
+    chave = chave_analise('modelo', 'prompt', tabela, filtros)
+
+    assert chave == chave_analise('modelo', 'prompt', tabela.copy(), dict(filtros))
+    # A ordem dos filtros não muda a chave
+    assert chave == chave_analise('modelo', 'prompt', tabela, dict(reversed(list(filtros.items()))))
+    assert len(chave) == 64
+
+
+@pytest.mark.parametrize('mudanca', [
+    {'modelo': 'outro'},
+    {'prompt': 'outro prompt'},
+    {'tabela': pd.DataFrame({'neighbourhood': ['Copacabana', 'Ipanema'], 'price': [300.0, 450.0]})},
+    {'filtros': {'bairro': 'Centro', 'preco': (0, 1000)}},
+    {'tabela': None},
+    {'filtros': None},
+])
+def test_chave_analise_muda_com_cada_parte(mudanca):
+    partes = {
+        'modelo': 'modelo',
+        'prompt': 'prompt',
+        'tabela': pd.DataFrame({'neighbourhood': ['Copacabana', 'Ipanema'], 'price': [300.0, 450.5]}),
+        'filtros': {'bairro': 'Todos', 'preco': (0, 1000)},
+    }
+    assert chave_analise(**partes) != chave_analise(**{**partes, **mudanca})
+
+
+def test_servico_reaproveita_o_cache(tmp_path):
+    backend = BackendFalso()
+    servico = ServicoAnalise(backend, CacheDisco(tmp_path / 'ia.sqlite'))
+    primeira = servico.analisar('prompt').result(timeout=5)
+    segunda = servico.analisar('prompt')
+    assert segunda.done() and segunda.result() == primeira
+    assert backend.chamadas == 1
+
+
+def test_concluidos_entrega_na_ordem_de_chegada(tmp_path):
+    servico = ServicoAnalise(BackendFalso(atraso=0.2), CacheDisco(tmp_path / 'ia.sqlite'), timeout=5)
+    servico.cache.guardar(chave_analise('falso', 'em cache'), 'do cache')
+    futuros = {'lento': servico.analisar('novo'), 'rapido': servico.analisar('em cache')}
+
+    resultados = list(servico.concluidos(futuros))
+    assert [nome for nome, _, _ in resultados] == ['rapido', 'lento']
+    assert resultados[0][1:] == ('do cache', None)
+    assert resultados[1][2] is None
+
+
+def test_concluidos_com_tempo_esgotado(tmp_path):
+    backend = BackendFalso(atraso=2.0)
+    servico = ServicoAnalise(backend, CacheDisco(tmp_path / 'ia.sqlite'), timeout=0.1)
+    servico.cache.guardar(chave_analise('falso', 'em cache'), 'do cache')
+    futuros = {'lento': servico.analisar('novo'), 'rapido': servico.analisar('em cache')}
+
+    resultados = {nome: (texto, erro) for nome, texto, erro in servico.concluidos(futuros)}
+    assert resultados['rapido'] == ('do cache', None)
+    texto, erro = resultados['lento']
+    assert texto is None and isinstance(erro, TempoEsgotado)
+    # Falhas não vão para o cache: o pedido é refeito no próximo rerun
+    assert servico.cache.obter(chave_analise('falso', 'novo')) is None
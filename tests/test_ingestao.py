@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo.ingestao import Repositorio, diferencas
+from nucleo.sintetico import gerar_listings
+
+CIDADE = 'rio-de-janeiro'
+
+
+def _proximo(df, semente, deslocamento):
+    """Snapshot seguinte: alguns anúncios saem, outros entram e alguns mudam de preço."""
+    rng = np.random.default_rng(semente)
+    df = df[rng.random(len(df)) >= 0.1].copy()
+    alterados = df.index[(rng.random(len(df)) < 0.15) & df['price'].notna().to_numpy()]
+    df.loc[alterados, 'price'] = '$9,999.00'
+    novos = gerar_listings(20, semente=semente, deslocamento=deslocamento)
+    return pd.concat([df, novos], ignore_index=True)
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    primeiro = gerar_listings(200, semente=1)
+    segundo = _proximo(primeiro, 2, 10_000)
+    terceiro = _proximo(segundo, 3, 20_000)
+    caminhos = {}
+    for data, df in [('2024-01-01', primeiro), ('2024-04-01', segundo), ('2024-07-01', terceiro)]:
+        caminhos[data] = tmp_path / f'{data}.csv'
+        df.to_csv(caminhos[data], index=False)
+    return caminhos
+
+
+def _status(mudancas):
+    return {status: set(grupo['id']) for status, grupo in mudancas.groupby('status')}
+
+
+def test_diferencas_novos_removidos_e_alterados():
+    anterior = pd.DataFrame({'id': [1, 2, 3, 4, 5], 'price': [10.0, np.nan, 30.0, np.nan, 50.0],
+                             'room_type': pd.Categorical(['a', 'b', 'a', None, 'b'])})
+    atual = pd.DataFrame({'id': [2, 3, 4, 5, 6], 'price': [np.nan, 31.0, 40.0, 50.0, 60.0],
+                          'room_type': ['b', 'a', None, 'a', 'b']})
+    mudancas = diferencas(anterior, atual, ['price', 'room_type'])
+    # NaN nos dois snapshots não conta como alteração
+    assert _status(mudancas) == {'novo': {6}, 'removido': {1}, 'alterado': {3, 4, 5}}
+    assert len(diferencas(anterior, anterior, ['price', 'room_type'])) == 0
+
+
+def test_ingestao_fora_de_ordem_refaz_as_diferencas_do_proximo(tmp_path, snapshots):
+    em_ordem = Repositorio(tmp_path / 'em_ordem')
+    for data, caminho in snapshots.items():
+        em_ordem.ingerir(CIDADE, data, caminho)
+
+    fora_de_ordem = Repositorio(tmp_path / 'fora_de_ordem')
+    fora_de_ordem.ingerir(CIDADE, '2024-01-01', snapshots['2024-01-01'])
+    resumo = fora_de_ordem.ingerir(CIDADE, '2024-07-01', snapshots['2024-07-01'])
+    assert resumo['anterior'] == '2024-01-01' and resumo['proximo'] is None
+    assert _status(fora_de_ordem.diferencas(CIDADE, '2024-07-01')) == _status(
+        fora_de_ordem.comparar(CIDADE, '2024-01-01', '2024-07-01'))
+
+    # O snapshot do meio chega depois: o de julho passa a ser comparado com ele
+    resumo = fora_de_ordem.ingerir(CIDADE, '2024-04-01', snapshots['2024-04-01'])
+    assert resumo['anterior'] == '2024-01-01' and resumo['proximo'] == '2024-07-01'
+    for data in snapshots:
+        assert _status(fora_de_ordem.diferencas(CIDADE, data)) == _status(em_ordem.diferencas(CIDADE, data))
+    assert _status(fora_de_ordem.diferencas(CIDADE, '2024-07-01')) == _status(
+        em_ordem.comparar(CIDADE, '2024-04-01', '2024-07-01'))
+
+
+def test_diferencas_dos_snapshots_sinteticos(tmp_path, snapshots):
+    repositorio = Repositorio(tmp_path / 'dados')
+    for data, caminho in snapshots.items():
+        repositorio.ingerir(CIDADE, data, caminho)
+
+    antes, depois = (pd.read_csv(snapshots[d]) for d in ['2024-01-01', '2024-04-01'])
+    comuns = antes.merge(depois, on='id', suffixes=('_antes', '_depois'))
+    esperado = {
+        'novo': set(depois['id']) - set(antes['id']),
+        'removido': set(antes['id']) - set(depois['id']),
+        'alterado': set(comuns.loc[comuns['price_antes'] != comuns['price_depois'], 'id']) - set(
+            comuns.loc[comuns['price_antes'].isna() & comuns['price_depois'].isna(), 'id']),
+    }
+    assert _status(repositorio.diferencas(CIDADE, '2024-04-01')) == esperado
+    assert repositorio.diferencas(CIDADE, '2024-01-01').empty
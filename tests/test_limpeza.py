@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo.limpeza import converter_numero, formatar_moeda, formatar_moeda_coluna
+
+
+def _converter(*textos):
+    return converter_numero(pd.Series(textos, dtype=object))
+
+
+@pytest.mark.parametrize('texto, valor', [
+    # Inside Airbnb / formato americano
+    ('$1,234.00', 1234.0),
+    ('$85.00', 85.0),
+    ('$12,345,678.90', 12345678.9),
+    ('US$ 99.90', 99.9),
+    ('1,234', 1234.0),
+    ('1234', 1234.0),
+    ('.5', 0.5),
+    ('1.234', 1.234),
+    # Formato brasileiro
+    ('R$ 1.234,56', 1234.56),
+    ('R$1.234.567,8', 1234567.8),
+    ('1234,56', 1234.56),
+    ('12,5', 12.5),
+    ('1.234.567', 1234567.0),
+    # Sinal e espaços
+    ('-R$ 10,00', -10.0),
+    ('R$ -10,00', -10.0),
+    ('  $ 300  ', 300.0),
+])
+def test_formatos_aceitos(texto, valor):
+    resultado = _converter(texto)
+    assert resultado.valores.iloc[0] == pytest.approx(valor)
+    assert resultado.rejeitados.empty
+
+
+@pytest.mark.parametrize('texto', [
+    '1e3', 'abc12', '12abc', 'R$ 12 reais', '1,2,3', '1.2.3,45', '12,345,6', '--5', '1-2', '$', 'R$', 'gratuito', '€ 10,00',
+])
+def test_lixo_e_rejeitado(texto):
+    resultado = _converter(texto)
+    assert np.isnan(resultado.valores.iloc[0])
+    assert list(resultado.rejeitados) == [0]
+
+
+def test_vazios_nao_sao_rejeitados():
+    resultado = _converter('', '   ', None, np.nan, '$10.00', 'abc')
+    assert resultado.valores.isna().tolist() == [True, True, True, True, False, True]
+    assert list(resultado.rejeitados) == [5]
+
+
+def test_preserva_indice_e_nome():
+    serie = pd.Series(['$1.00', 'x', 'R$ 2,50'], index=[10, 20, 30], name='price')
+    resultado = converter_numero(serie)
+    assert resultado.valores.index.tolist() == [10, 20, 30] and resultado.valores.name == 'price'
+    assert list(resultado.rejeitados) == [20]
+
+
+def test_coluna_numerica_passa_direto():
+    resultado = converter_numero(pd.Series([1, 2, 3]))
+    assert resultado.valores.tolist() == [1.0, 2.0, 3.0] and resultado.rejeitados.empty
+
+
+@pytest.mark.parametrize('valor, texto', [
+    (1234.5, 'R$ 1.234,50'),
+    (0, 'R$ 0,00'),
+    (-10, '-R$ 10,00'),
+    (1234567.891, 'R$ 1.234.567,89'),
+    (float('nan'), '-'),
+])
+def test_formatar_moeda(valor, texto):
+    assert formatar_moeda(valor) == texto
+    assert formatar_moeda_coluna(pd.Series([valor])).iloc[0] == texto
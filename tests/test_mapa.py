@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo import analise
+from nucleo.mapa import NIVEL_BALDES, ZOOM_BASE, IndiceEspacial, dados_mapa, haversine_km, tamanho_celula
+from nucleo.sintetico import gerar_listings
+
+
+@pytest.fixture(scope='module')
+def df():
+    return analise.limpar(gerar_listings(5000, semente=7))
+
+
+@pytest.fixture(scope='module')
+def df_sem_coordenadas(df):
+    df = df.copy()
+    df.loc[df.index[[3, 10, 200]], 'latitude'] = np.nan
+    df.loc[df.index[[10, 1500, 4999]], 'longitude'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('zoom', [8, 11, 14])
+def test_agregar_ignora_coordenadas_nulas(df, df_sem_coordenadas, zoom):
+    indice = IndiceEspacial(df_sem_coordenadas)
+    validos = df_sem_coordenadas['latitude'].notna() & df_sem_coordenadas['longitude'].notna()
+    grade = indice.agregar(zoom, np.arange(len(df_sem_coordenadas)))
+
+    assert grade['listings'].sum() == validos.sum()
+    # As células continuam no Rio, sem o estouro do int64 dos NaN
+    assert grade['latitude'].between(-23.2, -22.7).all()
+    assert grade['longitude'].between(-43.8, -43.0).all()
+
+    # Mesma grade dos pontos válidos num índice sem nulos
+    esperado = IndiceEspacial(df[validos.to_numpy()]).agregar(zoom, np.arange(validos.sum()))
+    assert grade.sort_values(['longitude', 'latitude']).to_numpy() == pytest.approx(
+        esperado.sort_values(['longitude', 'latitude']).to_numpy(), nan_ok=True)
+
+
+def test_agregar_bate_com_o_groupby(df):
+    zoom = 12
+    grade = IndiceEspacial(df).agregar(zoom, np.arange(len(df)))
+    lado = tamanho_celula(zoom)
+    celulas = df.assign(cx=np.floor(df['longitude'].astype(float) / lado), cy=np.floor(df['latitude'].astype(float) / lado))
+    esperado = celulas.groupby(['cx', 'cy']).agg(listings=('id', 'size'), price=('price', 'mean')).reset_index()
+    assert len(grade) == len(esperado)
+    assert sorted(grade['listings']) == sorted(esperado['listings'])
+
+
+@pytest.mark.parametrize('agrupar', [False, True])
+def test_dados_mapa_sem_coordenadas_nulas(df_sem_coordenadas, agrupar):
+    mascara = np.ones(len(df_sem_coordenadas), dtype=bool)
+    tipo, dados = dados_mapa(df_sem_coordenadas, mascara, agrupar=agrupar)
+    com_avaliacao = df_sem_coordenadas['number_of_reviews'] > 0
+    validos = df_sem_coordenadas['latitude'].notna() & df_sem_coordenadas['longitude'].notna()
+    total = len(dados) if tipo == 'pontos' else dados['listings'].sum()
+    assert total == (com_avaliacao & validos).sum()
+    assert np.isfinite(dados[['longitude', 'latitude']].to_numpy(dtype=float)).all()
+
+
+@pytest.fixture(scope='module')
+def pontos():
+    """Pontos aleatórios no Rio, alguns em cima das bordas dos baldes e alguns sem coordenada."""
+    rng = np.random.default_rng(21)
+    n = 3000
+    lat = rng.uniform(-23.05, -22.80, n)
+    lon = rng.uniform(-43.70, -43.15, n)
+    lado = tamanho_celula(ZOOM_BASE) * 2 ** NIVEL_BALDES
+    borda = rng.random(n) < 0.2
+    lat[borda] = np.round(lat[borda] / lado) * lado
+    lon[borda] = np.round(lon[borda] / lado) * lado
+    lat[[5, 50]] = np.nan
+    lon[[50, 500]] = np.nan
+    df = pd.DataFrame({'latitude': lat, 'longitude': lon, 'price': rng.uniform(50, 900, n),
+                       'number_of_reviews': rng.integers(0, 100, n)})
+    return df, IndiceEspacial(df)
+
+
+def _consultas(df):
+    rng = np.random.default_rng(22)
+    lado = tamanho_celula(ZOOM_BASE) * 2 ** NIVEL_BALDES
+    aleatorias = list(zip(rng.uniform(-23.05, -22.80, 6), rng.uniform(-43.70, -43.15, 6)))
+    # Centro num canto de balde, centro num ponto do próprio índice e centro longe dos dados
+    canto = (np.floor(-22.93 / lado) * lado, np.floor(-43.40 / lado) * lado)
+    return aleatorias + [canto, (df['latitude'].iloc[0], df['longitude'].iloc[0]), (-22.50, -42.90)]
+
+
+def _forca_bruta(df, lat, lon, mascara):
+    distancias = haversine_km(lat, lon, df['latitude'].to_numpy(), df['longitude'].to_numpy())
+    validos = np.isfinite(distancias) & (True if mascara is None else mascara)
+    posicoes = np.flatnonzero(validos)
+    ordem = np.argsort(distancias[posicoes], kind='stable')
+    return posicoes[ordem], distancias[posicoes][ordem]
+
+
+@pytest.mark.parametrize('com_mascara', [False, True])
+@pytest.mark.parametrize('raio_km', [0.3, 1.0, 2.5, 12.0])
+def test_no_raio_bate_com_a_forca_bruta(pontos, com_mascara, raio_km):
+    df, indice = pontos
+    mascara = np.random.default_rng(23).random(len(df)) < 0.4 if com_mascara else None
+    for lat, lon in _consultas(df):
+        esperado, distancias = _forca_bruta(df, lat, lon, mascara)
+        dentro = distancias <= raio_km
+        posicoes, obtidas = indice.no_raio(lat, lon, raio_km, mascara)
+        assert sorted(posicoes) == sorted(esperado[dentro])
+        assert obtidas == pytest.approx(distancias[dentro])
+
+        posicoes, obtidas = indice.no_raio(lat, lon, raio_km, mascara, k=5)
+        assert obtidas == pytest.approx(distancias[dentro][:5])
+
+
+@pytest.mark.parametrize('com_mascara', [False, True])
+@pytest.mark.parametrize('k', [1, 7, 100, 10_000])
+def test_mais_proximos_bate_com_a_forca_bruta(pontos, com_mascara, k):
+    df, indice = pontos
+    mascara = np.random.default_rng(24).random(len(df)) < 0.1 if com_mascara else None
+    for lat, lon in _consultas(df):
+        esperado, distancias = _forca_bruta(df, lat, lon, mascara)
+        posicoes, obtidas = indice.mais_proximos(lat, lon, k, mascara)
+        # Com k maior que o número de pontos volta tudo o que tem coordenada
+        assert len(posicoes) == min(k, len(esperado))
+        assert obtidas == pytest.approx(distancias[:k])
+        assert set(posicoes) == set(esperado[:k])
@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nucleo.sketches import KLL, CountMin, MisraGries, esbocar_listings, esbocos_como_dict, esbocos_de_dict
+
+N_PARTICOES = 8
+
+
+@pytest.fixture(scope='module')
+def dados():
+    """Itens com frequência de cauda longa, pesos e preços, divididos em partições."""
+    rng = np.random.default_rng(15)
+    n = 60_000
+    itens = rng.zipf(1.3, n) % 5000
+    pesos = rng.integers(0, 50, n).astype(float)
+    precos = np.round(rng.lognormal(5.5, 0.8, n))
+    particao = rng.integers(0, N_PARTICOES, n)
+    return itens, pesos, precos, particao
+
+
+def _ida_e_volta(esboco):
+    # Como na ingestão: dicionário em JSON e de volta
+    return type(esboco).de_dict(json.loads(json.dumps(esboco.como_dict())))
+
+
+def _mesclado(fabrica, atualizar, particao, serializar):
+    partes = []
+    for p in range(N_PARTICOES):
+        esboco = atualizar(fabrica(p), particao == p)
+        partes.append(_ida_e_volta(esboco) if serializar else esboco)
+    acumulado = partes[0]
+    for parte in partes[1:]:
+        acumulado.mesclar(parte)
+    return _ida_e_volta(acumulado) if serializar else acumulado
+
+
+@pytest.mark.parametrize('serializar', [False, True], ids=['mesclado', 'json'])
+@pytest.mark.parametrize('k', [8, 64])
+def test_misra_gries_dentro_do_erro(dados, k, serializar):
+    itens, pesos, _, particao = dados
+    resumo = _mesclado(lambda p: MisraGries(k), lambda r, m: r.atualizar(itens[m], pesos[m]), particao, serializar)
+    reais = pd.Series(pesos).groupby(itens).sum()
+
+    assert len(resumo) <= k
+    assert resumo.peso_total == pytest.approx(pesos.sum())
+    assert 0 <= resumo.erro <= resumo.peso_total / (k + 1)
+    contagens = pd.Series(resumo.contagens, index=resumo.itens).reindex(reais.index, fill_value=0.0)
+    assert (contagens <= reais + 1e-9).all()
+    assert (reais <= contagens + resumo.erro + 1e-9).all()
+    # Todo item acima de W / (k + 1) está no resumo
+    assert set(reais.index[reais > resumo.peso_total / (k + 1)]) <= set(resumo.itens)
+
+
+@pytest.mark.parametrize('serializar', [False, True], ids=['mesclado', 'json'])
+def test_count_min_dentro_do_erro(dados, serializar):
+    itens, pesos, _, particao = dados
+    esboco = _mesclado(lambda p: CountMin(largura=256, profundidade=4, semente=3),
+                       lambda e, m: e.atualizar(itens[m], pesos[m]), particao, serializar)
+    reais = pd.Series(pesos).groupby(itens).sum()
+    estimativas = esboco.estimar(reais.index.to_numpy())
+
+    assert esboco.peso_total == pytest.approx(pesos.sum())
+    assert (estimativas >= reais.to_numpy() - 1e-9).all()
+    # Cada item passa de epsilon * W com probabilidade no máximo delta
+    acima = estimativas - reais.to_numpy() > esboco.epsilon * esboco.peso_total
+    assert acima.mean() <= 2 * esboco.delta
+
+    # Count-Min é linear: mesclar as partições dá a mesma tabela de um esboço só
+    unico = CountMin(largura=256, profundidade=4, semente=3).atualizar(itens, pesos)
+    assert np.array_equal(esboco.tabela, unico.tabela)
+
+
+def test_count_min_nao_mescla_dimensoes_diferentes():
+    with pytest.raises(ValueError):
+        CountMin(largura=256).mesclar(CountMin(largura=512))
+
+
+@pytest.mark.parametrize('serializar', [False, True], ids=['mesclado', 'json'])
+@pytest.mark.parametrize('k', [100, 200])
+def test_kll_dentro_do_erro(dados, k, serializar):
+    _, _, precos, particao = dados
+    esboco = _mesclado(lambda p: KLL(k, semente=p), lambda e, m: e.atualizar(precos[m]), particao, serializar)
+    ordenados = np.sort(precos)
+
+    assert esboco.n == len(precos)
+    assert (esboco.minimo, esboco.maximo) == (ordenados[0], ordenados[-1])
+    assert sum(len(a) for a in esboco.niveis) <= 4 * k
+    quantis = np.linspace(0, 1, 41)
+    valores = esboco.quantil(quantis)
+    # Posto real do valor devolvido: entre os menores e os menores ou iguais a ele
+    abaixo = np.searchsorted(ordenados, valores, side='left') / len(ordenados)
+    ate = np.searchsorted(ordenados, valores, side='right') / len(ordenados)
+    desvio = np.maximum(abaixo - quantis, quantis - ate)
+    # O erro vale com 99% de confiança por consulta (e o esboço que volta do JSON
+    # compacta com outra semente): folga para um ou outro quantil passar um pouco
+    assert (desvio <= esboco.erro).mean() >= 0.9
+    assert desvio.max() <= 1.5 * esboco.erro
+    assert desvio[[0, -1]].max() == 0
+
+    reais = np.quantile(precos, [0.1, 0.5, 0.9, 0.99])
+    postos = np.array([esboco.posto(valor) for valor in reais])
+    assert np.abs(postos - np.searchsorted(ordenados, reais, side='right') / len(ordenados)).max() <= 1.5 * esboco.erro
+
+
+def test_esbocos_de_listings_sobrevivem_ao_json():
+    df = pd.DataFrame({'host_id': [1, 2, 2, 3], 'neighbourhood': ['Leme', 'Urca', None, 'Urca'],
+                       'price': [100.0, np.nan, 250.0, 80.0], 'number_of_reviews': [5, 1, 2, 0]})
+    esbocos = esbocar_listings(df)
+    volta = esbocos_de_dict(json.loads(json.dumps(esbocos_como_dict(esbocos))))
+    assert volta['anfitrioes'].top(3).equals(esbocos['anfitrioes'].top(3))
+    assert volta['bairros'].top(3)['item'].tolist() == ['Leme', 'Urca']
+    assert volta['avaliacoes_anfitriao'].estimar([2])[0] >= 3
+    assert volta['precos'].quantil([0, 0.5, 1]).tolist() == esbocos['precos'].quantil([0, 0.5, 1]).tolist()